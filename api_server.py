@@ -0,0 +1,272 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+from functools import lru_cache
+from urllib.parse import parse_qs, urlsplit
+
+import command_parser
+import importer
+import perf
+from ledger_registry import DEFAULT_GROUP, normalize_group_id, shared_registry
+from main import ExpenseSplitter
+from settlement import STRATEGIES
+
+# Headless HTTP/1.1 API over the same group ledgers as the UI, built on
+# asyncio streams. Connections are kept alive (and may pipeline requests);
+# every request picks its ledger with ?group=... (default "default").
+#
+#   POST /commands     {"command": "john paid 50 for dinner split among mary"}
+#   POST /expenses     {"paid_by": ..., "amount": ..., "description": ...,
+#                       "split_among": [...], "date": ..., "currency": ...}
+#                      or a list of them
+#   GET  /balances?currency=EUR
+#   GET  /settlements?strategy=auto|greedy|exact|bounded&currency=EUR
+#   POST /batch        {"requests": [{"method": "GET", "path": "/balances"}, ...]}
+#   GET  /metrics      span timings (see perf.py) as JSON, or ?format=prometheus
+#
+# Ledger work is synchronous and short, so it runs on the event loop thread.
+# The ledgers come from ledger_registry.shared_registry(), so next to a
+# Streamlit app in the same process (with the same database and rates) both
+# serve the very same group ledgers under the same locks. A database file
+# must only be written by one process: point a separate API server at its
+# own file, not at the one a running UI uses.
+
+# Largest request body accepted (bulk expense posts included)
+MAX_BODY = 16 * 2 ** 20
+
+# Compact JSON; built once instead of on every json.dumps call
+ENCODER = json.JSONEncoder(separators=(",", ":"))
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 431: "Request Header Fields Too Large",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ExpenseApi:
+    def __init__(self, registry):
+        self.registry = registry
+        # One splitter per group, built on first use
+        self.splitters = {}
+        self.routes = {
+            "/commands": ("POST", self.post_command),
+            "/expenses": ("POST", self.post_expenses),
+            "/balances": ("GET", self.get_balances),
+            "/settlements": ("GET", self.get_settlements),
+            "/batch": ("POST", self.post_batch),
+        }
+        # Routes that don't work on a ledger
+        self.global_routes = {
+            "/metrics": ("GET", self.get_metrics),
+        }
+
+    def splitter(self, group_id):
+        splitter = self.splitters.get(group_id)
+        if splitter is None:
+            splitter = ExpenseSplitter.for_group(self.registry.group(group_id))
+            self.splitters[group_id] = splitter
+        return splitter
+
+    def dispatch(self, method, target, body):
+        # Run one request; returns (status, JSON-serializable payload)
+        path, query = split_target(target)
+        try:
+            route = self.routes.get(path) or self.global_routes.get(path)
+            if route is None:
+                raise ApiError(404, f"no such endpoint {path!r}")
+            allowed, handler = route
+            if method != allowed:
+                raise ApiError(405, f"{path} only accepts {allowed}")
+            try:
+                if path in self.global_routes:
+                    return 200, handler(query, body)
+                splitter = self.splitter(normalize_group_id(query.get("group", DEFAULT_GROUP)))
+                return 200, handler(splitter, query, body)
+            except (ValueError, TypeError) as exc:
+                # Anything a well-formed but wrong body can still trip over
+                # is the client's error, not a reason to drop the connection
+                raise ApiError(400, str(exc)) from None
+        except ApiError as exc:
+            return exc.status, {"error": str(exc)}
+
+    def post_command(self, splitter, query, body):
+        command = body.get("command") if isinstance(body, dict) else None
+        if not isinstance(command, str):
+            raise ValueError('expected {"command": "..."}')
+        parsed = command_parser.parse(command)
+        return {"kind": parsed.kind, "response": splitter.execute(parsed)}
+
+    def post_expenses(self, splitter, query, body):
+        if isinstance(body, list):
+            # All or nothing, like the bulk import
+            splitter.add_expenses_bulk(importer.record_rows(body))
+            return {"added": len(body)}
+        row = next(importer.record_rows([body]))
+        if isinstance(row, Exception):
+            raise row
+        paid_by, amount, description, split_among, date, split, currency = row
+        try:
+            amount = float(amount)
+        except TypeError:
+            raise ValueError(f"amount must be a number, got {amount!r}") from None
+        splitter.add_expense(paid_by, amount, description, split_among, date, split, currency)
+        return {"added": 1}
+
+    def get_balances(self, splitter, query, body):
+        # In ?currency= (default: see ExpenseSplitter.settlement_currency)
+        currency = splitter.settlement_currency(query.get("currency"))
+        return {"currency": currency, "balances": splitter.calculate_balances(currency)}
+
+    def get_settlements(self, splitter, query, body):
+        strategy = query.get("strategy", "auto")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy {strategy!r}, expected one of {', '.join(STRATEGIES)}")
+        currency = splitter.settlement_currency(query.get("currency"))
+        return {"currency": currency, "transactions": splitter.get_transactions(strategy, currency=currency)}
+
+    def get_metrics(self, query, body):
+        # Plain-text Prometheus exposition, or the JSON summaries
+        fmt = query.get("format", "json")
+        if fmt == "prometheus":
+            return perf.RECORDER.to_prometheus()
+        if fmt != "json":
+            raise ValueError(f"Unknown metrics format {fmt!r}, expected json or prometheus")
+        return {"enabled": perf.enabled, "spans": perf.RECORDER.snapshot()}
+
+    def post_batch(self, splitter, query, body):
+        # Several requests in one round trip, run in order; a failing request
+        # does not stop the ones after it
+        requests = body.get("requests") if isinstance(body, dict) else None
+        if not isinstance(requests, list):
+            raise ValueError('expected {"requests": [...]}')
+        responses = []
+        for request in requests:
+            if not isinstance(request, dict) or not isinstance(request.get("path"), str) \
+                    or not isinstance(request.get("method", "GET"), str):
+                responses.append({"status": 400, "body": {"error": f"not a request: {request!r}"}})
+                continue
+            if request["path"].startswith("/batch"):
+                responses.append({"status": 400, "body": {"error": "batches cannot be nested"}})
+                continue
+            status, payload = self.dispatch(request.get("method", "GET").upper(), request["path"], request.get("body"))
+            responses.append({"status": status, "body": payload})
+        return {"responses": responses}
+
+    async def handle_connection(self, reader, writer):
+        # Serve requests on one connection until the client closes it or asks
+        # for Connection: close
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                except asyncio.LimitOverrunError:
+                    self.respond(writer, 431, {"error": "request headers too large"}, False)
+                    break
+
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ")
+                except ValueError:
+                    self.respond(writer, 400, {"error": "malformed request line"}, False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+                try:
+                    length = int(headers.get("content-length", 0))
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    self.respond(writer, 400, {"error": "bad Content-Length"}, False)
+                    break
+                if length > MAX_BODY:
+                    self.respond(writer, 413, {"error": f"bodies are limited to {MAX_BODY} bytes"}, False)
+                    break
+                body = None
+                if length:
+                    data = await reader.readexactly(length)
+                    try:
+                        body = json.loads(data)
+                    except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+                        self.respond(writer, 400, {"error": f"body is not valid JSON: {exc}"}, keep_alive)
+                        await writer.drain()
+                        if keep_alive:
+                            continue
+                        break
+
+                status, payload = self.dispatch(method, target, body)
+                self.respond(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def respond(self, writer, status, payload, keep_alive):
+        # Payloads are JSON, except text (e.g. Prometheus metrics) sent as is
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/plain; version=0.0.4"
+        else:
+            body, content_type = ENCODER.encode(payload).encode(), "application/json"
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body
+        )
+
+
+@lru_cache(maxsize=1024)
+def split_target(target):
+    # Path and query parameters of a request target; clients repeat the same
+    # few targets, so each is only parsed once. Handlers must not modify the
+    # returned dict.
+    url = urlsplit(target)
+    return url.path, {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+
+async def serve(host, port, database_path=None, rates_path=None):
+    api = ExpenseApi(shared_registry(database_path, rates_path))
+    server = await asyncio.start_server(api.handle_connection, host, port)
+    print(f"Serving on http://{host}:{server.sockets[0].getsockname()[1]}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description="HTTP API for the expense splitter")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", help="SQLite ledger for the default group (others go next to it); "
+                                     "not one another process is writing to")
+    parser.add_argument("--rates", default=os.environ.get("EXPENSE_SPLITTER_RATES"),
+                        help="CSV of exchange rates every group starts with")
+    parser.add_argument("--perf", action="store_true", help="time hot paths from the start (see GET /metrics)")
+    args = parser.parse_args(argv)
+    if args.perf:
+        perf.enable()
+    try:
+        asyncio.run(serve(args.host, args.port, args.db, args.rates))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli(sys.argv[1:]))
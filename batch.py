@@ -0,0 +1,184 @@
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ledger_db import LedgerDatabase
+from ledger_registry import LedgerGroup
+from money import balance_deltas
+
+
+# Headless batch recompute for very large ledgers and many groups, spread over
+# a process pool. One ledger's replay is cut into shards of rows: the columns
+# are copied once into a shared memory block that every worker maps (nothing
+# big is pickled), each shard comes back as a partial (people, currencies)
+# balance array and the partials are summed. Many groups are spread a whole
+# group at a time: each worker opens the group's own SQLite ledger, rebuilds
+# its balances, settles it and sends back only the statement.
+
+# Shards per worker for one ledger's replay, so one slow shard doesn't hold
+# up the rest
+SHARDS_PER_WORKER = 4
+
+# Ledgers with fewer rows are replayed in the calling process; below this the
+# pool costs more than it saves
+MIN_PARALLEL_ROWS = 200_000
+
+# Offsets of the arrays in a shared block are rounded up to this many bytes
+ALIGNMENT = 64
+
+
+def worker_pool(workers=None):
+    # workers defaults to one per CPU
+    return ProcessPoolExecutor(workers or os.cpu_count())
+
+
+class SharedColumns:
+    # Numpy arrays copied into one shared memory block. spec (the block's name
+    # and each array's offset, dtype and shape) is all a worker needs to map
+    # them again with attach(). The creator closes (and frees) the block.
+    def __init__(self, arrays):
+        layout = {}
+        size = 0
+        for name, array in arrays.items():
+            size = -(-size // ALIGNMENT) * ALIGNMENT
+            layout[name] = (size, array.dtype.str, array.shape)
+            size += array.nbytes
+        self.memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.spec = (self.memory.name, layout)
+        for name, view in _views(self.memory, layout).items():
+            view[...] = arrays[name]
+
+    def close(self):
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _views(memory, layout):
+    return {
+        name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=memory.buf, offset=offset)
+        for name, (offset, dtype, shape) in layout.items()
+    }
+
+
+# In a worker: the block it mapped last and views of its arrays; the shards
+# of one replay all reuse them
+_attached = None
+
+
+def attach(spec):
+    global _attached
+    name, layout = spec
+    if _attached is None or _attached[0].name != name:
+        if _attached is not None:
+            # The views must go before the block can be closed
+            memory = _attached[0]
+            _attached = None
+            memory.close()
+        memory = shared_memory.SharedMemory(name=name)
+        _attached = memory, _views(memory, layout)
+    return _attached[1]
+
+
+def replay_balances(store, pool, workers):
+    # Same result as store.replay_balances(): every balance (cents, people by
+    # currencies) rebuilt from the rows in memory, with the rows cut into
+    # shards for the pool's workers
+    rows = store.count
+    if workers < 2 or rows < MIN_PARALLEL_ROWS:
+        return store.replay_balances()
+    end = store.offsets[rows]
+    columns = {name: store.column(name) for name in ("paid_by", "amount", "currency", "deleted")}
+    columns["offsets"] = store.offsets[:rows + 1]
+    columns["members"] = store.members[:end]
+    columns["shares"] = store.shares[:end]
+    bounds = np.linspace(0, rows, workers * SHARDS_PER_WORKER + 1).astype(np.int64).tolist()
+    people, count = len(store.names), len(store.currencies)
+
+    balances = np.zeros((people, count), dtype=np.int64)
+    with SharedColumns(columns) as shared:
+        for partial in pool.map(
+            _replay_shard, repeat(shared.spec), bounds[:-1], bounds[1:], repeat(people), repeat(count),
+        ):
+            balances += partial
+    return balances
+
+
+def _replay_shard(spec, first, last, people, count):
+    # Balance deltas of rows first <= row < last (see replay_balances())
+    columns = attach(spec)
+    offsets = columns["offsets"]
+    sizes = np.diff(offsets[first:last + 1])
+    live = ~columns["deleted"][first:last]
+    start, end = offsets[first], offsets[last]
+    shared = np.repeat(live, sizes)
+    return balance_deltas(
+        columns["paid_by"][first:last][live], columns["amount"][first:last][live], sizes[live],
+        columns["members"][start:end][shared], columns["shares"][start:end][shared],
+        columns["currency"][first:last][live], people, count,
+    )
+
+
+def statement(splitter, group_id, currency=None, strategy="auto", replayed=None, rebuild=False):
+    # A group's balances and settlement in one currency (see
+    # ExpenseSplitter.settlement_currency()), with how many cents the saved
+    # running balances were off from a replay of the rows. rebuild replaces
+    # running balances that are off with the replayed ones.
+    splitter.load_history()
+    store = splitter.store
+    if replayed is None:
+        replayed = store.replay_balances()
+    drift = int(np.abs(replayed - store.subtotals()).sum())
+    if drift and rebuild:
+        with splitter.lock:
+            store.set_balances(replayed)
+    currency = splitter.settlement_currency(currency)
+    return {
+        "group": group_id,
+        "expenses": len(store),
+        "currency": currency,
+        "drift_cents": drift,
+        "balances": splitter.calculate_balances(currency),
+        "settlements": splitter.get_transactions(strategy, currency=currency),
+    }
+
+
+def statements(groups, pool, workers, rates=None, currency=None, strategy="auto", rebuild=False):
+    # Statements for {group id: SQLite path}, in order. Several groups are
+    # recomputed a group per worker; a single one has its replay sharded
+    # across the workers instead.
+    tasks = [(group_id, path, rates, currency, strategy, rebuild) for group_id, path in groups.items()]
+    if len(tasks) == 1:
+        yield _group_statement(*tasks[0], pool=pool, workers=workers)
+        return
+    yield from pool.map(_group_statement, *zip(*tasks))
+
+
+def _group_statement(group_id, path, rates, currency, strategy, rebuild, pool=None, workers=1):
+    # main imports this module for its command line
+    from main import ExpenseSplitter
+
+    # A group whose file can't be read (not a database, a newer schema...)
+    # gets an error entry; the other groups' statements still go out
+    database = None
+    try:
+        database = LedgerDatabase(path)
+        group = LedgerGroup(group_id, database, rates)
+        splitter = ExpenseSplitter.for_group(group)
+        splitter.load_history()
+        replayed = replay_balances(group.store, pool, workers) if pool is not None else None
+        return statement(splitter, group_id, currency, strategy, replayed, rebuild)
+    except (ValueError, sqlite3.Error) as exc:
+        return {"group": group_id, "error": str(exc)}
+    finally:
+        if database is not None:
+            database.close()
@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ledger_generator import LedgerGenerator  # noqa: E402
+
+# Load test for api_server.py: a pool of keep-alive connections, each sending
+# a mix of expense commands, balance and settlement reads back to back.
+# Starts its own in-memory server unless --port points at a running one, e.g.
+#
+#     python benchmarks/api_load.py --connections 32 --requests 50000
+
+
+def request_bytes(method, path, body=None):
+    data = json.dumps(body).encode() if body is not None else b""
+    return f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+
+
+def workload(count, people, seed, group, read_share):
+    # Pre-encoded requests so the client spends its time waiting on the server
+    random = np.random.default_rng(seed)
+    commands = LedgerGenerator(people, seed).commands(count)
+    reads = [
+        request_bytes("GET", f"/balances?group={group}"),
+        request_bytes("GET", f"/settlements?group={group}&strategy=greedy"),
+    ]
+    return [
+        reads[random.integers(len(reads))] if read
+        else request_bytes("POST", f"/commands?group={group}", {"command": next(commands)})
+        for read in (random.random(count) < read_share)
+    ]
+
+
+async def read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head[9:12])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line[15:])
+    await reader.readexactly(length)
+    return status
+
+
+async def client(host, port, requests, latencies, failures):
+    reader, writer = await asyncio.open_connection(host, port)
+    for request in requests:
+        started = time.perf_counter_ns()
+        writer.write(request)
+        status = await read_response(reader)
+        latencies.append(time.perf_counter_ns() - started)
+        if status != 200:
+            failures.append(status)
+    writer.close()
+
+
+async def run(host, port, requests, connections):
+    latencies = []
+    failures = []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        client(host, port, requests[i::connections], latencies, failures) for i in range(connections)
+    ))
+    return time.perf_counter() - started, np.array(latencies), failures
+
+
+async def wait_for_server(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description="Load test the expense splitter HTTP API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="port of a running server (default: start one)")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--people", type=int, default=50)
+    parser.add_argument("--read-share", type=float, default=0.5, help="fraction of balance/settlement reads")
+    parser.add_argument("--group", default="load-test")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = None
+    port = args.port
+    if port is None:
+        port = 8765
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "api_server.py"), "--host", args.host, "--port", str(port), "--db", ""],
+            stdout=subprocess.DEVNULL,
+        )
+    try:
+        asyncio.run(wait_for_server(args.host, port))
+        requests = workload(args.requests, args.people, args.seed, args.group, args.read_share)
+        seconds, latencies, failures = asyncio.run(run(args.host, port, requests, args.connections))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print(f"{len(requests)} requests over {args.connections} connections in {seconds:.2f}s")
+    print(f"throughput {len(requests) / seconds:,.0f} req/s")
+    print(f"latency p50 {np.percentile(latencies, 50) / 1000:.0f}us  p99 {np.percentile(latencies, 99) / 1000:.0f}us")
+    if failures:
+        print(f"{len(failures)} requests failed (status {sorted(set(failures))})", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli(sys.argv[1:]))
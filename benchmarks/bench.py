@@ -0,0 +1,252 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import command_parser  # noqa: E402
+import main  # noqa: E402
+from ledger_generator import LedgerGenerator  # noqa: E402
+from settlement import settle_cents  # noqa: E402
+
+# Benchmarks for the hot paths: parse, add, bulk import, balances, settlement
+# and the DataFrames main() renders. Runs headless against a stubbed
+# st.session_state, e.g.
+#
+#     python benchmarks/bench.py --scenario medium --output before.json
+#     python benchmarks/bench.py --scenario medium --compare before.json
+
+SCENARIOS = {
+    "small": {"people": 10, "expenses": 1_000},
+    "medium": {"people": 200, "expenses": 100_000},
+    "large": {"people": 10_000, "expenses": 1_000_000},
+}
+
+# Per-operation benchmarks (parse, add) time at most this many calls
+SAMPLE_SIZE = 20_000
+
+# Calls made while tracing memory; tracemalloc makes every call slower
+MEMORY_SAMPLE_SIZE = 200
+
+# Runs of the whole benchmark; each figure reported (and compared) is its
+# median over the runs, so one noisy run can't fail a comparison
+REPEATS = 5
+
+
+class SessionStateStub(dict):
+    # Enough of st.session_state for ExpenseSplitter outside a Streamlit run
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+def measure(operation, calls, trace_memory=True):
+    # Time every call to operation(i), then run a few more under tracemalloc
+    # for the peak memory
+    durations = np.empty(calls, dtype=np.int64)
+    started = time.perf_counter()
+    for i in range(calls):
+        begin = time.perf_counter_ns()
+        operation(i)
+        durations[i] = time.perf_counter_ns() - begin
+    seconds = time.perf_counter() - started
+
+    result = {
+        "calls": calls,
+        "seconds": seconds,
+        "throughput": calls / seconds if seconds else float("inf"),
+        "p50_us": float(np.percentile(durations, 50)) / 1000,
+        "p99_us": float(np.percentile(durations, 99)) / 1000,
+    }
+    if trace_memory:
+        tracemalloc.start()
+        for i in range(min(calls, MEMORY_SAMPLE_SIZE)):
+            operation(i)
+        result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def run(people, expenses, seed, trace_memory=True):
+    generator = LedgerGenerator(people, seed)
+    sample = min(expenses, SAMPLE_SIZE)
+    commands = list(LedgerGenerator(people, seed).commands(sample))
+    rows = list(LedgerGenerator(people, seed + 1).rows(sample))
+    results = {}
+
+    def fresh_splitter():
+        main.st.session_state = SessionStateStub()
+        return main.ExpenseSplitter()
+
+    results["parse"] = measure(lambda i: command_parser.parse(commands[i], cached=False), sample, trace_memory)
+
+    splitter = fresh_splitter()
+    results["add_expense"] = measure(lambda i: splitter.add_expense(*rows[i % sample]), sample, trace_memory)
+
+    # Bulk import of the whole ledger is a single call; it also builds the
+    # ledger every later benchmark reads. Memory is traced on a second import
+    # so tracemalloc does not skew the timing.
+    splitter = fresh_splitter()
+    started = time.perf_counter()
+    splitter.add_expenses_bulk(generator.rows(expenses))
+    seconds = time.perf_counter() - started
+    results["bulk_import"] = {"calls": 1, "seconds": seconds, "throughput": expenses / seconds}
+    if trace_memory:
+        tracemalloc.start()
+        fresh_splitter().add_expenses_bulk(LedgerGenerator(people, seed).rows(expenses))
+        results["bulk_import"]["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        main.st.session_state.store = splitter.store
+    store = splitter.store
+
+    # The same import with every expense split by shares
+    started = time.perf_counter()
+    fresh_splitter().add_expenses_bulk(LedgerGenerator(people, seed).rows(expenses, uneven=1.0))
+    seconds = time.perf_counter() - started
+    results["bulk_import_weighted"] = {"calls": 1, "seconds": seconds, "throughput": expenses / seconds}
+    main.st.session_state.store = store
+
+    # Derived results are cached per ledger version; bumping the version
+    # before each call measures the real computation
+    def uncached(operation):
+        def call(i):
+            store.version += 1
+            return operation()
+        return call
+
+    repeats = 200
+    results["calculate_balances"] = measure(uncached(splitter.calculate_balances), repeats, trace_memory)
+    results["replay_balances"] = measure(lambda i: store.replay_balances(), 20, trace_memory)
+    balances = splitter.balances_cents()
+    for strategy in ("greedy", "bounded", "auto"):
+        results[f"settle_{strategy}"] = measure(lambda i: settle_cents(balances, strategy), 20, trace_memory)
+    # Suggestions for a misspelt name, matched against everyone in the
+    # ledger (known names never get this far)
+    typos = [name.replace("o", "", 1) for name in store.names]
+    results["suggest_person"] = measure(lambda i: store.people.suggest(typos[i % len(typos)]), repeats, trace_memory)
+    results["history_page"] = measure(uncached(lambda: splitter.history_page(descending=True)), 20, trace_memory)
+    results["history_page_sorted"] = measure(
+        uncached(lambda: splitter.history_page(sort_by="amount", descending=True)), 20, trace_memory,
+    )
+    results["balance_table"] = measure(uncached(splitter.balance_table), repeats, trace_memory)
+
+    # Statements read the store's monthly totals, plus the days at either
+    # end of the period and recurring expenses counted in closed form
+    for number in range(20):
+        splitter.add_recurring(
+            store.names[number % len(store.names)], 10 + number, f"subscription {number}", list(store.names[:4]),
+            "2016-01-01", (1, "month"),
+        )
+    results["statement_month"] = measure(
+        uncached(lambda: splitter.statement("2026-03-01", "2026-04-01")), repeats, trace_memory,
+    )
+    results["statement_all"] = measure(uncached(splitter.statement), repeats, trace_memory)
+    results["statement_partial"] = measure(
+        uncached(lambda: splitter.statement("2026-02-10", "2026-11-20")), 20, trace_memory,
+    )
+    return results
+
+
+def median_results(runs):
+    # Per operation, the median of every figure over the runs (memory is only
+    # traced in the first)
+    results = {}
+    for name in runs[0]:
+        figures = [run[name] for run in runs]
+        results[name] = {
+            key: statistics.median(figure[key] for figure in figures if key in figure) for key in figures[0]
+        }
+        results[name]["repeats"] = len(runs)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    # Flag operations whose p50 latency or throughput (medians over the
+    # runs on both sides) moved the wrong way by more than tolerance (a
+    # fraction)
+    regressions = []
+    print(f"{'operation':<22}{'p50 before':>14}{'p50 now':>14}{'throughput':>14}")
+    for name, now in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        change = now["throughput"] / before["throughput"] - 1
+        line = f"{name:<22}"
+        if "p50_us" in now and "p50_us" in before:
+            line += f"{before['p50_us']:>12.1f}us{now['p50_us']:>12.1f}us"
+            if now["p50_us"] > before["p50_us"] * (1 + tolerance):
+                regressions.append(name)
+        else:
+            line += " " * 28
+        print(f"{line}{change:>+13.1%}")
+        if change < -tolerance and name not in regressions:
+            regressions.append(name)
+    return regressions
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the expense splitter's hot paths")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="medium")
+    parser.add_argument("--people", type=int, help="group size (overrides the scenario)")
+    parser.add_argument("--expenses", type=int, help="ledger size (overrides the scenario)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc passes")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="runs to take the median of")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown before failing (fraction)")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    scenario = dict(SCENARIOS[args.scenario], seed=args.seed)
+    if args.people:
+        scenario["people"] = args.people
+    if args.expenses:
+        scenario["expenses"] = args.expenses
+
+    runs = [
+        run(scenario["people"], scenario["expenses"], args.seed, not args.no_memory and repeat == 0)
+        for repeat in range(max(args.repeats, 1))
+    ]
+    results = median_results(runs)
+    report = {
+        "scenario": scenario,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "results": results,
+    }
+    for name, result in results.items():
+        latency = f"p50 {result['p50_us']:.1f}us p99 {result['p99_us']:.1f}us" if "p50_us" in result else ""
+        memory = f"peak {result['peak_memory_bytes'] / 2 ** 20:.1f} MiB" if "peak_memory_bytes" in result else ""
+        print(f"{name:<22}{result['throughput']:>14,.0f}/s  {latency:<32}{memory}")
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline.get("scenario") != scenario:
+            print(f"warning: baseline scenario {baseline.get('scenario')} differs from {scenario}", file=sys.stderr)
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli(sys.argv[1:]))
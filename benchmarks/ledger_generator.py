@@ -0,0 +1,78 @@
+import numpy as np
+
+from money import SHARES
+
+
+# Seeded synthetic ledgers for the benchmarks. Shapes follow what real
+# groups look like: a few people pay for most things, most expenses are
+# shared by two to four people with the occasional whole-group split, and
+# amounts are log-normal around a restaurant bill.
+
+# Largest split generated; groups up to this size also get whole-group splits
+WHOLE_GROUP_LIMIT = 20
+
+DESCRIPTIONS = ["dinner", "groceries", "taxi", "rent", "movie tickets", "coffee", "fuel", "hotel", "snacks", "museum"]
+
+
+class LedgerGenerator:
+    def __init__(self, people, seed=0, start="2026-01-01", days=365):
+        if people < 2:
+            raise ValueError("A ledger needs at least two people")
+        self.people = [f"person{i}" for i in range(people)]
+        self.random = np.random.default_rng(seed)
+        self.start = np.datetime64(start, "D")
+        self.days = days
+
+        # Zipf-like weights: person k pays about 1 / (k + 1) as often as person 0
+        weights = 1.0 / np.arange(1, people + 1)
+        self.payer_weights = weights / weights.sum()
+
+    def split_sizes(self, count):
+        # Mostly 2-4 people with a long tail; small groups also split about 5%
+        # of expenses between everyone
+        people = len(self.people)
+        sizes = 1 + self.random.geometric(0.45, size=count)
+        if people <= WHOLE_GROUP_LIMIT:
+            sizes[self.random.random(count) < 0.05] = people
+        return np.minimum(sizes, min(people, WHOLE_GROUP_LIMIT))
+
+    def members(self, split):
+        # split distinct people, without shuffling the whole group every time
+        people = len(self.people)
+        if split == people:
+            return list(range(people))
+        picked = set()
+        while len(picked) < split:
+            picked.update(self.random.integers(0, people, size=split - len(picked)).tolist())
+        return list(picked)
+
+    def rows(self, count, chunk=65536, uneven=0.0):
+        # (paid_by, amount, description, split_among, date, split) rows,
+        # generated a chunk at a time so a million rows never sit in memory as
+        # objects. About `uneven` of them split by 1-3 shares per person; the
+        # rest split evenly (split is None).
+        people = self.people
+        for first in range(0, count, chunk):
+            size = min(chunk, count - first)
+            payers = self.random.choice(len(people), size=size, p=self.payer_weights)
+            amounts = np.round(self.random.lognormal(3.2, 0.9, size=size), 2).clip(0.01)
+            descriptions = self.random.choice(len(DESCRIPTIONS), size=size)
+            dates = np.datetime_as_string(self.start + self.random.integers(0, self.days, size=size))
+            sizes = self.split_sizes(size)
+            # Only drawn when asked for, so even ledgers stay the same per seed
+            weighted = self.random.random(size) < uneven if uneven else np.zeros(size, dtype=bool)
+            weights = iter(self.random.integers(1, 4, size=int(sizes[weighted].sum())).tolist() if uneven else ())
+            for payer, amount, description, split, date, is_weighted in zip(
+                payers.tolist(), amounts.tolist(), descriptions.tolist(), sizes.tolist(), dates, weighted.tolist(),
+            ):
+                members = self.members(split)
+                shares = [(SHARES, float(next(weights))) for _ in members] if is_weighted else None
+                yield people[payer], amount, DESCRIPTIONS[description], [people[m] for m in members], str(date), shares
+
+    def commands(self, count, uneven=0.0):
+        # The same rows phrased as chat commands (parsing them adds the payer
+        # to a split they aren't in, as the chat always does)
+        for paid_by, amount, description, split_among, date, split in self.rows(count, uneven=uneven):
+            if split is not None:
+                split_among = [f"{person} {weight:g} shares" for person, (_, weight) in zip(split_among, split)]
+            yield f"{paid_by} paid {amount:.2f} for {description} split among {', '.join(split_among)} on {date}"
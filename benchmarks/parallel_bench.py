@@ -0,0 +1,131 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch  # noqa: E402
+import main  # noqa: E402  (imported here so forked workers don't each import it)
+from expense_store import ExpenseStore  # noqa: E402
+from ledger_generator import LedgerGenerator  # noqa: E402
+from ledger_registry import LedgerRegistry  # noqa: E402
+
+# Scaling of the batch recompute (batch.py) with the number of worker
+# processes: one big ledger's replay sharded over shared memory, and
+# statements for many groups a group per worker, e.g.
+#
+#     python benchmarks/parallel_bench.py --workers 1 2 4 8 --output scaling.json
+#
+# Speedups are against the fewest workers (one by default) and efficiency is
+# speedup per worker added. Both only mean something with as many free cores
+# as workers. No multi-core numbers have been recorded yet: on a 1-CPU
+# machine two workers replay the 2M-row ledger at 0.66x (the pool's overhead,
+# not its scaling), so how far it scales towards 8 cores is still to be
+# measured.
+
+# Timed runs per worker count; the best one is reported
+REPEATS = 3
+
+
+def best_time(operation):
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def scaling(timings):
+    # {workers: seconds} -> {workers: {seconds, speedup, efficiency}}, against
+    # the fewest workers timed
+    fewest = min(timings)
+    return {
+        workers: {
+            "seconds": seconds,
+            "speedup": timings[fewest] / seconds,
+            "efficiency": timings[fewest] / seconds * fewest / workers,
+        }
+        for workers, seconds in timings.items()
+    }
+
+
+def replay_scaling(people, expenses, seed, worker_counts):
+    store = ExpenseStore()
+    store.add_many(LedgerGenerator(people, seed).rows(expenses))
+    expected = store.replay_balances()
+    timings = {}
+    for workers in worker_counts:
+        with batch.worker_pool(workers) as pool:
+            # Forks the workers before the clock starts
+            if not (batch.replay_balances(store, pool, workers) == expected).all():
+                raise AssertionError(f"sharded replay with {workers} workers disagrees with the serial one")
+            timings[workers] = best_time(lambda: batch.replay_balances(store, pool, workers))
+    return scaling(timings)
+
+
+def statement_scaling(groups, people, expenses, seed, worker_counts):
+    with tempfile.TemporaryDirectory() as directory:
+        registry = LedgerRegistry(os.path.join(directory, "ledger.sqlite"))
+        for number in range(groups):
+            group = registry.group(f"group-{number}")
+            rows = LedgerGenerator(people, seed + number).rows(expenses)
+            main.ExpenseSplitter.for_group(group).add_expenses_bulk(rows)
+            group.database.close()
+        paths = registry.saved_groups()
+        timings = {}
+        for workers in worker_counts:
+            with batch.worker_pool(workers) as pool:
+                list(batch.statements(paths, pool, workers, strategy="greedy"))
+                timings[workers] = best_time(lambda: list(batch.statements(paths, pool, workers, strategy="greedy")))
+    return scaling(timings)
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description="Benchmark how the batch recompute scales with worker processes")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--people", type=int, default=1000, help="people in the big ledger")
+    parser.add_argument("--expenses", type=int, default=2_000_000, help="expenses in the big ledger")
+    parser.add_argument("--groups", type=int, default=64)
+    parser.add_argument("--group-people", type=int, default=12)
+    parser.add_argument("--group-expenses", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    worker_counts = sorted(set(args.workers))
+    if os.cpu_count() < worker_counts[-1]:
+        print(f"warning: only {os.cpu_count()} CPUs for up to {worker_counts[-1]} workers", file=sys.stderr)
+    results = {
+        "replay": replay_scaling(args.people, args.expenses, args.seed, worker_counts),
+        "statements": statement_scaling(
+            args.groups, args.group_people, args.group_expenses, args.seed, worker_counts,
+        ),
+    }
+    for name, rows in results.items():
+        for workers, result in rows.items():
+            print(f"{name:<12}{workers:>3} workers{result['seconds']:>10.3f}s"
+                  f"{result['speedup']:>8.2f}x{result['efficiency']:>8.0%}")
+    if args.output:
+        report = {
+            "arguments": vars(args),
+            "cpus": os.cpu_count(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "results": results,
+        }
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli(sys.argv[1:]))
@@ -0,0 +1,162 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Startup and rerun costs of the app: how long a cold "import main" (and the
+# API server, which imports it) takes and which heavy modules it pulls in,
+# then the Streamlit script's first run and reruns with how many messages and
+# bytes each rerun sends to the browser, e.g.
+#
+#     python benchmarks/startup_bench.py --output before.json
+#     python benchmarks/startup_bench.py --compare before.json
+
+# Modules main.py only imports when something needs them
+HEAVY_MODULES = ("pandas", "streamlit", "pyarrow")
+
+# Commands run before timing reruns, so every card of the page is shown
+COMMANDS = (
+    "alice paid 30 for lunch split among alice, bob",
+    "carol paid 9 for snacks split among alice, bob, carol",
+    "bob paid 12 for coffee split among alice, carol",
+)
+
+# Run in a fresh interpreter per sample; prints the import time and what got
+# loaded as JSON
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def cold_import(module, runs):
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout
+        probe = json.loads(output.splitlines()[-1])
+        timings.append(probe["seconds"])
+    return {"runs": runs, "median_seconds": statistics.median(timings), "loaded": probe["loaded"]}
+
+
+class MessageCounter:
+    # Counts the messages (and their serialized bytes) a script run sends
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def install(self):
+        from streamlit.runtime.scriptrunner_utils.script_run_context import ScriptRunContext
+
+        enqueue = ScriptRunContext.enqueue
+        counter = self
+
+        def counted(context, msg):
+            enqueue(context, msg)
+            counter.messages += 1
+            counter.bytes += msg.ByteSize()
+
+        ScriptRunContext.enqueue = counted
+
+    def take(self):
+        counts = self.messages, self.bytes
+        self.messages = self.bytes = 0
+        return counts
+
+
+def reruns(runs):
+    # The app script in-process through Streamlit's test runner: a first run
+    # (an empty ledger), then reruns of a page showing every card
+    from streamlit.testing.v1 import AppTest
+
+    counter = MessageCounter()
+    counter.install()
+    app = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=60)
+    started = time.perf_counter()
+    app.run()
+    first = {"seconds": time.perf_counter() - started}
+    first["messages"], first["bytes"] = counter.take()
+    for command in COMMANDS:
+        app.text_input(key="user_input").set_value(command)
+        app.button(key="submit").click()
+        app.run()
+    if app.exception:
+        raise RuntimeError(f"the app failed: {app.exception[0].value}")
+    counter.take()
+
+    timings, sizes, counts = [], [], []
+    for _ in range(runs):
+        started = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - started)
+        messages, size = counter.take()
+        counts.append(messages)
+        sizes.append(size)
+    rerun = {
+        "runs": runs,
+        "median_seconds": statistics.median(timings),
+        "messages": statistics.median(counts),
+        "bytes": statistics.median(sizes),
+    }
+    return {"first_run": first, "rerun": rerun}
+
+
+def compare(results, baseline):
+    print(f"{'measure':<36}{'before':>14}{'now':>14}{'change':>10}")
+    for name, fields in results.items():
+        for field, now in fields.items():
+            before = baseline.get(name, {}).get(field)
+            if not isinstance(now, (int, float)) or not isinstance(before, (int, float)) or field == "runs":
+                continue
+            change = now / before - 1 if before else 0.0
+            print(f"{name + '.' + field:<36}{before:>14,.6g}{now:>14,.6g}{change:>+10.1%}")
+
+
+def cli(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the app's cold import, first run and reruns")
+    parser.add_argument("--imports", type=int, default=5, help="cold imports timed per module")
+    parser.add_argument("--reruns", type=int, default=20, help="reruns timed")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    args = parser.parse_args(argv)
+
+    # Streamlit sets up its own loggers on import and the test runner warns
+    # about deprecated arguments on every run
+    logging.disable(logging.WARNING)
+    results = {
+        "import_main": cold_import("main", args.imports),
+        "import_api_server": cold_import("api_server", args.imports),
+    }
+    results.update(reruns(args.reruns))
+    for name, result in results.items():
+        line = f"{name:<20}{result.get('median_seconds', result.get('seconds')) * 1000:>10.1f}ms"
+        if "bytes" in result:
+            line += f"{result['messages']:>8} messages{result['bytes'] / 1024:>10.1f} KiB"
+        if "loaded" in result:
+            line += f"  loads {', '.join(result['loaded']) or 'nothing heavy'}"
+        print(line)
+    if args.output:
+        report = {"python": platform.python_version(), "results": results}
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file)["results"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(cli(sys.argv[1:]))
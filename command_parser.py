@@ -0,0 +1,467 @@
+import re
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from money import AMOUNT, PERCENT, SHARES, SYMBOLS
+from settlement import STRATEGIES
+
+
+# Command kinds returned by parse()
+EXPENSE = "expense"
+BALANCE = "balance"
+SUMMARY = "summary"
+HELP = "help"
+CLEAR = "clear"
+OWES = "owes"
+DELETE = "delete"
+EDIT = "edit"
+UNDO = "undo"
+REDO = "redo"
+RATE = "rate"
+PEOPLE = "people"
+RECURRING = "recurring"
+STATEMENT = "statement"
+UNKNOWN = "unknown"
+
+# An amount with an optional currency symbol or code: "40", "$40", "40 eur"
+MONEY = r'(?P<symbol>[$€£¥₹])?(?P<amount>\d+(?:\.\d+)?)(?:\s*(?!for\b)(?P<currency>[a-z]{3})\b)?'
+CURRENCY_SYMBOLS = {symbol: code for code, symbol in SYMBOLS.items()}
+
+# Patterns are compiled once at import instead of going through re's cache
+EXPENSE_PATTERN = re.compile(
+    r'(?P<paid_by>\w+)\s+paid\s+' + MONEY + r'\s+for\s+(?P<description>.+?)'
+    r'((\s+split\s+(?:between|among|with)\s+(?P<split_among>.+?))?(\s+on\s+(?P<date>.+))?)?$'
+)
+PEOPLE_SEPARATOR = re.compile(r',\s*|(?:\s+and\s+)')
+# One person in a split list with how much of it is theirs: "alice 2 shares",
+# "bob 60%", "carol 12.50" or "carol $12.50"
+SPLIT_ENTRY_PATTERN = re.compile(
+    r'(?P<name>.+?)\s+(?:\$(?P<amount>\d+(?:\.\d+)?)|(?P<value>\d+(?:\.\d+)?)\s*(?P<unit>%|shares?)?)'
+)
+OWES_PATTERN = re.compile(r'(?:what|how much) does (?P<person>\w+) owe (?P<other>\w+)\W*$')
+YEAR_MONTH_PATTERN = re.compile(r'\d{4}-\d{2}')
+NAME_PATTERN = re.compile(r'\w*[^\W\d]\w*')
+# "delete 12", "delete expense #12"; "edit 12 amount 40 date 2026-03-01"
+EXPENSE_NUMBER_PATTERN = re.compile(r'(?:delete|remove|edit)\s+(?:expense\s+)?#?(?P<number>\d+)(?:\s+(?P<changes>.+))?$')
+AMOUNT_PATTERN = re.compile(MONEY)
+CURRENCY_PATTERN = re.compile(r'[a-z]{3}')
+# "rate 1 eur = 1.08 usd", "rate eur 1.08 usd on 2026-03-01"
+RATE_PATTERN = re.compile(
+    r'rates?\s+(?:1\s+)?(?P<currency>[a-z]{3})\s*=?\s*(?P<rate>\d+(?:\.\d+)?)\s*(?P<quote>[a-z]{3})'
+    r'(?:\s+on\s+(?P<date>\S+))?$'
+)
+# "alias bobby = bob" (or "alias bobby for bob"), "add person rob"
+ALIAS_PATTERN = re.compile(r'alias\s+(?P<alias>\w+)\s*(?:=|\s(?:as|for)\s)\s*(?P<name>\w+)$')
+ADD_PERSON_PATTERN = re.compile(r'add\s+person\s+(?P<name>\w+)$')
+# How often a recurring expense comes back: "monthly", "every month", "every
+# 2 weeks"
+FREQUENCY = (
+    r'(?P<frequency>daily|weekly|monthly|yearly|annually|'
+    r'(?:every|each)\s+(?:(?P<every>\d+)\s+)?(?P<unit>day|week|month|year)s?)'
+)
+FREQUENCY_WORDS = {"daily", "weekly", "monthly", "yearly", "annually", "every", "each"}
+ADVERB_UNITS = {"daily": "day", "weekly": "week", "monthly": "month", "yearly": "year", "annually": "year"}
+# An expense with how often it comes back, e.g. "alice pays 1200 for rent
+# monthly split among alice, bob from 2026-01-01 until 2026-12-31"
+RECURRING_PATTERN = re.compile(
+    r'(?P<paid_by>\w+)\s+pa(?:ys|id)\s+' + MONEY + r'\s+for\s+(?P<description>.+?)\s+' + FREQUENCY +
+    r'(?:\s+split\s+(?:between|among|with)\s+(?P<split_among>.+?))?'
+    r'(?:\s+(?:from|starting|on)\s+(?P<date>\S+))?(?:\s+until\s+(?P<until>\S+))?$'
+)
+# "stop recurring 2" (after today), "stop recurring r2 after 2026-12-31"
+STOP_PATTERN = re.compile(
+    r'(?:stop|cancel)\s+recurring\s+(?:expense\s+)?#?r?(?P<number>\d+)(?:\s+after\s+(?P<date>\S+))?$'
+)
+
+# Fields "edit" can change, and the ParsedCommand field each one fills in
+EDIT_FIELDS = {
+    "amount": "amount",
+    "description": "description",
+    "payer": "paid_by",
+    "paid_by": "paid_by",
+    "date": "date",
+    "currency": "currency",
+}
+
+MONTHS = {
+    name: number
+    for number, names in enumerate((
+        ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"), ("may",), ("june", "jun"),
+        ("july", "jul"), ("august", "aug"), ("september", "sep", "sept"), ("october", "oct"),
+        ("november", "nov"), ("december", "dec"),
+    ), 1)
+    for name in names
+}
+
+# Commands recognised from their first word alone
+FIRST_WORDS = {
+    "balance": BALANCE,
+    "balances": BALANCE,
+    "summary": SUMMARY,
+    "help": HELP,
+    "clear": CLEAR,
+    "reset": CLEAR,
+    "delete": DELETE,
+    "remove": DELETE,
+    "edit": EDIT,
+    "undo": UNDO,
+    "redo": REDO,
+    "rate": RATE,
+    "rates": RATE,
+    "people": PEOPLE,
+    "alias": PEOPLE,
+    "add": PEOPLE,
+    "recurring": RECURRING,
+    "stop": RECURRING,
+    "cancel": RECURRING,
+    "statement": STATEMENT,
+    "statements": STATEMENT,
+}
+
+# Substring checks for everything else, in priority order
+KEYWORDS = (
+    (("balance", "who owes", "owes who"), BALANCE),
+    (("statement",), STATEMENT),
+    (("summary", "list expenses"), SUMMARY),
+    (("help",), HELP),
+    (("clear", "reset"), CLEAR),
+)
+
+
+@dataclass(frozen=True)
+class ParsedCommand:
+    kind: str
+    paid_by: str = None
+    amount: float = None
+    description: str = None
+    split_among: tuple = None  # None means everyone known so far
+    date: str = None  # None means today
+    # Per person in split_among: None (one share) or a (money.SHARES |
+    # PERCENT | AMOUNT, value) pair; None throughout means an even split
+    split: tuple = None
+    strategy: str = "auto"
+    # Balance and summary filters: a person, and expenses dated start <= date
+    # < end (ISO dates). A month without a year is left in month for
+    # period_bounds() to place. OWES uses person and other.
+    person: str = None
+    other: str = None
+    start: str = None
+    end: str = None
+    month: int = None
+    # Expense number (as shown by summary) for DELETE and EDIT; EDIT puts the
+    # new values in paid_by, amount, description, date and currency
+    number: int = None
+    # Currency code (upper case): of an expense, or the one BALANCE settles
+    # in; None means the ledger's default. RATE sets 1 currency = amount
+    # quote (from date on), or lists the rates when currency is None.
+    currency: str = None
+    quote: str = None
+    # PEOPLE lists everyone when person is None, adds person when other is
+    # None, and otherwise makes other an alias of person. (Names everywhere
+    # are as typed; the ledger matches them to its people.)
+    # RECURRING adds an expense (fields as for EXPENSE) that comes back every
+    # frequency = (count, "day" | "week" | "month" | "year") from date until
+    # the day before end (None: for good). With a number instead, it stops
+    # that recurring expense from end on (None: after today); with neither,
+    # it lists them. STATEMENT takes the balance and summary filters.
+    frequency: tuple = None
+
+
+def parse(command, cached=True):
+    # Normalize, then hit the cache; repeated commands like "balance" are free.
+    # Bulk imports of mostly unique lines pass cached=False to skip the LRU.
+    command = command.lower().strip()
+    if cached:
+        return _parse_normalized(command)
+    return _parse_normalized.__wrapped__(command)
+
+
+@lru_cache(maxsize=4096)
+def _parse_normalized(command):
+    words = command.split()
+    if not words:
+        return ParsedCommand(UNKNOWN)
+
+    # Fast path: a leading keyword, as long as it can't be someone's name
+    # ("edit 3 paid by bob" is still an edit)
+    paying = "paid" in words or "pays" in words
+    kind = FIRST_WORDS.get(words[0])
+    if kind is not None and (not paying or kind == EDIT and words[1] != "paid"):
+        return _keyword_command(kind, words)
+
+    # A recurring expense is an expense that says how often it comes back
+    if paying and not FREQUENCY_WORDS.isdisjoint(words):
+        match = RECURRING_PATTERN.search(command)
+        if match:
+            return _recurring_expense(match)
+
+    # Only try the expense pattern when the command can possibly match it
+    if "paid" in words:
+        match = EXPENSE_PATTERN.search(command)
+        if match:
+            return _expense_command(match)
+
+    if "owe" in words:
+        match = OWES_PATTERN.search(command)
+        if match:
+            return ParsedCommand(OWES, person=match.group('person'), other=match.group('other'))
+
+    for keywords, kind in KEYWORDS:
+        if any(keyword in command for keyword in keywords):
+            return _keyword_command(kind, words)
+    return ParsedCommand(UNKNOWN)
+
+
+def _keyword_command(kind, words):
+    if kind in (DELETE, EDIT):
+        return _change_command(kind, " ".join(words))
+    if kind == RATE:
+        return _rate_command(" ".join(words))
+    if kind == PEOPLE:
+        return _people_command(" ".join(words))
+    if kind == RECURRING:
+        return _recurring_command(" ".join(words))
+    if kind in (BALANCE, SUMMARY, STATEMENT):
+        filters = _filters(words)
+        if filters is None:
+            return ParsedCommand(UNKNOWN)
+        if kind == BALANCE:
+            # An optional strategy name picks the settlement engine, e.g. "balance exact"
+            filters["strategy"] = next((word for word in words if word in STRATEGIES), "auto")
+        return ParsedCommand(kind, **filters)
+    return ParsedCommand(kind)
+
+
+def _filters(words):
+    # "since DATE", "until DATE" (inclusive), "before DATE", "for/in MONTH
+    # [YEAR]", "for/in YYYY-MM", "for/in YYYY", "for NAME" and "in CURRENCY";
+    # None if a date is invalid
+    filters = {}
+    words = [word.strip("?.,!") for word in words]
+    for word, following, after in zip(words, words[1:], words[2:] + [""]):
+        if word in ("since", "from", "until", "through", "before"):
+            date = _normalize_date(following)
+            if date is None:
+                return None
+            if word in ("since", "from"):
+                filters["start"] = date
+            else:
+                filters["end"] = _day_after(date) if word in ("until", "through") else date
+        elif word in ("for", "in") and following in MONTHS:
+            if after.isdigit() and len(after) == 4:
+                filters["start"], filters["end"] = _month_bounds(int(after), MONTHS[following])
+            else:
+                filters["month"] = MONTHS[following]
+        elif word in ("for", "in") and YEAR_MONTH_PATTERN.fullmatch(following):
+            year, month = following.split("-")
+            if not 1 <= int(month) <= 12:
+                return None
+            filters["start"], filters["end"] = _month_bounds(int(year), int(month))
+        elif word in ("for", "in") and following.isdigit() and len(following) == 4:
+            filters["start"], filters["end"] = f"{following}-01-01", f"{int(following) + 1:04d}-01-01"
+        elif word == "for" and NAME_PATTERN.fullmatch(following) and following not in STRATEGIES:
+            filters["person"] = following
+        elif word == "in" and CURRENCY_PATTERN.fullmatch(following):
+            filters["currency"] = following.upper()
+    return filters
+
+
+def period_bounds(parsed, today):
+    # (start, end) ISO dates for a parsed command's period; a month without a
+    # year means its latest occurrence up to today
+    if parsed.month is None:
+        return parsed.start, parsed.end
+    year = today.year if parsed.month <= today.month else today.year - 1
+    return _month_bounds(year, parsed.month)
+
+
+def _month_bounds(year, month):
+    following = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f"{year:04d}-{month:02d}-01", f"{following[0]:04d}-{following[1]:02d}-01"
+
+
+def _day_after(date):
+    return (datetime.strptime(date, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def _change_command(kind, command):
+    # "delete 12" or "edit 12 amount 40 description taxi"; UNKNOWN unless the
+    # number and every edited value are valid
+    match = EXPENSE_NUMBER_PATTERN.fullmatch(command)
+    if not match or int(match.group('number')) < 1:
+        return ParsedCommand(UNKNOWN)
+    number = int(match.group('number'))
+    changes = match.group('changes')
+    if kind == DELETE:
+        return ParsedCommand(UNKNOWN) if changes else ParsedCommand(DELETE, number=number)
+    if not changes:
+        return ParsedCommand(UNKNOWN)
+
+    # Field names split the rest into (field, value) pairs; "paid by" is one
+    # field name. A field name right after another one is part of its value.
+    words = changes.replace("paid by", "paid_by").split()
+    if words[0] not in EDIT_FIELDS:
+        return ParsedCommand(UNKNOWN)
+    fields = {}
+    field = None
+    for word in words:
+        if word in EDIT_FIELDS and EDIT_FIELDS[word] not in fields and (field is None or fields[field]):
+            field = EDIT_FIELDS[word]
+            fields[field] = []
+        else:
+            fields[field].append(word)
+    values = {field: " ".join(value) for field, value in fields.items()}
+    if any(not value for value in values.values()):
+        return ParsedCommand(UNKNOWN)
+
+    if "currency" in values:
+        if not CURRENCY_PATTERN.fullmatch(values["currency"]):
+            return ParsedCommand(UNKNOWN)
+        values["currency"] = values["currency"].upper()
+    if "amount" in values:
+        # "edit 3 amount 40 eur" changes the currency too
+        match = AMOUNT_PATTERN.fullmatch(values["amount"])
+        if not match:
+            return ParsedCommand(UNKNOWN)
+        values["amount"] = float(match.group('amount'))
+        if _currency(match) is not None:
+            values.setdefault("currency", _currency(match))
+    if "date" in values:
+        values["date"] = _normalize_date(values["date"])
+        if values["date"] is None:
+            return ParsedCommand(UNKNOWN)
+    if "paid_by" in values and not NAME_PATTERN.fullmatch(values["paid_by"]):
+        return ParsedCommand(UNKNOWN)
+    return ParsedCommand(EDIT, number=number, **values)
+
+
+def _expense_command(match):
+    paid_by = match.group('paid_by').strip()
+    amount = float(match.group('amount'))
+    currency = _currency(match)
+    description = match.group('description').strip()
+
+    split_among_str = match.group('split_among')
+    date_str = match.group('date')
+
+    # Parse the people to split among, with any shares, percentages or
+    # amounts they were given
+    split_among = split = None
+    if split_among_str:
+        split_among, split = split_entries(PEOPLE_SEPARATOR.split(split_among_str))
+        # Include the payer if they're not already in the list, unless the
+        # list gives out the whole amount in percentages and fixed amounts
+        has_remainder = split is None or any(spec is None or spec[0] == SHARES for spec in split)
+        if paid_by not in split_among and has_remainder:
+            split_among.append(paid_by)
+            if split is not None:
+                split.append(None)
+        split_among = tuple(split_among)
+        split = tuple(split) if split is not None else None
+
+    # Parse the date if provided; anything unparseable falls back to today
+    date = _normalize_date(date_str.strip()) if date_str else None
+
+    return ParsedCommand(EXPENSE, paid_by, amount, description, split_among, date, split=split, currency=currency)
+
+
+def _currency(match):
+    # Currency code of a MONEY match; a code wins over a symbol
+    code = match.group('currency')
+    if code is not None:
+        return code.upper()
+    return CURRENCY_SYMBOLS.get(match.group('symbol'))
+
+
+def _rate_command(command):
+    # "rates" lists them; "rate 1 eur = 1.08 usd [on DATE]" sets one
+    if command in ("rate", "rates"):
+        return ParsedCommand(RATE)
+    match = RATE_PATTERN.fullmatch(command)
+    if not match:
+        return ParsedCommand(UNKNOWN)
+    date = match.group('date')
+    if date is not None:
+        date = _normalize_date(date)
+        if date is None:
+            return ParsedCommand(UNKNOWN)
+    return ParsedCommand(
+        RATE, amount=float(match.group('rate')), date=date,
+        currency=match.group('currency').upper(), quote=match.group('quote').upper(),
+    )
+
+
+def _people_command(command):
+    # "people", "add person NAME" or "alias NAME = NAME"
+    if command == "people":
+        return ParsedCommand(PEOPLE)
+    match = ADD_PERSON_PATTERN.fullmatch(command) or ALIAS_PATTERN.fullmatch(command)
+    if not match or not all(NAME_PATTERN.fullmatch(name) for name in match.groups()):
+        return ParsedCommand(UNKNOWN)
+    if 'alias' in match.groupdict():
+        return ParsedCommand(PEOPLE, person=match.group('name'), other=match.group('alias'))
+    return ParsedCommand(PEOPLE, person=match.group('name'))
+
+
+def _recurring_expense(match):
+    # An EXPENSE command's fields plus how often and until when
+    until = match.group('until')
+    end = None
+    if until is not None:
+        end = _normalize_date(until)
+        if end is None:
+            return ParsedCommand(UNKNOWN)
+        end = _day_after(end)
+    frequency = match.group('frequency')
+    unit = ADVERB_UNITS.get(frequency) or match.group('unit')
+    every = int(match.group('every') or 1)
+    return replace(_expense_command(match), kind=RECURRING, frequency=(every, unit), end=end)
+
+
+def _recurring_command(command):
+    # "recurring" lists them; "stop recurring N [after DATE]" stops one
+    if command == "recurring":
+        return ParsedCommand(RECURRING)
+    match = STOP_PATTERN.fullmatch(command)
+    if not match or int(match.group('number')) < 1:
+        return ParsedCommand(UNKNOWN)
+    end = None
+    if match.group('date') is not None:
+        end = _normalize_date(match.group('date'))
+        if end is None:
+            return ParsedCommand(UNKNOWN)
+        end = _day_after(end)
+    return ParsedCommand(RECURRING, number=int(match.group('number')), end=end)
+
+
+def split_entries(entries):
+    # ["alice 2 shares", "bob"] -> (["alice", "bob"], [(SHARES, 2.0), None]);
+    # the specs are None when nobody was given one
+    names = []
+    split = []
+    for entry in entries:
+        name, spec = _split_entry(entry.strip())
+        names.append(name)
+        split.append(spec)
+    return names, split if any(split) else None
+
+
+@lru_cache(maxsize=65536)
+def _split_entry(entry):
+    # Bulk imports repeat the same few people (and shares) on every row
+    match = SPLIT_ENTRY_PATTERN.fullmatch(entry)
+    if match is None:
+        return entry, None
+    unit = match.group('unit')
+    kind = PERCENT if unit == "%" else SHARES if unit else AMOUNT
+    return match.group('name').strip(), (kind, float(match.group('value') or match.group('amount')))
+
+
+@lru_cache(maxsize=4096)
+def _normalize_date(date_str):
+    # strptime is slow and a ledger only has so many distinct days
+    try:
+        return datetime.strptime(date_str, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        return None
@@ -0,0 +1,173 @@
+from bisect import bisect_right
+from dataclasses import dataclass
+
+import numpy as np
+
+
+# Kinds of event. Undoing an add or a delete logs a delete or a restore;
+# undoing an edit logs the opposite edit.
+ADD = "add"
+DELETE = "delete"
+RESTORE = "restore"
+EDIT = "edit"
+CLEAR = "clear"
+
+# A balance snapshot is taken once the events logged since the last one
+# changed at least this many balances (or as many as a snapshot holds)
+MIN_SNAPSHOT_DELTAS = 1024
+
+# Staged rows and balance changes packed into the log's arrays at a time
+PACK_SIZE = 16384
+
+
+@dataclass(frozen=True, slots=True)
+class LedgerEvent:
+    # One entry of the log, as returned by EventLog.event(). rows are the
+    # expense rows it touched and people/currencies/deltas the balance
+    # changes (cents) it made; before/after are an edited row's fields.
+    kind: str
+    rows: np.ndarray
+    people: np.ndarray
+    currencies: np.ndarray
+    deltas: np.ndarray
+    before: dict = None
+    after: dict = None
+
+
+# Append-only log of every change made to an ExpenseStore, kept columnar like
+# the store itself: the rows and the balance deltas of all events sit in two
+# flat CSR layouts, so logging an add costs a few array slots rather than
+# Python objects. New events are staged in lists and packed into the arrays
+# PACK_SIZE values at a time. Balances after any event are rebuilt from the
+# nearest snapshot plus one vectorized pass over the deltas logged since.
+class EventLog:
+    def __init__(self, balances, capacity=64):
+        self.kinds = []
+        # Packed events: event n's rows are rows[row_offsets[n]:row_offsets[n + 1]]
+        # and its balance changes people/currencies/deltas[delta_offsets[n]:...]
+        self.packed = 0
+        self.row_offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self.rows = np.empty(capacity, dtype=np.int64)
+        self.delta_offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self.people = np.empty(capacity, dtype=np.int32)
+        self.currencies = np.empty(capacity, dtype=np.int16)
+        self.deltas = np.empty(capacity, dtype=np.int64)
+        # Field values of edits, by event number
+        self.edits = {}
+        self._staged = _Staged()
+
+        # snapshot_balances[i] holds the (people, currencies) balances after
+        # the first snapshot_events[i] events
+        self.snapshot_events = [0]
+        self.snapshot_balances = [balances.copy()]
+        self._since_snapshot = 0
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def append(self, kind, rows, people, currencies, deltas, before=None, after=None):
+        # Log an event; returns its number. rows, people, currencies and
+        # deltas are sequences (or numpy arrays).
+        n = len(self.kinds)
+        self.kinds.append(kind)
+        if kind == EDIT:
+            self.edits[n] = (before, after)
+        staged = self._staged
+        staged.append(rows, people, currencies, deltas)
+        self._since_snapshot += len(people)
+        if len(staged.people) + len(staged.rows) >= PACK_SIZE:
+            self.pack()
+        return n
+
+    def pack(self):
+        # Move staged events into the arrays
+        staged = self._staged
+        first, last = self.packed, len(self.kinds)
+        if first == last:
+            return
+        self.row_offsets = _reserve(self.row_offsets, last + 1)
+        self.delta_offsets = _reserve(self.delta_offsets, last + 1)
+        self.rows = _put(self.rows, self.row_offsets, first, last, staged.rows, staged.row_counts)
+        self.people = _put(self.people, self.delta_offsets, first, last, staged.people, staged.delta_counts)
+        self.currencies = _put(self.currencies, self.delta_offsets, first, last, staged.currencies, staged.delta_counts)
+        self.deltas = _put(self.deltas, self.delta_offsets, first, last, staged.deltas, staged.delta_counts)
+        self.packed = last
+        self._staged = _Staged()
+
+    def event(self, n):
+        self.pack()
+        before, after = self.edits.get(n, (None, None))
+        start, end = self.delta_offsets[n], self.delta_offsets[n + 1]
+        return LedgerEvent(
+            self.kinds[n], self.rows[self.row_offsets[n]:self.row_offsets[n + 1]],
+            self.people[start:end], self.currencies[start:end], self.deltas[start:end], before, after,
+        )
+
+    def snapshot_due(self, cells):
+        # Whether replaying from the last snapshot would cost about as much as
+        # copying the balances (cells of them)
+        return self._since_snapshot >= max(MIN_SNAPSHOT_DELTAS, cells)
+
+    def snapshot(self, balances):
+        self.snapshot_events.append(len(self.kinds))
+        self.snapshot_balances.append(balances.copy())
+        self._since_snapshot = 0
+
+    def balances_at(self, events, people, currencies):
+        # Balance per person id and currency id (cents) right after the first
+        # `events` events
+        self.pack()
+        i = bisect_right(self.snapshot_events, events) - 1
+        balances = np.zeros((people, currencies), dtype=np.int64)
+        snapshot = self.snapshot_balances[i]
+        balances[:snapshot.shape[0], :snapshot.shape[1]] = snapshot
+        start, end = self.delta_offsets[self.snapshot_events[i]], self.delta_offsets[events]
+        np.add.at(balances, (self.people[start:end], self.currencies[start:end]), self.deltas[start:end])
+        return balances
+
+
+class _Staged:
+    # Events appended since the last EventLog.pack(), flattened
+    def __init__(self):
+        self.rows = []
+        self.row_counts = []
+        self.people = []
+        self.currencies = []
+        self.deltas = []
+        self.delta_counts = []
+
+    def append(self, rows, people, currencies, deltas):
+        # Bulk events bring numpy arrays; extending a list with those would
+        # box every element
+        if isinstance(rows, np.ndarray):
+            rows = rows.tolist()
+        if isinstance(people, np.ndarray):
+            people, currencies, deltas = people.tolist(), currencies.tolist(), deltas.tolist()
+        self.rows.extend(rows)
+        self.row_counts.append(len(rows))
+        self.people.extend(people)
+        self.currencies.extend(currencies)
+        self.deltas.extend(deltas)
+        self.delta_counts.append(len(people))
+
+
+def _reserve(offsets, size):
+    if size <= len(offsets):
+        return offsets
+    grown = np.zeros(max(size, 2 * len(offsets)), dtype=offsets.dtype)
+    grown[:len(offsets)] = offsets
+    return grown
+
+
+def _put(array, offsets, first, last, values, counts):
+    # Write the values of events first..last - 1 after event first - 1's,
+    # growing array as needed
+    start = offsets[first]
+    end = start + len(values)
+    if end > len(array):
+        grown = np.empty(max(end, 2 * len(array)), dtype=array.dtype)
+        grown[:start] = array[:start]
+        array = grown
+    array[start:end] = values
+    offsets[first + 1:last + 1] = start + np.cumsum(counts)
+    return array
@@ -0,0 +1,759 @@
+import sys
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+from event_log import ADD, CLEAR, DELETE, EDIT, RESTORE, EventLog
+from ledger_index import LedgerIndex, positions_of
+from fx import BASE, RateTable
+from people import PeopleRegistry
+from period_totals import PeriodTotals
+from recurring import Recurring, RecurringSchedule
+from money import (
+    AMOUNT, DEFAULT_CURRENCY, PERCENT, SHARES, allocate_many, balance_deltas, currency_code, split_evenly,
+    split_evenly_many, to_cents,
+)
+
+
+# Orders ExpenseStore.select() and LedgerDatabase.page() understand; "added"
+# is the order expenses were entered in
+SORT_KEYS = ("added", "date", "amount", "paid_by")
+
+# Most derived results (balances, pages, tables...) kept per ledger version
+MAX_DERIVED = 64
+
+# Stop collecting validation errors after this many bad rows
+MAX_REPORTED_ERRORS = 20
+
+# Columnar storage for expenses. Every expense is one row across a handful
+# of numpy columns; the people who share it live in a CSR-style index
+# (offsets into one flat array of person ids, plus each person's share)
+# instead of a list per row. Amounts go in as currency units and are kept as
+# integer cents of the expense's own currency.
+class ExpenseStore:
+    def __init__(self, capacity=64):
+        # People (see people.PeopleRegistry); names is their id -> name list
+        self.people = PeopleRegistry()
+        self.names = self.people.names
+        # Interned currency codes; expenses entered without one are in the
+        # first
+        self.currencies = [DEFAULT_CURRENCY]
+        self.currency_ids = {DEFAULT_CURRENCY: 0}
+
+        self.count = 0
+        # Expenses that exist in persistent storage but have not been read into
+        # the columns yet (see LedgerDatabase.open)
+        self.unloaded = 0
+        self.paid_by = np.empty(capacity, dtype=np.int32)
+        self.amount = np.empty(capacity, dtype=np.int64)  # cents
+        self.date = np.empty(capacity, dtype=np.int64)  # days since 1970-01-01
+        self.currency = np.empty(capacity, dtype=np.int16)
+        self.descriptions = []
+        # Rows are never removed; deleting an expense only marks it
+        self.deleted = np.zeros(capacity, dtype=bool)
+        self.deleted_count = 0
+
+        # Participants of expense i are members[offsets[i]:offsets[i + 1]],
+        # owing the matching shares (cents, summing to the amount)
+        self.offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self.members = np.empty(capacity * 4, dtype=np.int32)
+        self.shares = np.empty(capacity * 4, dtype=np.int64)
+
+        # Running balance per person id and currency id in cents, updated on
+        # every add; each column is one currency's subtotals
+        self.balances = np.zeros((16, 1), dtype=np.int64)
+
+        # Exchange rates balances are converted with (see fx.RateTable)
+        self.rates = RateTable()
+
+        # Recurring expenses; they count towards balances without being rows
+        # (see recurring.RecurringSchedule)
+        self.recurring = RecurringSchedule()
+
+        # Persistent storage that mirrors every change (see LedgerDatabase.open)
+        self.storage = None
+
+        # Bumped by every mutation; results derived from the ledger are cached
+        # against it and dropped as soon as it moves on
+        self.version = 0
+        self._derived = {}
+        self._derived_version = 0
+
+        # Date and person indexes, built on first use (see index())
+        self._index = None
+        # Per-month totals, built on first use and then kept up to date (see
+        # period_totals())
+        self._totals = None
+
+        self.start_log()
+
+    def __len__(self):
+        # Expenses that have not been deleted
+        return self.count + self.unloaded - self.deleted_count
+
+    def start_log(self):
+        # Start an empty event log (and undo history) from the current
+        # balances; the stacks hold event numbers
+        self.log = EventLog(self.subtotals())
+        self.undo_stack = []
+        self.redo_stack = []
+
+    def person_id(self, person):
+        # Id of a name or alias, interning new names (ids pass through) and
+        # growing the balances when a new person shows up
+        if type(person) is int:
+            return person
+        pid = self.people.ids.get(person)
+        if pid is None:
+            pid = self.people.intern(person)
+            if pid >= len(self.balances):
+                self.balances = _grow(self.balances, pid + 1)
+        return pid
+
+    def known_person(self, person):
+        # person_id() for names as typed: a name close to someone's (a likely
+        # typo) raises people.UnknownPerson with suggestions instead of
+        # becoming someone new
+        if type(person) is int:
+            return person
+        pid = self.people.resolve(person)
+        return self.person_id(person) if pid is None else pid
+
+    def add_person(self, name):
+        # Someone new, before they have any expenses; their balance is zero
+        if self.people.find(name) is not None:
+            raise ValueError(f"{name} is already in the ledger")
+        self.people.add(name)
+        pid = self.person_id(name)
+        if self.storage is not None:
+            self.storage.insert_people(self.names, self.currencies)
+        self.version += 1
+        return pid
+
+    def add_alias(self, alias, name):
+        # Let alias stand for a known person from now on (see
+        # PeopleRegistry.alias); returns their id
+        pid = self.people.alias(alias, name)
+        if self.storage is not None:
+            self.storage.add_alias(alias, pid, self.names, self.currencies)
+        return pid
+
+    def currency_id(self, code):
+        # Intern a currency code (None means the first currency), growing the
+        # balances by a column when a new one shows up
+        if code is None:
+            return 0
+        cid = self.currency_ids.get(code)
+        if cid is None:
+            code = currency_code(code)
+            cid = self.currency_ids.get(code)
+            if cid is None:
+                cid = len(self.currencies)
+                self.currencies.append(code)
+                self.currency_ids[code] = cid
+                grown = np.zeros((len(self.balances), cid + 1), dtype=np.int64)
+                grown[:, :cid] = self.balances
+                self.balances = grown
+        return cid
+
+    def set_rate(self, currency, rate, quote=None, date=None):
+        # One unit of currency is worth rate units of quote (the rate table's
+        # base by default) from date on, or on every day when date is None.
+        # Rates don't change the ledger version; converted results are cached
+        # against the rate table's own version.
+        day = None if date is None else _day_number(date)
+        stored = self.rates.set(currency, rate, quote or BASE, day)
+        if self.storage is not None:
+            self.storage.set_rate(*stored)
+        return stored
+
+    def add_recurring(self, paid_by, amount, description, split_among, start, every, unit, split=None,
+                      currency=None, end=None):
+        # An expense that comes back every `every` units ("day", "week",
+        # "month" or "year") from the start date on, until the day before end
+        # (None: for good); split and currency as in add(). Returns its
+        # number in the schedule.
+        cents = _positive_cents(amount)
+        if not split_among:
+            raise ValueError("there is nobody to split the expense among")
+        if split is None:
+            shares = split_evenly(cents, len(split_among))
+        else:
+            shares = _allocate(cents, *_split_columns(split_among, split)).tolist()
+        definition = Recurring(
+            self.person_id(paid_by), cents, sys.intern(description),
+            tuple(self.person_id(person) for person in split_among), tuple(shares), self.currency_id(currency),
+            _day_number(start), every, unit, None if end is None else _day_number(end),
+        )
+        self.recurring.check(definition)
+        if self.storage is not None:
+            self.storage.insert_recurring(len(self.recurring), definition, self.names, self.currencies)
+        self.version += 1
+        return self.recurring.add(definition)
+
+    def stop_recurring(self, number, end):
+        # No more occurrences of recurring expense `number` from the end date
+        # on; returns its updated definition
+        if not 0 <= number < len(self.recurring):
+            raise ValueError("there is no such recurring expense")
+        definition = self.recurring.stop(number, _day_number(end))
+        if self.storage is not None:
+            self.storage.set_recurring_end(number, definition.end)
+        self.version += 1
+        return definition
+
+    def add(self, paid_by, amount, description, split_among, date, split=None, currency=None):
+        # split: per person in split_among, None or a (money.SHARES | PERCENT
+        # | AMOUNT, value) pair; leaving it out splits evenly. currency is a
+        # code, None for the first currency.
+        cents = _positive_cents(amount)
+        if not split_among:
+            raise ValueError("there is nobody to split the expense among")
+        if split is None:
+            shares = split_evenly(cents, len(split_among))
+        else:
+            shares = _allocate(cents, *_split_columns(split_among, split)).tolist()
+        day = _day_number(date)
+        cid = self.currency_id(currency)
+        payer = self.person_id(paid_by)
+        participants = [self.person_id(person) for person in split_among]
+        description = sys.intern(description)
+
+        i = self.count + self.unloaded
+        if self.storage is not None:
+            self.storage.insert(
+                i, np.array([payer], dtype=np.int32), np.array([cents]), np.array([day]), [description],
+                np.array([len(participants)]), np.array(participants, dtype=np.int32), np.array(shares),
+                np.array([cid], dtype=np.int16), self.names, self.currencies,
+            )
+
+        if self.unloaded:
+            # The row itself only lives in storage until the history is loaded
+            self.unloaded += 1
+        else:
+            start = self.offsets[i]
+            end = start + len(participants)
+            self._reserve(i + 1, end)
+            self.paid_by[i] = payer
+            self.amount[i] = cents
+            self.date[i] = day
+            self.currency[i] = cid
+            self.descriptions.append(description)
+            self.members[start:end] = participants
+            self.shares[start:end] = shares
+            self.offsets[i + 1] = end
+            self.count = i + 1
+            if self._totals is not None:
+                self._totals.apply([i])
+
+        # Update the running balances for the payer and each participant
+        balances = self.balances
+        balances[payer, cid] += cents
+        for pid, share in zip(participants, shares):
+            balances[pid, cid] -= share
+        self.version += 1
+        self._log(
+            ADD, (i,), [payer] + participants, [cid] * (len(participants) + 1), [cents] + [-share for share in shares],
+        )
+        return i
+
+    def add_many(self, rows, chunk_size=65536):
+        # Bulk version of add() for (paid_by, amount, description, split_among,
+        # date[, split[, currency]]) rows. Every row is validated before anything is
+        # committed, rows are packed into numpy chunks (shares included) as
+        # they stream in, and the balances are updated once at the end.
+        # Returns the number of rows added.
+        known = len(self.names)
+        chunks = []
+        errors = []
+        batch = _Batch()
+        for number, row in enumerate(rows, 1):
+            # Readers yield a ValueError, naming the line, in place of a row
+            # they could not parse
+            if isinstance(row, Exception):
+                errors.append(str(row))
+            else:
+                try:
+                    batch.append(self, *row)
+                except (TypeError, ValueError) as exc:
+                    errors.append(f"row {number}: {exc}")
+            if len(errors) >= MAX_REPORTED_ERRORS:
+                break
+            if len(batch.payers) >= chunk_size:
+                chunks.append(batch.pack())
+                batch = _Batch()
+        chunks.append(batch.pack())
+
+        if errors:
+            # Forget the people only the rejected rows introduced
+            self.people.truncate(known)
+            raise ValueError("Nothing was imported:\n" + "\n".join(errors))
+
+        columns = list(zip(*chunks))
+        payers, amounts, dates, sizes, members, shares, currencies = (
+            np.concatenate(column) for column in columns[:7]
+        )
+        descriptions = [description for chunk in columns[7] for description in chunk]
+        first = self.count
+        if self.storage is not None:
+            self.storage.insert(
+                first, payers, amounts, dates, descriptions, sizes, members, shares, currencies,
+                self.names, self.currencies,
+            )
+        self.append_rows(payers, amounts, dates, descriptions, sizes, members, shares, currencies)
+
+        people, count = len(self.names), len(self.currencies)
+        deltas = balance_deltas(payers, amounts, sizes, members, shares, currencies, people, count)
+        self.balances[:people, :count] += deltas
+        self.version += 1
+        touched, touched_currencies = np.nonzero(deltas)
+        self._log(ADD, np.arange(first, self.count), touched, touched_currencies, deltas[touched, touched_currencies])
+        return len(payers)
+
+    def append_rows(self, payers, amounts, dates, descriptions, sizes, members, shares, currencies, deleted=None):
+        # Append already-validated columns without touching the balances or
+        # the storage
+        first = self.count
+        last = first + len(payers)
+        start = self.offsets[first]
+        self._reserve(last, start + len(members))
+        self.paid_by[first:last] = payers
+        self.amount[first:last] = amounts
+        self.date[first:last] = dates
+        self.currency[first:last] = currencies
+        self.deleted[first:last] = False if deleted is None else deleted
+        self.descriptions.extend(descriptions)
+        self.members[start:start + len(members)] = members
+        self.shares[start:start + len(members)] = shares
+        self.offsets[first + 1:last + 1] = start + np.cumsum(sizes)
+        self.count = last
+        if self._totals is not None:
+            self._totals.apply(np.flatnonzero(~self.deleted[first:last]) + first)
+        self.version += 1
+
+    # Changes to existing rows. Each applies only the balance deltas of the
+    # rows it touches, writes through to the storage and is logged as a
+    # LedgerEvent that undo() can reverse.
+
+    def delete(self, row):
+        self._check_row(row)
+        self._set_deleted(np.array([row]), True, DELETE)
+
+    def clear(self):
+        # Delete every expense as one undoable event
+        rows = np.flatnonzero(~self.column("deleted"))
+        if len(rows):
+            self._set_deleted(rows, True, CLEAR)
+
+    def edit(self, row, paid_by=None, amount=None, description=None, date=None, currency=None):
+        # Change some fields of an expense; a new amount is split again between
+        # the same people
+        self._check_row(row)
+        before = self._fields(row)
+        after = dict(before)
+        if paid_by is not None:
+            after["paid_by"] = self.known_person(paid_by)
+        if amount is not None:
+            after["amount"] = cents = _positive_cents(amount)
+            shares = before["shares"]
+            if max(shares) - min(shares) <= 1:
+                after["shares"] = split_evenly(cents, len(shares))
+            else:
+                # An uneven split keeps its proportions
+                after["shares"] = _allocate(cents, [0] * len(shares), [0] * len(shares), shares).tolist()
+        if description is not None:
+            after["description"] = sys.intern(description)
+        if date is not None:
+            after["date"] = _day_number(date)
+        if currency is not None:
+            after["currency"] = self.currency_id(currency)
+        self._set_fields(row, before, after)
+
+    def undo(self):
+        # Reverse the latest add, delete, edit or clear; returns its
+        # LedgerEvent, or None when there is nothing to undo
+        if not self.undo_stack:
+            return None
+        n = self.undo_stack.pop()
+        event = self.log.event(n)
+        if event.kind == ADD:
+            self._set_deleted(event.rows, True, DELETE, undoable=False)
+        elif event.kind in (DELETE, CLEAR):
+            self._set_deleted(event.rows, False, RESTORE, undoable=False)
+        else:
+            self._set_fields(int(event.rows[0]), event.after, event.before, undoable=False)
+        self.redo_stack.append(n)
+        return event
+
+    def redo(self):
+        # Apply the latest undone event again
+        if not self.redo_stack:
+            return None
+        n = self.redo_stack.pop()
+        event = self.log.event(n)
+        if event.kind == ADD:
+            self._set_deleted(event.rows, False, RESTORE, undoable=False)
+        elif event.kind in (DELETE, CLEAR):
+            self._set_deleted(event.rows, True, event.kind, undoable=False)
+        else:
+            self._set_fields(int(event.rows[0]), event.before, event.after, undoable=False)
+        self.undo_stack.append(n)
+        return event
+
+    def balances_at(self, events):
+        # Balance per person id and currency id (cents) right after the first
+        # `events` events of the log, replayed from the nearest snapshot
+        # before that point
+        return self.log.balances_at(events, len(self.names), len(self.currencies))
+
+    def _log(self, kind, rows, people, currencies, deltas, before=None, after=None, undoable=True):
+        n = self.log.append(kind, rows, people, currencies, deltas, before, after)
+        if undoable:
+            self.undo_stack.append(n)
+            self.redo_stack.clear()
+        if self.log.snapshot_due(len(self.names) * len(self.currencies)):
+            self.log.snapshot(self.subtotals())
+
+    def _check_row(self, row):
+        if not 0 <= row < self.count + self.unloaded:
+            raise ValueError(f"There is no expense {row + 1}.")
+        if row >= self.count:
+            raise ValueError("Load the history before changing older expenses.")
+        if self.deleted[row]:
+            raise ValueError(f"Expense {row + 1} has been deleted.")
+
+    def _fields(self, row):
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return {
+            "paid_by": int(self.paid_by[row]),
+            "amount": int(self.amount[row]),
+            "description": self.descriptions[row],
+            "date": int(self.date[row]),
+            "currency": int(self.currency[row]),
+            "shares": self.shares[start:end].tolist(),
+        }
+
+    def _set_deleted(self, rows, deleted, kind, undoable=True):
+        # Mark rows deleted (or restore them) and take (or give back) their
+        # share of the balances
+        positions = positions_of(self.offsets, rows)
+        currencies = self.currency[rows]
+        people, currencies, deltas = _aggregate(
+            np.concatenate([self.paid_by[rows], self.members[positions]]),
+            np.concatenate([currencies, np.repeat(currencies, self.offsets[rows + 1] - self.offsets[rows])]),
+            np.concatenate([self.amount[rows], -self.shares[positions]]),
+            len(self.currencies),
+        )
+        if deleted:
+            deltas = -deltas
+        if self.storage is not None:
+            self.storage.set_deleted(rows, deleted, people, currencies, deltas)
+        self.deleted[rows] = deleted
+        self.deleted_count += len(rows) if deleted else -len(rows)
+        if self._totals is not None:
+            self._totals.apply(rows, -1 if deleted else 1)
+        self.balances[people, currencies] += deltas
+        self._changed()
+        self._log(kind, rows, people, currencies, deltas, undoable=undoable)
+
+    def _set_fields(self, row, before, after, undoable=True):
+        # Replace a row's fields, moving the balances by the difference
+        start, end = self.offsets[row], self.offsets[row + 1]
+        members = self.members[start:end]
+        people, currencies, deltas = _aggregate(
+            np.concatenate([[before["paid_by"], after["paid_by"]], members, members]),
+            np.repeat([before["currency"], after["currency"]] * 2, [1, 1, end - start, end - start]),
+            np.concatenate([[-before["amount"], after["amount"]], before["shares"], np.negative(after["shares"])]),
+            len(self.currencies),
+        )
+        if self.storage is not None:
+            self.storage.update(row, after, people, currencies, deltas, self.names, self.currencies)
+        if self._totals is not None:
+            self._totals.apply([row], -1)
+        self.paid_by[row] = after["paid_by"]
+        self.amount[row] = after["amount"]
+        self.descriptions[row] = after["description"]
+        self.date[row] = after["date"]
+        self.currency[row] = after["currency"]
+        self.shares[start:end] = after["shares"]
+        if self._totals is not None:
+            self._totals.apply([row])
+        self.balances[people, currencies] += deltas
+        self._changed()
+        self._log(EDIT, (row,), people, currencies, deltas, before, after, undoable=undoable)
+
+    def _changed(self):
+        # Existing rows changed: the indexes are rebuilt on next use and cached
+        # results expire with the version
+        self._index = None
+        self.version += 1
+
+    def cached(self, key, compute):
+        # compute() once per ledger version and key
+        if self._derived_version != self.version:
+            self._derived.clear()
+            self._derived_version = self.version
+        if key not in self._derived:
+            if len(self._derived) >= MAX_DERIVED:
+                self._derived.pop(next(iter(self._derived)))
+            self._derived[key] = compute()
+        return self._derived[key]
+
+    def index(self):
+        # Date and person indexes over the rows in memory; unlike cached()
+        # results they survive new rows and are only rebuilt now and then
+        if self._index is None:
+            self._index = LedgerIndex(self)
+        else:
+            self._index.refresh()
+        return self._index
+
+    def period_totals(self):
+        # Per-month totals of the rows (see period_totals.PeriodTotals); the
+        # history has to be in memory
+        if self.unloaded:
+            raise ValueError("Load the history before reading period totals.")
+        if self._totals is None:
+            self._totals = PeriodTotals(self)
+        return self._totals
+
+    def _reserve(self, rows, members):
+        if rows > len(self.paid_by):
+            size = max(rows, 2 * len(self.paid_by))
+            self.paid_by = _grow(self.paid_by, size)
+            self.amount = _grow(self.amount, size)
+            self.date = _grow(self.date, size)
+            self.currency = _grow(self.currency, size)
+            self.deleted = _grow(self.deleted, size)
+            self.offsets = _grow(self.offsets, size + 1)
+        if members > len(self.members):
+            size = max(members, 2 * len(self.members))
+            self.members = _grow(self.members, size)
+            self.shares = _grow(self.shares, size)
+
+    # Views over the filled part of each column (no copies)
+
+    def column(self, name):
+        return getattr(self, name)[:self.count]
+
+    def sizes(self):
+        return np.diff(self.offsets[:self.count + 1])
+
+    def date_strings(self, rows=slice(None)):
+        return np.datetime_as_string(self.column("date")[rows].view("datetime64[D]"))
+
+    def select(self, sort_by="added", descending=False, person=None, text=None):
+        # Row numbers matching the filters, in display order. Filtering and
+        # sorting run over whole columns; nothing is formatted here.
+        if sort_by not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key {sort_by!r}, expected one of {', '.join(SORT_KEYS)}")
+        keep = ~self.column("deleted")
+        if person is not None:
+            pid = self.people.find(person)
+            found = np.zeros(self.count, dtype=bool)
+            if pid is not None:
+                found[self.index().rows(pid)] = True
+            keep &= found
+        if text:
+            # Test each distinct description once, then look rows up
+            hits = {description for description in set(self.descriptions) if text in description}
+            keep &= np.fromiter((description in hits for description in self.descriptions), dtype=bool, count=self.count)
+        rows = np.flatnonzero(keep)
+
+        if sort_by == "paid_by":
+            rank = np.empty(len(self.names), dtype=np.int64)
+            rank[np.argsort(np.array(self.names, dtype=object))] = np.arange(len(self.names))
+            rows = rows[np.argsort(rank[self.paid_by[rows]], kind="stable")]
+        elif sort_by != "added":
+            rows = rows[np.argsort(self.column(sort_by)[rows], kind="stable")]
+        return rows[::-1] if descending else rows
+
+    def page_columns(self, rows):
+        # Display columns for just the given rows
+        return {
+            "#": rows + 1,
+            "Date": self.date_strings(rows),
+            "Description": [self.descriptions[i] for i in rows],
+            "Amount": self.amount[rows] / 100,
+            "Currency": [self.currencies[cid] for cid in self.currency[rows]],
+            "Paid By": [self.names[pid] for pid in self.paid_by[rows]],
+            "Split Among": [", ".join(self.participants(i)) for i in rows],
+        }
+
+    def participants(self, i):
+        return [self.names[pid] for pid in self.members[self.offsets[i]:self.offsets[i + 1]]]
+
+    def expense(self, i):
+        return {
+            "date": str(self.date[i].astype("datetime64[D]")),
+            "paid_by": self.names[self.paid_by[i]],
+            "amount": self.amount[i] / 100,
+            "currency": self.currencies[self.currency[i]],
+            "description": self.descriptions[i],
+            "split_among": self.participants(i),
+        }
+
+    def __iter__(self):
+        for i in np.flatnonzero(~self.column("deleted")).tolist():
+            yield self.expense(i)
+
+    def set_balances(self, subtotals):
+        # Replace the running balances (cents, people by currencies), e.g.
+        # with replay_balances() when they are found to be off; the undo
+        # history starts over from them
+        people, count = subtotals.shape
+        self.balances[:people, :count] = subtotals
+        if self.storage is not None:
+            self.storage.replace_balances(subtotals)
+        self.version += 1
+        self.start_log()
+
+    def subtotals(self):
+        # Running balances (cents) as a (people, currencies) view
+        return self.balances[:len(self.names), :len(self.currencies)]
+
+    def replay_balances(self):
+        # Rebuild every balance (cents, people by currencies) from the columns
+        # in a couple of bincounts
+        live = ~self.column("deleted")
+        end = self.offsets[self.count]
+        shared = np.repeat(live, self.sizes())
+        return balance_deltas(
+            self.column("paid_by")[live], self.column("amount")[live], self.sizes()[live],
+            self.members[:end][shared], self.shares[:end][shared], self.column("currency")[live],
+            len(self.names), len(self.currencies),
+        )
+
+
+class _Batch:
+    # Rows staged by add_many() before they are packed into numpy chunks
+    def __init__(self):
+        self.payers = []
+        self.amounts = []
+        self.dates = []
+        self.currencies = []
+        self.sizes = []
+        self.members = []
+        self.descriptions = []
+        # Per-participant split columns (see money.allocate_many), only kept
+        # once a row in the batch has an uneven split
+        self.split = None
+
+    def append(self, store, paid_by, amount, description, split_among, date, split=None, currency=None):
+        cents = _positive_cents(amount)
+        cid = store.currency_id(currency)
+        day = _day_number(datetime.now().strftime("%Y-%m-%d") if date is None else date)
+        if split_among is None:
+            if split is not None:
+                raise ValueError("an uneven split needs the people to split among")
+            participants = list(range(len(store.names)))
+        else:
+            participants = [store.known_person(person) for person in split_among]
+        if not participants:
+            raise ValueError("there is nobody to split the expense among")
+        if split is not None:
+            columns = _split_columns(split_among, split)
+            _check_split(cents, *columns)
+            if self.split is None:
+                # Everyone so far gets one share of their expense
+                staged = len(self.members)
+                self.split = ([0] * staged, [0.0] * staged, [1.0] * staged)
+            for column, values in zip(self.split, columns):
+                column.extend(values)
+        elif self.split is not None:
+            fixed, percents, weights = self.split
+            fixed.extend([0] * len(participants))
+            percents.extend([0.0] * len(participants))
+            weights.extend([1.0] * len(participants))
+
+        self.payers.append(store.known_person(paid_by))
+        self.amounts.append(cents)
+        self.dates.append(day)
+        self.currencies.append(cid)
+        self.sizes.append(len(participants))
+        self.members.extend(participants)
+        self.descriptions.append(sys.intern(description))
+
+    def pack(self):
+        amounts = np.array(self.amounts, dtype=np.int64)
+        sizes = np.array(self.sizes, dtype=np.int64)
+        if self.split is None:
+            shares = split_evenly_many(amounts, sizes)
+        else:
+            fixed, percents, weights = self.split
+            shares, _ = allocate_many(
+                amounts, sizes, np.array(fixed, dtype=np.int64), np.array(percents), np.array(weights),
+            )
+        return (
+            np.array(self.payers, dtype=np.int32),
+            amounts,
+            np.array(self.dates, dtype=np.int64),
+            sizes,
+            np.array(self.members, dtype=np.int32),
+            shares,
+            np.array(self.currencies, dtype=np.int16),
+            self.descriptions,
+        )
+
+
+def _positive_cents(amount):
+    cents = to_cents(amount)
+    if cents <= 0:
+        raise ValueError(f"amount must be at least 0.01, got {amount!r}")
+    return cents
+
+
+@lru_cache(maxsize=4096)
+def _day_number(date):
+    # Days since 1970-01-01; cached since bulk rows share a handful of dates
+    return int(np.datetime64(date, "D").astype(np.int64))
+
+
+def _split_columns(split_among, split):
+    # Per-person (fixed cents, percent, weight) lists for money.allocate_many
+    if len(split) != len(split_among):
+        raise ValueError(f"the split has {len(split)} parts for {len(split_among)} people")
+    fixed, percents, weights = [], [], []
+    for spec in split:
+        kind, value = spec if spec is not None else (SHARES, 1.0)
+        fixed.append(to_cents(value) if kind == AMOUNT else 0)
+        percents.append(float(value) if kind == PERCENT else 0.0)
+        weights.append(float(value) if kind == SHARES else 0.0)
+    return fixed, percents, weights
+
+
+def _check_split(cents, fixed, percents, weights):
+    claimed = sum(fixed) + cents * sum(percents) / 100
+    if claimed > cents + 0.005:
+        raise ValueError(f"the split gives out {claimed / 100:.2f}, more than the {cents / 100:.2f} paid")
+    if claimed < cents - 0.005 and not any(weights):
+        raise ValueError(f"the split only gives out {claimed / 100:.2f} of the {cents / 100:.2f} paid")
+
+
+def _allocate(cents, fixed, percents, weights):
+    # One expense's shares (cents) from its split columns
+    _check_split(cents, fixed, percents, weights)
+    shares, _ = allocate_many(
+        np.array([cents]), np.array([len(fixed)]),
+        np.array(fixed, dtype=np.int64), np.array(percents, dtype=float), np.array(weights, dtype=float),
+    )
+    return shares
+
+
+def _aggregate(people, currencies, deltas, count):
+    # Sum deltas per (person, currency) out of count currencies, dropping
+    # the pairs whose total is zero
+    keys = np.asarray(people, dtype=np.int64) * count + currencies
+    keys, slots = np.unique(keys, return_inverse=True)
+    totals = np.zeros(len(keys), dtype=np.int64)
+    np.add.at(totals, slots, np.asarray(deltas, dtype=np.int64))
+    touched = totals != 0
+    return keys[touched] // count, keys[touched] % count, totals[touched]
+
+
+def _grow(array, size):
+    # More rows (first dimension), zero-filled
+    grown = np.zeros((size,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
@@ -0,0 +1,148 @@
+import csv
+import io
+import json
+import os
+from itertools import compress
+
+import numpy as np
+
+from money import split_evenly_many
+
+
+# Writers for exports. Tables are streamed as chunks (dicts of equal-length
+# column lists), so only one chunk is ever formatted at a time. Expense
+# columns match what importer.py reads, so a CSV or JSONL export can be
+# imported again.
+
+FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+TABLES = ("expenses", "balances", "settlements")
+
+# Expenses formatted per chunk
+CHUNK_SIZE = 65536
+
+
+def format_for(path):
+    # Export format from a file name, e.g. "trip.parquet" -> "parquet"
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    fmt = {"ndjson": "jsonl"}.get(extension, extension)
+    if fmt not in FORMATS:
+        raise ValueError(f"Can't tell the export format of {path!r}, expected one of {', '.join(FORMATS)}")
+    return fmt
+
+
+def expense_chunks(store, chunk_size=CHUNK_SIZE):
+    # The store's expenses in the order they were added, without the deleted
+    # ones. Uneven splits list everyone's amount ("carol 12.50"), which the
+    # import reads back as the same split.
+    names = store.names
+    for first in range(0, max(store.count, 1), chunk_size):
+        last = min(first + chunk_size, store.count)
+        rows = slice(first, last)
+        # Participants of the whole chunk at once, then cut per expense
+        bounds = store.offsets[first:last + 1].tolist()
+        members = [names[pid] for pid in store.members[bounds[0]:bounds[-1]].tolist()]
+        split_among = [members[start - bounds[0]:end - bounds[0]] for start, end in zip(bounds, bounds[1:])]
+        sizes = np.diff(store.offsets[first:last + 1])
+        shares = store.shares[bounds[0]:bounds[-1]]
+        uneven = np.bincount(
+            np.repeat(np.arange(last - first), sizes), shares != split_evenly_many(store.amount[rows], sizes),
+            minlength=last - first,
+        )
+        for i in np.flatnonzero(uneven).tolist():
+            cents = shares[bounds[i] - bounds[0]:bounds[i + 1] - bounds[0]].tolist()
+            split_among[i] = [f"{name} {share / 100:.2f}" for name, share in zip(split_among[i], cents)]
+        chunk = {
+            "paid_by": [names[pid] for pid in store.paid_by[rows].tolist()],
+            "amount": (store.amount[rows] / 100).tolist(),
+            "description": store.descriptions[rows],
+            "split_among": split_among,
+            "date": store.date_strings(rows).tolist(),
+            "currency": [store.currencies[cid] for cid in store.currency[rows].tolist()],
+        }
+        deleted = store.deleted[rows]
+        if deleted.any():
+            # Leave deleted expenses out
+            live = (~deleted).tolist()
+            chunk = {name: list(compress(column, live)) for name, column in chunk.items()}
+        yield chunk
+
+
+def balance_chunks(balances, currency):
+    # balances: {person: cents in currency}
+    yield {
+        "person": list(balances),
+        "balance": [cents / 100 for cents in balances.values()],
+        "currency": [currency] * len(balances),
+    }
+
+
+def settlement_chunks(transactions, currency):
+    # transactions: get_transactions() output, in currency
+    yield {
+        "from": [t["from"] for t in transactions],
+        "to": [t["to"] for t in transactions],
+        "amount": [t["amount"] for t in transactions],
+        "currency": [currency] * len(transactions),
+    }
+
+
+def write(chunks, fmt, file):
+    # Write chunks to a binary file object in the given format
+    if fmt == "parquet":
+        return write_parquet(chunks, file)
+    text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+    try:
+        if fmt == "csv":
+            write_csv(chunks, text)
+        elif fmt == "jsonl":
+            write_jsonl(chunks, text)
+        else:
+            raise ValueError(f"Unknown export format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    finally:
+        text.flush()
+        text.detach()
+
+
+def write_csv(chunks, file):
+    # Lists (split_among) are written as "mary; bob", the way the import reads them
+    writer = None
+    for chunk in chunks:
+        if writer is None:
+            writer = csv.writer(file)
+            writer.writerow(chunk)
+        columns = [
+            ["; ".join(value) for value in column] if name == "split_among" else column
+            for name, column in chunk.items()
+        ]
+        writer.writerows(zip(*columns))
+
+
+def write_jsonl(chunks, file):
+    for chunk in chunks:
+        names = list(chunk)
+        file.writelines(json.dumps(dict(zip(names, row))) + "\n" for row in zip(*chunk.values()))
+
+
+def write_parquet(chunks, file):
+    # One row group per chunk; needs pyarrow
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet export needs pyarrow (pip install pyarrow)") from None
+
+    types = {"amount": pa.float64(), "balance": pa.float64(), "split_among": pa.list_(pa.string())}
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                schema = pa.schema([(name, types.get(name, pa.string())) for name in chunk])
+                writer = pq.ParquetWriter(file, schema)
+            writer.write_table(pa.table(chunk, schema=schema))
+    finally:
+        if writer is not None:
+            writer.close()
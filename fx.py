@@ -0,0 +1,121 @@
+import csv
+import math
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from money import DEFAULT_CURRENCY, currency_code
+
+
+# Exchange rates for settling a ledger in one currency. Every rate is kept as
+# the value of one unit in BASE, optionally from a given day on; conversions
+# use each currency's latest rate on or before the day asked for, or its
+# latest rate overall. Rates quoted against another currency go through that
+# currency's own rate.
+BASE = DEFAULT_CURRENCY
+
+# Day (days since 1970-01-01) of rates entered without a date; they apply to
+# every day until a dated rate takes over
+UNDATED = -2 ** 62
+
+
+class RateTable:
+    def __init__(self):
+        # currency -> ascending days, and the rate from each of them on
+        self.days = {}
+        self.values = {}
+        # Bumped by every change; results converted with the table are cached
+        # against it
+        self.version = 0
+        self._factors = {}
+
+    def copy(self):
+        table = RateTable()
+        table.days = {currency: list(days) for currency, days in self.days.items()}
+        table.values = {currency: list(values) for currency, values in self.values.items()}
+        return table
+
+    def currencies(self):
+        return sorted({BASE, *self.days})
+
+    def latest(self):
+        # (currency, day, rate in BASE) of each currency's latest rate
+        return [(currency, self.days[currency][-1], self.values[currency][-1]) for currency in sorted(self.days)]
+
+    def rate(self, currency, day=None):
+        # Value of one unit of currency in BASE on day (None: the latest rate)
+        if currency == BASE:
+            return 1.0
+        days = self.days.get(currency, ())
+        i = len(days) - 1 if day is None else bisect_right(days, day) - 1
+        if i < 0:
+            since = "" if day is None or not days else f" on or before {np.datetime64(day, 'D')}"
+            raise ValueError(
+                f"there is no {currency} exchange rate{since}; add one with "
+                f"'rate 1 {currency.lower()} = ... {BASE.lower()}'"
+            )
+        return self.values[currency][i]
+
+    def set(self, currency, rate, quote=BASE, day=None):
+        # One unit of currency is worth rate units of quote, from day on (or
+        # always, when day is None). Either currency may be the new one, as
+        # long as the other already has a rate. Returns the (currency, day,
+        # rate in BASE) that was stored.
+        currency, quote = currency_code(currency), currency_code(quote)
+        rate = float(rate)
+        if not math.isfinite(rate) or rate <= 0:
+            raise ValueError(f"exchange rates must be positive numbers, got {rate!r}")
+        if currency == quote:
+            raise ValueError(f"can't set a rate from {currency} to itself")
+        if quote == BASE or quote in self.days:
+            stored = currency, rate * self.rate(quote, day)
+        elif currency == BASE or currency in self.days:
+            stored = quote, self.rate(currency, day) / rate
+        else:
+            raise ValueError(f"add a rate for {currency} or {quote} in {BASE} first")
+        day = UNDATED if day is None else day
+        self.put(stored[0], day, stored[1])
+        return stored[0], day, stored[1]
+
+    def put(self, currency, day, value):
+        # Store a rate in BASE as is (e.g. when reading it back from a ledger)
+        days = self.days.setdefault(currency, [])
+        values = self.values.setdefault(currency, [])
+        i = bisect_left(days, day)
+        if i < len(days) and days[i] == day:
+            values[i] = value
+        else:
+            days.insert(i, day)
+            values.insert(i, value)
+        self.version += 1
+        self._factors.clear()
+
+    def factors(self, currencies, settle, day=None):
+        # What one unit of each of currencies (a tuple of codes) is worth in
+        # settle on day, as an array; cached until the table changes
+        key = (currencies, settle, day)
+        factors = self._factors.get(key)
+        if factors is None:
+            # Settling in a ledger's only currency needs no rates at all
+            factors = np.ones(len(currencies))
+            others = [i for i, currency in enumerate(currencies) if currency != settle]
+            if others:
+                target = self.rate(settle, day)
+                factors[others] = [self.rate(currencies[i], day) / target for i in others]
+            self._factors[key] = factors
+        return factors
+
+    def load(self, path):
+        # Read rates from a CSV file with currency and rate columns, and
+        # optionally quote (default BASE) and date; returns how many were read
+        with open(path, newline="", encoding="utf-8") as file:
+            count = 0
+            for number, record in enumerate(csv.DictReader(file), 2):
+                try:
+                    date = (record.get("date") or "").strip()
+                    day = int(np.datetime64(date, "D").astype(np.int64)) if date else None
+                    self.set(record["currency"], record["rate"], record.get("quote") or BASE, day)
+                except (KeyError, TypeError, ValueError) as exc:
+                    raise ValueError(f"{path} line {number}: {exc}") from None
+                count += 1
+        return count
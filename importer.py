@@ -0,0 +1,111 @@
+import csv
+import json
+import os
+from functools import lru_cache
+
+import command_parser
+
+
+# Readers for the bulk import. Each yields (paid_by, amount, description,
+# split_among, date, split, currency) rows one at a time, or a ValueError for a line it
+# could not make sense of, so ExpenseStore.add_many() can report every bad
+# line.
+
+# Types a field of a JSON expense object may have (None means left out);
+# names may be numbers too
+NAME_TYPES = (str, int, float)
+FIELD_TYPES = {
+    "paid_by": NAME_TYPES, "amount": (str, int, float), "description": str, "split_among": (str, list),
+    "date": str, "currency": str,
+}
+
+
+def iter_rows(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return csv_rows(path)
+    if extension in (".jsonl", ".ndjson"):
+        return jsonl_rows(path)
+    return command_rows(path)
+
+
+def command_rows(path):
+    # One chat command per line, e.g. "john paid 50 for dinner split among mary"
+    with open(path, encoding="utf-8") as file:
+        for number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parsed = command_parser.parse(line, cached=False)
+            if parsed.kind != command_parser.EXPENSE:
+                yield ValueError(f"line {number} is not an expense: {line!r}")
+                continue
+            yield (
+                parsed.paid_by, parsed.amount, parsed.description, parsed.split_among, parsed.date, parsed.split,
+                parsed.currency,
+            )
+
+
+def csv_rows(path):
+    # Columns: paid_by, amount, description, split_among, date, currency.
+    # split_among is a list like "mary; bob" (empty means everyone) whose
+    # entries may carry a share ("mary 2 shares", "bob 60%", "carol 12.50");
+    # date and currency (a code like "EUR") are optional.
+    with open(path, newline="", encoding="utf-8") as file:
+        for record in csv.DictReader(file):
+            yield _structured_row(record)
+
+
+def jsonl_rows(path):
+    # One JSON object per line with the same keys as the CSV columns;
+    # split_among may also be a JSON list
+    with open(path, encoding="utf-8") as file:
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield ValueError(f"line {number} is not valid JSON: {exc}")
+                continue
+            yield _structured_row(record)
+
+
+def record_rows(records):
+    # Rows from already-decoded records (dicts with the CSV column names),
+    # e.g. the body of an API request
+    for record in records:
+        yield _structured_row(record) if isinstance(record, dict) else ValueError(f"not an expense object: {record!r}")
+
+
+def _structured_row(record):
+    try:
+        paid_by = record["paid_by"]
+        amount = record["amount"]
+    except (KeyError, TypeError):
+        return ValueError(f"missing paid_by or amount in {record!r}")
+    for field, types in FIELD_TYPES.items():
+        value = record.get(field)
+        if value is not None and (not isinstance(value, types) or isinstance(value, bool)):
+            return ValueError(f"{field} has the wrong type ({type(value).__name__}) in {record!r}")
+
+    split_among = record.get("split_among") or None
+    if isinstance(split_among, str):
+        split_among = command_parser.PEOPLE_SEPARATOR.split(split_among.replace(";", ","))
+    split = None
+    if split_among is not None:
+        if not all(isinstance(person, NAME_TYPES) and not isinstance(person, bool) for person in split_among):
+            return ValueError(f"split_among must be a list of names in {record!r}")
+        # Names are lower-cased to line up with people entered through chat commands
+        split_among = [_name(person) for person in split_among if str(person).strip()]
+        split_among, split = command_parser.split_entries(split_among)
+
+    return (
+        _name(paid_by), amount, record.get("description") or "", split_among, record.get("date") or None, split,
+        record.get("currency") or None,
+    )
+
+
+@lru_cache(maxsize=65536)
+def _name(person):
+    return str(person).strip().lower()
@@ -0,0 +1,31 @@
+import importlib
+
+
+# Stand-in for a module that is slow to import and that some entry points
+# never use: streamlit for the API server, the command line and batch
+# workers, pandas until a table is shown. The module is imported the first
+# time an attribute is read (or set) and every access after that goes
+# straight to it.
+class LazyModule:
+    def __init__(self, name):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            module = importlib.import_module(self._name)
+            object.__setattr__(self, "_module", module)
+        return module
+
+    def __getattr__(self, attribute):
+        # Only called for what isn't found on the stand-in itself
+        return getattr(self._load(), attribute)
+
+    def __setattr__(self, attribute, value):
+        # e.g. benchmarks swapping st.session_state for a stub
+        setattr(self._load(), attribute, value)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded yet"
+        return f"<lazy module {self._name!r} ({state})>"
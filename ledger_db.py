@@ -0,0 +1,379 @@
+import sqlite3
+import threading
+
+import numpy as np
+
+from money import DEFAULT_CURRENCY, balance_deltas
+from recurring import Recurring
+
+
+# SQLite storage for one ledger. Rows mirror the ExpenseStore: expense ids
+# are store row numbers, person and currency ids are the store's interned ids
+# and money is integer cents of the expense's currency. Deleted expenses are
+# only flagged. Per-person, per-currency balances are materialized and kept
+# up to date in the same transaction as every insert, edit and delete, so
+# opening a ledger never replays history. Exchange rates are kept as the
+# value of one unit in fx.BASE, by day (fx.UNDATED for undated ones).
+# Aliases map other spellings to a person (see people.PeopleRegistry).
+# Recurring expenses are kept as their schedules (see recurring.Recurring),
+# never as expense rows.
+SCHEMA_VERSION = 6
+# Tables added in version 6
+RECURRING_SCHEMA = """
+CREATE TABLE IF NOT EXISTS recurring (
+    id INTEGER PRIMARY KEY,
+    paid_by INTEGER NOT NULL REFERENCES people (id),
+    amount INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    currency INTEGER NOT NULL REFERENCES currencies (id),
+    start INTEGER NOT NULL,
+    every INTEGER NOT NULL,
+    unit TEXT NOT NULL,
+    until INTEGER
+);
+CREATE TABLE IF NOT EXISTS recurring_participants (
+    recurring_id INTEGER NOT NULL REFERENCES recurring (id),
+    position INTEGER NOT NULL,
+    person_id INTEGER NOT NULL REFERENCES people (id),
+    share INTEGER NOT NULL,
+    PRIMARY KEY (recurring_id, position)
+) WITHOUT ROWID;
+"""
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS people (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS currencies (
+    id INTEGER PRIMARY KEY,
+    code TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY,
+    paid_by INTEGER NOT NULL REFERENCES people (id),
+    amount INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    date INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    currency INTEGER NOT NULL DEFAULT 0 REFERENCES currencies (id)
+);
+CREATE INDEX IF NOT EXISTS expenses_date ON expenses (date);
+CREATE INDEX IF NOT EXISTS expenses_paid_by ON expenses (paid_by);
+CREATE TABLE IF NOT EXISTS participants (
+    expense_id INTEGER NOT NULL REFERENCES expenses (id),
+    position INTEGER NOT NULL,
+    person_id INTEGER NOT NULL REFERENCES people (id),
+    share INTEGER NOT NULL,
+    PRIMARY KEY (expense_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS participants_person ON participants (person_id);
+CREATE TABLE IF NOT EXISTS balances (
+    person_id INTEGER NOT NULL REFERENCES people (id),
+    currency INTEGER NOT NULL REFERENCES currencies (id),
+    balance INTEGER NOT NULL,
+    PRIMARY KEY (person_id, currency)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rates (
+    currency TEXT NOT NULL,
+    day INTEGER NOT NULL,
+    rate REAL NOT NULL,
+    PRIMARY KEY (currency, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT PRIMARY KEY,
+    person_id INTEGER NOT NULL REFERENCES people (id)
+);
+""" + RECURRING_SCHEMA
+# Upgrades from older schema versions, keyed by the version they start from
+MIGRATIONS = {
+    2: "ALTER TABLE expenses ADD COLUMN deleted INTEGER NOT NULL DEFAULT 0;",
+    # Everything so far was in the default currency, id 0
+    3: f"""
+    CREATE TABLE currencies (id INTEGER PRIMARY KEY, code TEXT NOT NULL UNIQUE);
+    INSERT INTO currencies (id, code) VALUES (0, '{DEFAULT_CURRENCY}');
+    ALTER TABLE expenses ADD COLUMN currency INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE balances RENAME TO old_balances;
+    CREATE TABLE balances (
+        person_id INTEGER NOT NULL REFERENCES people (id),
+        currency INTEGER NOT NULL REFERENCES currencies (id),
+        balance INTEGER NOT NULL,
+        PRIMARY KEY (person_id, currency)
+    ) WITHOUT ROWID;
+    INSERT INTO balances (person_id, currency, balance) SELECT person_id, 0, balance FROM old_balances;
+    DROP TABLE old_balances;
+    CREATE TABLE rates (
+        currency TEXT NOT NULL,
+        day INTEGER NOT NULL,
+        rate REAL NOT NULL,
+        PRIMARY KEY (currency, day)
+    ) WITHOUT ROWID;
+    """,
+    4: "CREATE TABLE aliases (alias TEXT PRIMARY KEY, person_id INTEGER NOT NULL REFERENCES people (id));",
+    5: RECURRING_SCHEMA,
+}
+
+# Statements are kept as constants so sqlite3's statement cache reuses the
+# compiled (prepared) form across calls
+INSERT_PERSON = "INSERT INTO people (id, name) VALUES (?, ?)"
+INSERT_CURRENCY = "INSERT INTO currencies (id, code) VALUES (?, ?)"
+INSERT_EXPENSE = "INSERT INTO expenses (id, paid_by, amount, description, date, currency) VALUES (?, ?, ?, ?, ?, ?)"
+INSERT_PARTICIPANT = "INSERT INTO participants (expense_id, position, person_id, share) VALUES (?, ?, ?, ?)"
+ADD_TO_BALANCE = (
+    "INSERT INTO balances (person_id, currency, balance) VALUES (?, ?, ?) "
+    "ON CONFLICT (person_id, currency) DO UPDATE SET balance = balance + excluded.balance"
+)
+CLEAR_BALANCES = "DELETE FROM balances"
+SET_DELETED = "UPDATE expenses SET deleted = ? WHERE id = ?"
+UPDATE_EXPENSE = "UPDATE expenses SET paid_by = ?, amount = ?, description = ?, date = ?, currency = ? WHERE id = ?"
+UPDATE_SHARE = "UPDATE participants SET share = ? WHERE expense_id = ? AND position = ?"
+INSERT_ALIAS = "INSERT INTO aliases (alias, person_id) VALUES (?, ?)"
+SET_RATE = "INSERT OR REPLACE INTO rates (currency, day, rate) VALUES (?, ?, ?)"
+INSERT_RECURRING = (
+    "INSERT INTO recurring (id, paid_by, amount, description, currency, start, every, unit, until) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+INSERT_RECURRING_PARTICIPANT = (
+    "INSERT INTO recurring_participants (recurring_id, position, person_id, share) VALUES (?, ?, ?, ?)"
+)
+SET_RECURRING_END = "UPDATE recurring SET until = ? WHERE id = ?"
+PAGE_COLUMNS = """
+SELECT e.id + 1, e.date, e.description, e.amount, (SELECT code FROM currencies WHERE id = e.currency), payer.name,
+       (SELECT group_concat(name, ', ') FROM (
+            SELECT person.name FROM participants AS p
+            JOIN people AS person ON person.id = p.person_id
+            WHERE p.expense_id = e.id ORDER BY p.position))
+"""
+PAGE_FILTERS = """
+FROM expenses AS e JOIN people AS payer ON payer.id = e.paid_by
+WHERE e.deleted = 0
+  AND (:person IS NULL OR payer.name = :person OR EXISTS (
+           SELECT 1 FROM participants AS p JOIN people AS person ON person.id = p.person_id
+           WHERE p.expense_id = e.id AND person.name = :person))
+  AND (:text IS NULL OR instr(e.description, :text) > 0)
+"""
+# SQL for each key in expense_store.SORT_KEYS
+SORT_COLUMNS = {"added": "e.id", "date": "e.date, e.id", "amount": "e.amount, e.id", "paid_by": "payer.name, e.id"}
+
+# Rows fetched per round trip when loading the full history
+FETCH_SIZE = 65536
+
+
+class LedgerDatabase:
+    def __init__(self, path):
+        self.path = path
+        # The connection may be shared between Streamlit sessions; writes and
+        # multi-statement reads take the lock
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        version = self._scalar("PRAGMA user_version")
+        if version == 0 and not self._scalar("SELECT COUNT(*) FROM sqlite_master"):
+            self.connection.executescript(SCHEMA + f"PRAGMA user_version = {SCHEMA_VERSION};")
+            version = SCHEMA_VERSION
+        while version in MIGRATIONS:
+            self.connection.executescript(
+                f"BEGIN; {MIGRATIONS[version]} PRAGMA user_version = {version + 1}; COMMIT;"
+            )
+            version += 1
+        if version != SCHEMA_VERSION:
+            raise ValueError(f"{path} uses ledger schema version {version}, expected {SCHEMA_VERSION}")
+        self.people = self._scalar("SELECT COUNT(*) FROM people")
+        self.currencies = self._scalar("SELECT COUNT(*) FROM currencies")
+
+    def close(self):
+        self.connection.close()
+
+    def _scalar(self, sql, arguments=()):
+        return self.connection.execute(sql, arguments).fetchone()[0]
+
+    def expense_count(self):
+        # Every row, deleted or not; store row numbers continue after them
+        return self._scalar("SELECT COUNT(*) FROM expenses")
+
+    def open(self, store):
+        # Load people, aliases, currencies, rates, recurring expenses and
+        # materialized balances into an empty store and make this database
+        # its storage; the expense rows stay on disk until load_history() is
+        # called
+        for pid, name in self.connection.execute("SELECT id, name FROM people ORDER BY id"):
+            store.people.add(name)
+            if store.person_id(name) != pid:
+                raise ValueError(f"{self.path} has a gap in its people ids at {pid}")
+        for alias, pid in self.connection.execute("SELECT alias, person_id FROM aliases ORDER BY rowid"):
+            store.people.alias(alias, store.names[pid])
+        for cid, code in self.connection.execute("SELECT id, code FROM currencies ORDER BY id"):
+            if store.currency_id(code) != cid:
+                raise ValueError(f"{self.path} has a gap in its currency ids at {cid}")
+        for pid, cid, balance in self.connection.execute("SELECT person_id, currency, balance FROM balances"):
+            store.balances[pid, cid] = balance
+        for currency, day, rate in self.connection.execute("SELECT currency, day, rate FROM rates"):
+            store.rates.put(currency, day, rate)
+        participants = {}
+        for rid, pid, share in self.connection.execute(
+            "SELECT recurring_id, person_id, share FROM recurring_participants ORDER BY recurring_id, position"
+        ):
+            participants.setdefault(rid, []).append((pid, share))
+        for rid, paid_by, amount, description, cid, start, every, unit, until in self.connection.execute(
+            "SELECT id, paid_by, amount, description, currency, start, every, unit, until FROM recurring ORDER BY id"
+        ):
+            members, shares = zip(*participants[rid])
+            definition = Recurring(paid_by, amount, description, members, shares, cid, start, every, unit, until)
+            if store.recurring.add(definition) != rid:
+                raise ValueError(f"{self.path} has a gap in its recurring expense ids at {rid}")
+        store.unloaded = self.expense_count()
+        store.deleted_count = self._scalar("SELECT COUNT(*) FROM expenses WHERE deleted")
+        store.storage = self
+        store.start_log()
+
+    def load_history(self, store):
+        # Read every expense into the store's columns, a chunk at a time
+        if not store.unloaded:
+            return
+        if store.count:
+            raise ValueError("Can only load the history into a store that has no rows in memory")
+
+        with self.lock:
+            payers, amounts, dates, currencies, deleted, descriptions = self._read_columns(
+                "SELECT paid_by, amount, date, currency, deleted, description FROM expenses ORDER BY id",
+                np.int32, np.int64, np.int64, np.int16, bool, None,
+            )
+            expense_ids, members, shares = self._read_columns(
+                "SELECT expense_id, person_id, share FROM participants ORDER BY expense_id, position",
+                np.int64, np.int32, np.int64,
+            )
+        sizes = np.bincount(expense_ids, minlength=len(payers))
+        store.unloaded = 0
+        store.append_rows(payers, amounts, dates, descriptions, sizes, members, shares, currencies, deleted)
+
+    def _read_columns(self, sql, *dtypes):
+        # Run a query and collect each result column into a numpy array (or a
+        # list where the dtype is None), FETCH_SIZE rows at a time
+        chunks = [[] for _ in dtypes]
+        cursor = self.connection.execute(sql)
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            for chunk, values, dtype in zip(chunks, zip(*rows), dtypes):
+                chunk.append(values if dtype is None else np.array(values, dtype=dtype))
+        return [
+            [value for values in chunk for value in values] if dtype is None
+            else np.concatenate(chunk) if chunk else np.zeros(0, dtype=dtype)
+            for chunk, dtype in zip(chunks, dtypes)
+        ]
+
+    def page(self, sort_by="added", descending=False, person=None, text=None, limit=20, offset=0):
+        # One page of history straight from disk, filtered and sorted by SQLite.
+        # Returns the number of matching expenses and the page's display columns.
+        direction = " DESC" if descending else ""
+        order = ", ".join(column + direction for column in SORT_COLUMNS[sort_by].split(", "))
+        arguments = {"person": person, "text": text or None, "limit": limit, "offset": offset}
+        total = self._scalar("SELECT COUNT(*)" + PAGE_FILTERS, arguments)
+        rows = self.connection.execute(
+            PAGE_COLUMNS + PAGE_FILTERS + f"ORDER BY {order} LIMIT :limit OFFSET :offset", arguments
+        ).fetchall()
+        numbers, dates, descriptions, amounts, currencies, payers, split_among = zip(*rows) if rows else ([],) * 7
+        return total, {
+            "#": np.array(numbers, dtype=np.int64),
+            "Date": np.datetime_as_string(np.array(dates, dtype=np.int64).view("datetime64[D]")),
+            "Description": list(descriptions),
+            "Amount": np.array(amounts, dtype=np.int64) / 100,
+            "Currency": list(currencies),
+            "Paid By": list(payers),
+            "Split Among": list(split_among),
+        }
+
+    def insert(self, first, payers, amounts, dates, descriptions, sizes, members, shares, currencies, names, codes):
+        # Persist expenses first, first + 1, ... given as store columns (cents),
+        # along with any people and currencies the store interned since the
+        # last write
+        ids = np.arange(first, first + len(payers))
+        member_expenses = np.repeat(ids, sizes)
+        positions = np.arange(len(members)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+
+        deltas = balance_deltas(payers, amounts, sizes, members, shares, currencies, len(names), len(codes))
+        people, touched = np.nonzero(deltas)
+
+        # One transaction: new people and currencies, the rows and the balance
+        # deltas
+        with self.lock, self.connection:
+            self._insert_names(names, codes)
+            self.connection.executemany(INSERT_EXPENSE, zip(
+                ids.tolist(), payers.tolist(), amounts.tolist(), descriptions, dates.tolist(), currencies.tolist(),
+            ))
+            self.connection.executemany(INSERT_PARTICIPANT, zip(
+                member_expenses.tolist(), positions.tolist(), members.tolist(), shares.tolist(),
+            ))
+            self.connection.executemany(ADD_TO_BALANCE, zip(
+                people.tolist(), touched.tolist(), deltas[people, touched].tolist(),
+            ))
+
+    def set_deleted(self, rows, deleted, people, currencies, deltas):
+        # Flag (or unflag) expenses as deleted and apply the balance deltas
+        # (cents per person id and currency id) that come with it
+        with self.lock, self.connection:
+            self.connection.executemany(SET_DELETED, ((int(deleted), row) for row in rows.tolist()))
+            self.connection.executemany(ADD_TO_BALANCE, zip(people.tolist(), currencies.tolist(), deltas.tolist()))
+
+    def update(self, row, fields, people, currencies, deltas, names, codes):
+        # Rewrite one expense from store fields (see ExpenseStore.edit()) and
+        # apply the balance deltas the edit makes
+        with self.lock, self.connection:
+            self._insert_names(names, codes)
+            self.connection.execute(UPDATE_EXPENSE, (
+                fields["paid_by"], fields["amount"], fields["description"], fields["date"], fields["currency"], row,
+            ))
+            self.connection.executemany(UPDATE_SHARE, (
+                (share, row, position) for position, share in enumerate(fields["shares"])
+            ))
+            self.connection.executemany(ADD_TO_BALANCE, zip(people.tolist(), currencies.tolist(), deltas.tolist()))
+
+    def replace_balances(self, subtotals):
+        # Overwrite every materialized balance (see ExpenseStore.set_balances())
+        people, currencies = np.nonzero(subtotals)
+        with self.lock, self.connection:
+            self.connection.execute(CLEAR_BALANCES)
+            self.connection.executemany(ADD_TO_BALANCE, zip(
+                people.tolist(), currencies.tolist(), subtotals[people, currencies].tolist(),
+            ))
+
+    def set_rate(self, currency, day, rate):
+        # Keep one rate (in fx.BASE) from fx.RateTable.set()
+        with self.lock, self.connection:
+            self.connection.execute(SET_RATE, (currency, day, rate))
+
+    def insert_recurring(self, number, definition, names, codes):
+        # Keep a recurring.Recurring as recurring expense `number`
+        with self.lock, self.connection:
+            self._insert_names(names, codes)
+            self.connection.execute(INSERT_RECURRING, (
+                number, definition.paid_by, definition.amount, definition.description, definition.currency,
+                definition.start, definition.every, definition.unit, definition.end,
+            ))
+            self.connection.executemany(INSERT_RECURRING_PARTICIPANT, (
+                (number, position, pid, share)
+                for position, (pid, share) in enumerate(zip(definition.members, definition.shares))
+            ))
+
+    def set_recurring_end(self, number, end):
+        with self.lock, self.connection:
+            self.connection.execute(SET_RECURRING_END, (end, number))
+
+    def insert_people(self, names, codes):
+        # People added before they have any expenses
+        with self.lock, self.connection:
+            self._insert_names(names, codes)
+
+    def add_alias(self, alias, pid, names, codes):
+        with self.lock, self.connection:
+            self._insert_names(names, codes)
+            self.connection.execute(INSERT_ALIAS, (alias, pid))
+
+    def _insert_names(self, names, codes):
+        # People and currencies the store interned since they were last
+        # written; called inside a write transaction
+        self.connection.executemany(INSERT_PERSON, ((pid, names[pid]) for pid in range(self.people, len(names))))
+        self.people = len(names)
+        self.connection.executemany(INSERT_CURRENCY, ((cid, codes[cid]) for cid in range(self.currencies, len(codes))))
+        self.currencies = len(codes)
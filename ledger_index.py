@@ -0,0 +1,215 @@
+import numpy as np
+
+from money import balance_deltas, bincount_cents
+
+
+# Rows added since the last rebuild are scanned directly until there are more
+# than MIN_TAIL of them and more than 1/TAIL_FRACTION of the indexed rows, so
+# rebuilding costs O(log n) per added row on average
+MIN_TAIL = 1024
+TAIL_FRACTION = 8
+
+# Largest balance snapshot table (buckets x people x currencies); past it
+# each bucket covers several months
+MAX_SNAPSHOT_CELLS = 2 ** 22
+
+
+def day_number(date):
+    # ISO date string (or None) -> days since 1970-01-01
+    return None if date is None else int(np.datetime64(date, "D").astype(np.int64))
+
+
+def month_numbers(days):
+    # Day numbers -> months since 1970-01
+    return np.asarray(days, dtype=np.int64).view("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+def month_starts(months):
+    # Months since 1970-01 -> day numbers of their first days
+    return np.asarray(months, dtype=np.int64).view("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+
+
+# Date and person indexes over the rows of an ExpenseStore:
+#
+# - every row in date order, for date ranges by binary search
+# - per-person posting lists (rows they paid, participant positions they
+#   appear in), in the same CSR layout as the store's participant index
+# - cumulative balance snapshots (per person and currency) at the start of
+#   every month bucket, so the balances before any date are a snapshot plus
+#   the rows of one bucket
+#
+# The indexes cover the live (not deleted) rows among the first `indexed`;
+# rows added after that are scanned directly until refresh() decides a
+# rebuild is due (or a new currency shows up). Editing, deleting or restoring rows drops the whole index
+# (see ExpenseStore.index()).
+class LedgerIndex:
+    def __init__(self, store):
+        self.store = store
+        self.build()
+
+    def refresh(self):
+        tail = self.store.count - self.indexed
+        if (
+            tail < 0 or tail > max(MIN_TAIL, self.indexed // TAIL_FRACTION)
+            or len(self.store.currencies) != self.currencies
+        ):
+            self.build()
+
+    def build(self):
+        store = self.store
+        count = store.count
+        people = len(store.names)
+        currencies = len(store.currencies)
+        self.indexed = count
+        self.people = people
+        self.currencies = currencies
+
+        rows = np.flatnonzero(~store.column("deleted"))
+        positions = positions_of(store.offsets, rows)
+        dates = store.date[rows]
+        payers = store.paid_by[rows]
+        members = store.members[positions]
+
+        order = np.argsort(dates, kind="stable")
+        self.order = rows[order]
+        self.sorted_dates = dates[order]
+
+        # Posting lists; stable sorts keep each person's entries in row order
+        self.member_rows = np.repeat(np.arange(count), store.sizes())
+        self.member_positions = positions[np.argsort(members, kind="stable")]
+        self.member_offsets = _offsets(members, people)
+        self.payer_rows = rows[np.argsort(payers, kind="stable")]
+        self.payer_offsets = _offsets(payers, people)
+
+        # Month buckets, widened so the snapshot table stays bounded
+        months = dates.view("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        self.first_month = int(months.min()) if len(rows) else 0
+        span = int(months.max()) - self.first_month + 1 if len(rows) else 1
+        self.step = max(1, -(-span * max(people * currencies, 1) // MAX_SNAPSHOT_CELLS))
+        buckets = -(-span // self.step)
+        row_buckets = np.zeros(count, dtype=np.int64)
+        row_buckets[rows] = (months - self.first_month) // self.step
+
+        # snapshots[b] holds every balance before bucket b starts. Each bucket
+        # is one block of the people's balance rows, so the deltas of all
+        # buckets come out of one balance_deltas() call.
+        deltas = balance_deltas(
+            row_buckets[rows] * people + payers, store.amount[rows], store.sizes()[rows],
+            row_buckets[self.member_rows[positions]] * people + members, store.shares[positions],
+            store.currency[rows], buckets * people, currencies,
+        )
+        self.snapshots = np.zeros((buckets + 1, people, currencies), dtype=np.int64)
+        np.cumsum(deltas.reshape(buckets, people, currencies), axis=0, out=self.snapshots[1:])
+        bucket_months = self.first_month + np.arange(buckets + 1) * self.step
+        bucket_days = bucket_months.astype("datetime64[M]").astype("datetime64[D]").astype(np.int64)
+        self.bucket_starts = np.searchsorted(self.sorted_dates, bucket_days)
+
+    def _tail_rows(self):
+        return np.arange(self.indexed, self.store.count)
+
+    def _balances_before(self, day):
+        # Balances (cents, indexed rows only) from expenses dated before day
+        if day is None or not len(self.order):
+            return np.zeros((self.people, self.currencies), dtype=np.int64)
+        month = int(np.datetime64(day, "D").astype("datetime64[M]").astype(np.int64))
+        bucket = (month - self.first_month) // self.step
+        if bucket < 0:
+            return np.zeros((self.people, self.currencies), dtype=np.int64)
+        if bucket >= len(self.snapshots) - 1:
+            return self.snapshots[-1].copy()
+        # The bucket's snapshot plus the bucket's rows dated before day
+        first = self.bucket_starts[bucket]
+        last = np.searchsorted(self.sorted_dates, day)
+        return self.snapshots[bucket] + self._deltas(self.order[first:last], self.people)
+
+    def _deltas(self, rows, people):
+        # Balance changes (cents, people by currencies) from the given rows
+        store = self.store
+        positions = positions_of(store.offsets, rows)
+        return balance_deltas(
+            store.paid_by[rows], store.amount[rows], store.offsets[rows + 1] - store.offsets[rows],
+            store.members[positions], store.shares[positions], store.currency[rows], people, self.currencies,
+        )
+
+    def balances_between(self, start=None, end=None):
+        # Balance per person id and currency id (cents) from expenses dated
+        # start <= date < end (ISO dates; None leaves that side open)
+        start, end = day_number(start), day_number(end)
+        people = len(self.store.names)
+        balances = np.zeros((people, self.currencies), dtype=np.int64)
+        after = self.snapshots[-1] if end is None else self._balances_before(end)
+        balances[:self.people] = after - self._balances_before(start)
+
+        tail = self._tail_rows()
+        dates = self.store.date[tail]
+        balances += self._deltas(tail[_in_range(dates, start, end)], people)
+        return balances
+
+    def rows(self, pid=None, start=None, end=None):
+        # Rows, in the order they were added, that pid paid for or shares in
+        # (anyone when pid is None) dated start <= date < end
+        start, end = day_number(start), day_number(end)
+        store = self.store
+        tail = self._tail_rows()
+        if pid is None:
+            first = 0 if start is None else np.searchsorted(self.sorted_dates, start)
+            last = len(self.order) if end is None else np.searchsorted(self.sorted_dates, end)
+            return np.concatenate([np.sort(self.order[first:last]), tail[_in_range(store.date[tail], start, end)]])
+
+        rows = [tail[store.paid_by[tail] == pid]]
+        positions = self._tail_positions()
+        rows.append(self._rows_of(positions[store.members[positions] == pid]))
+        if pid < self.people:
+            rows.append(self.payer_rows[self.payer_offsets[pid]:self.payer_offsets[pid + 1]])
+            rows.append(self.member_rows[self.member_positions[self.member_offsets[pid]:self.member_offsets[pid + 1]]])
+        rows = np.unique(np.concatenate(rows))
+        return rows[_in_range(store.date[rows], start, end)]
+
+    def owed(self, debtor, creditor):
+        # Cents debtor owes creditor across the expenses they shared, per
+        # currency id: debtor's shares of what creditor paid, less creditor's
+        # shares of what debtor paid. Negative when creditor is the one who
+        # owes.
+        return self._shares_of(debtor, creditor) - self._shares_of(creditor, debtor)
+
+    def _shares_of(self, pid, payer):
+        store = self.store
+        positions = self._tail_positions()
+        positions = [positions[store.members[positions] == pid]]
+        if pid < self.people:
+            positions.append(self.member_positions[self.member_offsets[pid]:self.member_offsets[pid + 1]])
+        positions = np.concatenate(positions)
+        rows = self._rows_of(positions)
+        paid = store.paid_by[rows] == payer
+        return bincount_cents(store.currency[rows[paid]], store.shares[positions[paid]], len(store.currencies))
+
+    def _tail_positions(self):
+        offsets = self.store.offsets
+        return np.arange(offsets[self.indexed], offsets[self.store.count])
+
+    def _rows_of(self, positions):
+        # Row of each participant position
+        offsets = self.store.offsets[:self.store.count + 1]
+        return np.searchsorted(offsets, positions, side="right") - 1
+
+
+def _offsets(ids, people):
+    offsets = np.zeros(people + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ids, minlength=people), out=offsets[1:])
+    return offsets
+
+
+def positions_of(offsets, rows):
+    # Participant positions of the given rows, row by row
+    starts = offsets[rows]
+    sizes = offsets[rows + 1] - starts
+    return np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+
+
+def _in_range(dates, start, end):
+    keep = np.ones(len(dates), dtype=bool)
+    if start is not None:
+        keep &= dates >= start
+    if end is not None:
+        keep &= dates < end
+    return keep
@@ -0,0 +1,109 @@
+import os
+import re
+import threading
+from functools import lru_cache
+
+from expense_store import ExpenseStore
+from fx import RateTable
+from ledger_db import LedgerDatabase
+
+
+# Group shown to sessions that did not pick one
+DEFAULT_GROUP = "default"
+
+# Group ids end up in URLs and database file names
+GROUP_ID_PATTERN = re.compile(r"[a-z0-9_-]{1,64}")
+
+# Files SQLite keeps next to a database (only an issue for paths without an
+# extension)
+SQLITE_SIDE_FILES = ("-wal", "-shm", "-journal")
+
+
+def normalize_group_id(group_id):
+    group_id = group_id.strip().lower()
+    if not GROUP_ID_PATTERN.fullmatch(group_id):
+        raise ValueError(f"Group ids are 1-64 letters, digits, '-' or '_', got {group_id!r}")
+    return group_id
+
+
+class LedgerGroup:
+    # One shared ledger: the store, the database it writes through to (if
+    # any) and the lock every reader and writer of the store takes. The
+    # store's rate table starts as a copy of rates, if given.
+    def __init__(self, group_id, database=None, rates=None):
+        self.group_id = group_id
+        self.store = ExpenseStore()
+        if rates is not None:
+            self.store.rates = rates.copy()
+        self.database = database
+        # Reentrant, since ExpenseSplitter methods call each other
+        self.lock = threading.RLock()
+
+
+# Process-wide ledgers keyed by group id. Every session and device that opens
+# the same group shares one store, so memory grows with the number of groups
+# rather than the number of sessions. The registry lock only guards the
+# group table; work on a ledger takes that group's own lock.
+class LedgerRegistry:
+    def __init__(self, database_path=None, rates=None):
+        # Where the default group is kept; other groups go next to it, e.g.
+        # ledger.sqlite -> ledger.trip-2026.sqlite. None or "" keeps groups in
+        # memory. rates (a fx.RateTable, e.g. loaded from a file) are every
+        # group's starting exchange rates; rates a group sets are its own.
+        self.database_path = database_path
+        self.rates = rates if rates is not None else RateTable()
+        self.lock = threading.Lock()
+        self.groups = {}
+
+    def __len__(self):
+        return len(self.groups)
+
+    def database_path_for(self, group_id):
+        if not self.database_path:
+            return None
+        if group_id == DEFAULT_GROUP:
+            return self.database_path
+        root, extension = os.path.splitext(self.database_path)
+        return f"{root}.{group_id}{extension}"
+
+    def saved_groups(self):
+        # {group id: database path} of every group with a ledger on disk
+        if not self.database_path:
+            return {}
+        groups = {DEFAULT_GROUP: self.database_path} if os.path.exists(self.database_path) else {}
+        root, extension = os.path.splitext(self.database_path)
+        prefix = os.path.basename(root) + "."
+        for entry in sorted(os.scandir(os.path.dirname(self.database_path) or "."), key=lambda entry: entry.name):
+            name = entry.name
+            if not name.startswith(prefix) or not name.endswith(extension) or name.endswith(SQLITE_SIDE_FILES):
+                continue
+            group_id = name[len(prefix):len(name) - len(extension)]
+            if GROUP_ID_PATTERN.fullmatch(group_id) and group_id != DEFAULT_GROUP:
+                groups[group_id] = entry.path
+        return groups
+
+    def group(self, group_id=DEFAULT_GROUP):
+        # The shared ledger for group_id, created (or opened from disk) on
+        # first use
+        group_id = normalize_group_id(group_id)
+        group = self.groups.get(group_id)
+        if group is not None:
+            return group
+        with self.lock:
+            group = self.groups.get(group_id)
+            if group is None:
+                path = self.database_path_for(group_id)
+                group = LedgerGroup(group_id, LedgerDatabase(path) if path else None, self.rates)
+                self.groups[group_id] = group
+        return group
+
+
+@lru_cache(maxsize=None)
+def shared_registry(database_path=None, rates_path=None):
+    # One registry per process and arguments. Streamlit re-runs the app
+    # script on every interaction but keeps imported modules, so every
+    # session and rerun gets this same registry back.
+    rates = RateTable()
+    if rates_path:
+        rates.load(rates_path)
+    return LedgerRegistry(database_path, rates)
@@ -1,376 +1,881 @@
-import streamlit as st
-import re
+import argparse
+import json
+import os
+import io
+import sys
+import threading
+import time
+from dataclasses import replace
 from datetime import datetime
-import pandas as pd
-import random
+from importlib.util import find_spec
+import numpy as np
 
-# Set page configuration and custom CSS
-st.set_page_config(page_title="Expense Splitter", page_icon="💰", layout="wide")
+import command_parser
+import exporter
+import importer
+import perf
+import ui_html
+from event_log import ADD, CLEAR, DELETE, EDIT
+from expense_store import SORT_KEYS, ExpenseStore
+from fx import BASE, UNDATED, RateTable
+from ledger_db import LedgerDatabase
+from ledger_index import day_number
+from lazy import LazyModule
+from ledger_registry import DEFAULT_GROUP, LedgerRegistry, normalize_group_id, shared_registry
+from money import convert_cents, currency_code, currency_format, format_amount
+from people import UnknownPerson, name_key
+from settlement import STRATEGIES, settle_cents
 
-# Custom CSS for styling
-def load_css():
-    st.markdown("""
-    <style>
-    /* Main container styling */
-    .main {
-        background-color: #f8f9fa;
-        padding: 10px;
-    }
-    
-    /* Header styling */
-    h1 {
-        color: #4b6584;
-        text-align: center;
-        margin-bottom: 1.5rem;
-        padding-bottom: 0.5rem;
-        border-bottom: 2px solid #20bf6b;
-    }
-    
-    h2, h3 {
-        color: #4b6584;
-        margin-top: 1rem;
-    }
-    
-    /* Card styling for different sections */
-    .card {
-        background-color: white;
-        border-radius: 10px;
-        padding: 20px;
-        box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-        margin-bottom: 20px;
-    }
-    
-    /* Button styling */
-    .stButton>button {
-        background-color: #20bf6b;
-        color: white;
-        border: none;
-        border-radius: 5px;
-        padding: 0.5rem 1rem;
-        font-weight: bold;
-    }
-    
-    .stButton>button:hover {
-        background-color: #0ea55a;
-    }
-    
-    /* Input field styling */
-    .stTextInput>div>div>input {
-        border-radius: 5px;
-        border: 1px solid #dfe4ea;
-    }
-    
-    /* Transaction cards */
-    .transaction-card {
-        background-color: #f1f2f6;
-        border-left: 4px solid #20bf6b;
-        padding: 10px 15px;
-        margin-bottom: 10px;
-        border-radius: 5px;
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-    }
-    
-    .transaction-amount {
-        font-weight: bold;
-        color: #20bf6b;
-    }
-    
-    .transaction-details {
-        display: flex;
-        align-items: center;
-    }
-    
-    .transaction-icon {
-        margin-right: 10px;
-    }
-    
-    /* Response area */
-    .response-area {
-        background-color: #e3f9ee;
-        border-left: 4px solid #20bf6b;
-        padding: 15px;
-        border-radius: 5px;
-        margin-top: 15px;
-    }
-    
-    /* Expander styling */
-    .streamlit-expanderHeader {
-        background-color: #f1f2f6;
-        border-radius: 5px;
-    }
-    
-    /* Footer */
-    .footer {
-        text-align: center;
-        margin-top: 3rem;
-        padding-top: 1rem;
-        border-top: 1px solid #dfe4ea;
-        color: #a5b1c2;
-        font-size: 0.8rem;
-    }
-    
-    /* Examples list */
-    .examples-list {
-        margin-top: 1rem;
-    }
-    
-    .examples-title {
-        font-weight: bold;
-        margin-bottom: 0.5rem;
-    }
-    
-    .example-item {
-        background-color: #f1f2f6;
-        padding: 8px 12px;
-        margin-bottom: 8px;
-        border-radius: 5px;
-        cursor: pointer;
-    }
-    
-    .example-item:hover {
-        background-color: #e3f9ee;
-    }
-    
-    /* Empty state */
-    .empty-state {
-        text-align: center;
-        padding: 40px 20px;
-    }
-    
-    .empty-state-icon {
-        font-size: 3rem;
-        margin-bottom: 1rem;
-        color: #a5b1c2;
-    }
-    
-    .empty-state-text {
-        color: #576574;
-    }
-    
-    /* Card headers */
-    .card-header {
-        display: flex;
-        align-items: center;
-        margin-bottom: 1rem;
-    }
-    
-    .card-header-icon {
-        margin-right: 0.5rem;
-        color: #4b6584;
-        font-size: 1.2rem;
-    }
-    
-    .card-title {
-        margin: 0;
-        font-size: 1.2rem;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+# Imported on first use: the command line, the API server and batch workers
+# never touch streamlit, and pandas only builds the tables the UI shows
+st = LazyModule("streamlit")
+pd = LazyModule("pandas")
+batch = LazyModule("batch")
+
+# Expense history paging and sorting choices
+PAGE_SIZES = [10, 20, 50, 100]
+SORT_LABELS = {"added": "Date added", "date": "Date", "amount": "Amount", "paid_by": "Paid by"}
+
+# Cross-check the running balances against a full replay on every read
+DEBUG_BALANCES = os.environ.get("EXPENSE_SPLITTER_DEBUG") == "1"
+
+# SQLite file to keep the ledger in; unset means the ledger only lives in memory
+DATABASE_PATH = os.environ.get("EXPENSE_SPLITTER_DB")
+
+# CSV of exchange rates (see fx.RateTable.load) every ledger starts with
+RATES_PATH = os.environ.get("EXPENSE_SPLITTER_RATES")
 
 class ExpenseSplitter:
-    def __init__(self):  # Fixed the init method with double underscores
-        # Initialize or load existing expenses
-        if 'expenses' not in st.session_state:
-            st.session_state.expenses = []
-        if 'people' not in st.session_state:
-            st.session_state.people = set()
-        if 'expense_colors' not in st.session_state:
-            st.session_state.expense_colors = {}
+    def __init__(self, store=None, database=None, lock=None):  # Fixed the init method with double underscores
+        # Use the given store (headless use) or the session's columnar store
+        if store is None:
+            if 'store' not in st.session_state:
+                st.session_state.store = ExpenseStore()
+            store = st.session_state.store
+        self.store = store
         
-    def add_expense(self, paid_by, amount, description, split_among=None, date=None):
-        # Generate a color for the expense
-        color = f"#{random.randint(0, 255):02x}{random.randint(0, 255):02x}{random.randint(0, 255):02x}"
+        # Stores shared between sessions (see LedgerRegistry) come with their
+        # group's lock; every method that reads or changes the store holds it
+        self.lock = lock if lock is not None else threading.RLock()
         
+        # A fresh store attached to a database starts from the saved balances
+        # and writes every change through to it; the expense rows are only
+        # read when the full history is needed
+        self.database = database
+        with self.lock:
+            if database is not None and not len(store) and not store.names:
+                database.open(store)
+    
+    @classmethod
+    def for_group(cls, group):
+        return cls(group.store, group.database, group.lock)
+        
+    def reset(self):
+        # Deletes every expense as one step, so "undo" brings them back
+        with self.lock:
+            self.load_history()
+            self.store.clear()
+    
+    def load_history(self):
+        if self.database is not None:
+            with self.lock:
+                self.database.load_history(self.store)
+    
+    @perf.timed("add_expense")
+    def add_expense(self, paid_by, amount, description, split_among=None, date=None, split=None, currency=None):
+        # split: per person in split_among, None or a (money.SHARES | PERCENT |
+        # AMOUNT, value) pair for uneven splits; None splits evenly. currency
+        # is a code like "EUR"; None means the ledger's first currency. Names
+        # are matched to the ledger's people (see resolve_people()).
         if date is None:
             date = datetime.now().strftime("%Y-%m-%d")
         
-        if split_among is None:
-            split_among = list(st.session_state.people)
-        else:
-            # Add all people to the global set
-            for person in split_among:
-                st.session_state.people.add(person)
-        
-        # Add payer to the global set of people
-        st.session_state.people.add(paid_by)
-        
-        # Calculate the amount per person
-        amount_per_person = amount / len(split_among)
+        with self.lock:
+            if split_among is None:
+                split_among = list(self.store.names)
+            known = len(self.store.names)
+            payer, members, split = self.resolve_people(paid_by, split_among, split)
+            
+            # Record the expense; the store interns any new names, splits the amount
+            # into whole-cent shares and updates the running balances
+            row = self.store.add(payer, amount, description, members, date, split, currency)
+            currency = self.store.currencies[self.store.currency_id(currency)]
+            names = self.store.names
+            paid_by = names[self.store.person_id(payer)]
+            split_among = [names[self.store.person_id(person)] for person in members]
+            new = names[known:]
+            if split is not None and row < self.store.count:
+                shares = self.store.shares[self.store.offsets[row]:self.store.offsets[row + 1]].tolist()
+                split_among = [f"{person} ({format_amount(cents / 100, currency)})" for person, cents in zip(split_among, shares)]
         
-        # Add the expense to the list with color
-        st.session_state.expenses.append({
-            "date": date,
-            "paid_by": paid_by,
-            "amount": amount,
-            "description": description,
-            "split_among": split_among,
-            "amount_per_person": amount_per_person,
-            "color": color  # Added color field
-        })
+        result = f"Added expense: {description} - {format_amount(amount, currency)} paid by {paid_by}, " \
+                 f"split among {', '.join(split_among)}."
+        if new:
+            result += f" New to the group: {', '.join(new)}."
+        return result
+    
+    def add_recurring(self, paid_by, amount, description, split_among=None, start=None, frequency=(1, "month"),
+                      split=None, currency=None, end=None):
+        # An expense that comes back every frequency = (count, unit) from start
+        # (default today) until the day before end (None: for good). It never
+        # becomes expense rows: its occurrences up to today count towards the
+        # balances, summaries and statements whenever they are read.
+        if start is None:
+            start = today()
         
-        return f"Added expense: {description} - ${amount:.2f} paid by {paid_by}, split among {', '.join(split_among)}."
+        with self.lock:
+            if split_among is None:
+                split_among = list(self.store.names)
+            known = len(self.store.names)
+            payer, members, split = self.resolve_people(paid_by, split_among, split)
+            number = self.store.add_recurring(payer, amount, description, members, start, *frequency, split, currency, end)
+            new = self.store.names[known:]
+            result = f"Added recurring expense R{number + 1}: {describe_recurring(self.store, number)}."
+        if new:
+            result += f" New to the group: {', '.join(new)}."
+        return result
     
-    def calculate_balances(self):
-        # Initialize balance dict
-        balances = {person: 0 for person in st.session_state.people}
+    def stop_recurring(self, number, end=None):
+        # Recurring expense `number` (from 1) has no occurrences from end on
+        # (default: after today); returns the date of its last one, or None
+        with self.lock:
+            definition = self.store.stop_recurring(number - 1, end or str(np.datetime64(today(), "D") + 1))
+            last = self.store.recurring.dates(number - 1, None, definition.end)
+            return str(np.datetime64(int(last[-1]), "D")) if len(last) else None
+    
+    def resolve_people(self, paid_by, split_among, split=None):
+        # The payer and the people to split among as ids, each person once
+        # (names nobody has yet stay names, and become new people when the
+        # expense is added). Raises people.UnknownPerson for a name that looks
+        # like a typo of someone's, rather than adding them as someone new.
+        people = self.store.people
+        payer = people.resolve(paid_by)
+        members = []
+        specs = []
+        positions = {}
+        for i, name in enumerate(split_among):
+            pid = people.resolve(name)
+            spec = split[i] if split is not None else None
+            key = name_key(name) if pid is None else pid
+            if key in positions:
+                # e.g. the payer, added to the list under another of their
+                # names ("bobby paid 20 for taxi split among bob")
+                if spec is not None and specs[positions[key]] is not None:
+                    raise ValueError(f"{name} is in the split twice")
+                specs[positions[key]] = specs[positions[key]] or spec
+                continue
+            positions[key] = len(members)
+            members.append(name if pid is None else pid)
+            specs.append(spec)
+        return paid_by if payer is None else payer, members, specs if split is not None else None
+    
+    def person_name(self, name):
+        # A person's name for a name or alias as typed (None and unknown names
+        # stay as they are); raises people.UnknownPerson for a likely typo
+        if name is None:
+            return None
+        with self.lock:
+            pid = self.store.people.resolve(name)
+            return name if pid is None else self.store.names[pid]
+    
+    def add_person(self, name):
+        # Someone new, before their first expense
+        with self.lock:
+            self.store.add_person(name)
+    
+    def add_alias(self, alias, name):
+        # From now on alias means the person called name; returns their name
+        with self.lock:
+            return self.store.names[self.store.add_alias(alias, name)]
+    
+    def add_expenses_bulk(self, rows):
+        # Validate and commit many (paid_by, amount, description, split_among, date)
+        # rows in one pass; raises ValueError listing the bad rows and adds nothing
+        with self.lock:
+            self.load_history()
+            count = self.store.add_many(rows)
+        return f"Imported {count} expenses."
+    
+    def delete_expense(self, number):
+        # number is the expense's number as shown by summary (row + 1);
+        # raises ValueError when there is no such expense
+        with self.lock:
+            self.load_history()
+            self.store.delete(number - 1)
+    
+    def edit_expense(self, number, paid_by=None, amount=None, description=None, date=None, currency=None):
+        # Change some fields of an expense; a new amount is split evenly between
+        # the same people again
+        with self.lock:
+            self.load_history()
+            paid_by = self.person_name(paid_by)
+            self.store.edit(number - 1, paid_by, amount, description, date, currency)
+    
+    def set_rate(self, currency, rate, quote=None, date=None):
+        # 1 currency = rate quote, from date on (every day when None); kept
+        # with the ledger
+        with self.lock:
+            self.store.set_rate(currency, rate, quote, date)
+    
+    def undo(self):
+        # Reverse the latest add, delete, edit or clear; returns its
+        # expense_store.LedgerEvent, or None when there is nothing to undo
+        with self.lock:
+            self.load_history()
+            return self.store.undo()
+    
+    def redo(self):
+        with self.lock:
+            self.load_history()
+            return self.store.redo()
+    
+    def history_page(self, sort_by="added", descending=False, person=None, text=None, page_size=20, page=0):
+        # One page of the expense history as a DataFrame, plus how many
+        # expenses match; filtering and sorting happen in the store (or in
+        # SQLite while the history is still on disk) and only the visible rows
+        # are formatted
+        filters = (sort_by, descending, person, text)
         
-        # Calculate what each person has paid and owes
-        for expense in st.session_state.expenses:
-            paid_by = expense["paid_by"]
-            amount = expense["amount"]
-            split_among = expense["split_among"]
-            amount_per_person = expense["amount_per_person"]
+        def build():
+            if self.store.unloaded:
+                total, columns = self.database.page(*filters, page_size, page * page_size)
+            else:
+                rows = self.store.cached(("selection", filters), lambda: self.store.select(*filters))
+                total, columns = len(rows), self.store.page_columns(rows[page * page_size:(page + 1) * page_size])
+            # Expense numbers, as used by "delete" and "edit", label the rows
+            with perf.span("history_dataframe"):
+                return total, pd.DataFrame(columns, copy=False).set_index("#")
+        with self.lock:
+            return self.store.cached(("history", filters, page_size, page), build)
+    
+    def settlement_currency(self, currency=None):
+        # The given currency code, or by default the one currency the balances
+        # are in (fx.BASE when there are several, or none)
+        if currency is not None:
+            return currency_code(currency)
+        with self.lock:
+            used = self.store.cached(("currencies_used", today()), lambda: self.used_currencies(self.subtotals()))
+            return self.store.currencies[used[0]] if len(used) == 1 else BASE
+    
+    def subtotals(self):
+        # Running balances (cents, people by currencies) with the recurring
+        # expenses that have come up by today added in
+        store = self.store
+        if not len(store.recurring):
+            return store.subtotals()
+        def build():
+            recurring = store.recurring.balances(None, self.recurring_until(), len(store.names), len(store.currencies))
+            return store.subtotals() + recurring
+        return store.cached(("subtotals", today()), build)
+    
+    def recurring_until(self, end=None):
+        # Day number recurring expenses count up to (exclusive): the end of a
+        # period, but never past today
+        tomorrow = day_number(today()) + 1
+        return tomorrow if end is None else min(day_number(end), tomorrow)
+    
+    def used_currencies(self, subtotals):
+        # Ids of the currencies with any balance in a (people, currencies) array
+        return np.flatnonzero(subtotals.any(axis=0)).tolist()
+    
+    def convert(self, subtotals, currency, day=None):
+        # {name: cents in currency} from (people, currencies) cents, at the
+        # rates of day (default: the latest), one vectorized pass per currency
+        # column; only currencies that have balances need a rate
+        used = self.used_currencies(subtotals)
+        factors = self.store.rates.factors(tuple(self.store.currencies[cid] for cid in used), currency, day)
+        return dict(zip(self.store.names, convert_cents(subtotals[:, used], factors).tolist()))
+    
+    @perf.timed("balances_cents")
+    def balances_cents(self, currency=None):
+        # Balances in cents of one currency (see settlement_currency()). The
+        # running balances are kept per currency, so this is O(people x
+        # currencies), once per ledger version, currency and set of rates.
+        with self.lock:
+            currency = self.settlement_currency(currency)
             
-            # Add amount to the balance of the person who paid
-            balances[paid_by] += amount
+            if DEBUG_BALANCES:
+                self.load_history()
+                # Check against the rows and against the event log
+                subtotals = self.store.subtotals()
+                for replayed in (self.store.replay_balances(), self.store.balances_at(len(self.store.log))):
+                    wrong = np.argwhere(replayed != subtotals)
+                    if len(wrong):
+                        pid, cid = wrong[0].tolist()
+                        raise RuntimeError(
+                            f"Running {self.store.currencies[cid]} balance for {self.store.names[pid]} is "
+                            f"{subtotals[pid, cid]} cents, replay gives {replayed[pid, cid]}"
+                        )
             
-            # Subtract amount from the balance of each person who shares the expense
-            for person in split_among:
-                balances[person] -= amount_per_person
-        
-        return balances
+            key = ("balances", currency, self.store.rates.version, today())
+            return self.store.cached(key, lambda: self.convert(self.subtotals(), currency))
     
-    def get_transactions(self):
-        balances = self.calculate_balances()
-        
-        # Separate debtors and creditors
-        debtors = {person: balance for person, balance in balances.items() if balance < 0}
-        creditors = {person: balance for person, balance in balances.items() if balance > 0}
-        
-        transactions = []
-        
-        # Create transaction list
-        for debtor, debt in sorted(debtors.items(), key=lambda x: x[1]):
-            debt = abs(debt)  # Make the debt positive for calculations
-            for creditor, credit in sorted(creditors.items(), key=lambda x: x[1], reverse=True):
-                if debt <= 0 or credit <= 0:
-                    continue
-                    
-                amount = min(debt, credit)
-                transactions.append({
-                    "from": debtor,
-                    "to": creditor,
-                    "amount": amount
-                })
-                
-                # Update remaining balances
-                debt -= amount
-                creditors[creditor] -= amount
-                
-        return transactions
+    def calculate_balances(self, currency=None):
+        # Balances in currency units; exact, since they come from whole cents.
+        # Not timed on its own: the time is all in balances_cents(), and a
+        # second span around it would count the same work twice.
+        return {person: cents / 100 for person, cents in self.balances_cents(currency).items()}
     
-    def parse_command(self, command):
-        # Convert command to lowercase
-        command = command.lower()
+    def period_balances_cents(self, start=None, end=None, currency=None):
+        # Balances in cents from expenses dated start <= date < end only, read
+        # from the store's date index instead of replaying every expense, and
+        # converted at the rates of the period's last day. The per-currency
+        # subtotals are cached on their own, so settling the same period in
+        # another currency only converts them again.
+        if start is None and end is None:
+            return self.balances_cents(currency)
         
-        # Check for expense command patterns
-        expense_pattern = r'(?P<paid_by>\w+)\s+paid\s+(?P<amount>\d+(\.\d+)?)\s+for\s+(?P<description>.+?)((\s+split\s+(?:between|among|with)\s+(?P<split_among>.+?))?(\s+on\s+(?P<date>.+))?)?$'
-        match = re.search(expense_pattern, command)
+        def subtotals():
+            self.load_history()
+            store = self.store
+            balances = store.index().balances_between(start, end)
+            if len(store.recurring):
+                until = self.recurring_until(end)
+                balances = balances + store.recurring.balances(
+                    day_number(start), until, len(store.names), len(store.currencies)
+                )
+            return balances
         
-        if match:
-            paid_by = match.group('paid_by').strip()
-            amount = float(match.group('amount'))
-            description = match.group('description').strip()
-            
-            split_among_str = match.group('split_among')
-            date_str = match.group('date')
+        def build():
+            day = None if end is None else day_number(end) - 1
+            return self.convert(self.store.cached(("period_subtotals", start, end, today()), subtotals), currency, day)
+        with self.lock:
+            currency = self.settlement_currency(currency)
+            key = ("period_balances", start, end, currency, self.store.rates.version, today())
+            return self.store.cached(key, build)
+    
+    @perf.timed("get_transactions")
+    def get_transactions(self, strategy="auto", start=None, end=None, currency=None):
+        # Work out who pays whom, optionally for one period only, in one
+        # currency; see settlement.STRATEGIES for the options
+        def build():
+            return [
+                {"from": debtor, "to": creditor, "amount": cents / 100}
+                for debtor, creditor, cents in settle_cents(self.period_balances_cents(start, end, currency), strategy)
+            ]
+        with self.lock:
+            currency = self.settlement_currency(currency)
+            key = ("transactions", strategy, start, end, currency, self.store.rates.version, today())
+            return self.store.cached(key, build)
+    
+    def recurring_counts(self, person=None, start=None, end=None):
+        # (number, occurrences) of the recurring expenses a person pays for or
+        # shares in (anyone when person is None) that came up start <= date <
+        # end, up to today
+        with self.lock:
+            schedule = self.store.recurring
+            if not len(schedule):
+                return []
+            pid = None if person is None else self.store.people.find(person)
+            counts = schedule.counts(day_number(start), self.recurring_until(end)).tolist()
+            return [
+                (number, count) for number, (definition, count) in enumerate(zip(schedule, counts))
+                if count and (person is None or pid == definition.paid_by or pid in definition.members)
+            ]
+    
+    def expense_rows(self, person=None, start=None, end=None):
+        # Row numbers of the expenses a person paid for or shares in (anyone
+        # when person is None), dated start <= date < end
+        with self.lock:
+            self.load_history()
+            pid = None
+            if person is not None:
+                pid = self.store.people.find(person)
+                if pid is None:
+                    return []
+            return self.store.index().rows(pid, start, end).tolist()
+    
+    def owed_cents(self, debtor, creditor, currency=None):
+        # What debtor owes creditor from the expenses they shared, in cents of
+        # currency (negative when creditor owes debtor)
+        with self.lock:
+            self.load_history()
+            currency = self.settlement_currency(currency)
+            debtor, creditor = self.store.people.find(debtor), self.store.people.find(creditor)
+            if debtor is None or creditor is None:
+                return 0
+            owed = self.store.index().owed(debtor, creditor)
+            if len(self.store.recurring):
+                owed = owed + self.store.recurring.owed(debtor, creditor, self.recurring_until(), len(owed))
+            used = np.flatnonzero(owed).tolist()
+            factors = self.store.rates.factors(tuple(self.store.currencies[cid] for cid in used), currency)
+            return round(float(owed[used] @ factors))
+    
+    def balance_table(self, currency=None):
+        # Per-person balance rows for display, in one currency; balances are
+        # exact, so settled means exactly zero
+        def build():
+            balances = self.balances_cents(currency)
+            with perf.span("balance_dataframe"):
+                status = ["Settled" if cents == 0 else "Is Owed" if cents > 0 else "Owes" for cents in balances.values()]
+                amounts = np.fromiter(balances.values(), dtype=np.int64, count=len(balances)) / 100
+                return pd.DataFrame({"Person": list(balances), "Balance": amounts, "Status": status})
+        with self.lock:
+            currency = self.settlement_currency(currency)
+            return self.store.cached(("balance_table", currency, self.store.rates.version, today()), build)
+    
+    def period_totals(self, start=None, end=None):
+        # What was paid, spent and spent on what from expenses dated start <=
+        # date < end, recurring ones up to today included (see
+        # period_totals.Totals): the store's monthly totals for whole months
+        # and the date index for the days at either end
+        def build():
+            self.load_history()
+            totals = self.store.period_totals().between(start, end)
+            return self.store.recurring.totals(totals, day_number(start), self.recurring_until(end))
+        with self.lock:
+            return self.store.cached(("period_totals", start, end, today()), build)
+    
+    @perf.timed("statement")
+    def statement(self, start=None, end=None, currency=None):
+        # A period's totals in cents of one currency, converted at the rates
+        # of its last day: {name: (paid, share)} for everyone involved,
+        # {category: spent} largest first, and how many expenses (and
+        # recurring occurrences among them) that was
+        with self.lock:
+            currency = self.settlement_currency(currency)
+            totals = self.period_totals(start, end)
+            day = None if end is None else day_number(end) - 1
+            used = self.used_currencies(totals.paid)
+            factors = self.store.rates.factors(tuple(self.store.currencies[cid] for cid in used), currency, day)
             
-            # Parse the people to split among
-            split_among = None
-            if split_among_str:
-                split_among = [person.strip() for person in re.split(r',\s*|(?:\s+and\s+)', split_among_str)]
-                # Include the payer if they're not already in the list
-                if paid_by not in split_among:
-                    split_among.append(paid_by)
+            def convert(cents):
+                return convert_cents(cents[:, used], factors).tolist()
             
-            # Parse the date if provided
-            date = None
-            if date_str:
+            names = sorted({name for name, _ in totals.categories})
+            rows = {name: i for i, name in enumerate(names)}
+            spending = np.zeros((len(names), totals.paid.shape[1]), dtype=np.int64)
+            for (name, cid), cents in totals.categories.items():
+                spending[rows[name], cid] += cents
+            people = {
+                name: (paid, share)
+                for name, paid, share in zip(self.store.names, convert(totals.paid), convert(totals.spent))
+                if paid or share
+            }
+            categories = dict(sorted(zip(names, convert(spending)), key=lambda item: -item[1]))
+            return {
+                "currency": currency, "expenses": totals.count, "recurring": totals.recurring,
+                "people": people, "categories": categories,
+            }
+    
+    def export(self, table, fmt, file, currency=None):
+        # Stream one table ("expenses", "balances" or "settlements") to a binary
+        # file in an exporter.FORMATS format, a chunk at a time; balances and
+        # settlements are in one currency
+        with self.lock:
+            currency = self.settlement_currency(currency)
+            if table == "expenses":
+                self.load_history()
+                chunks = exporter.expense_chunks(self.store)
+            elif table == "balances":
+                chunks = exporter.balance_chunks(self.balances_cents(currency), currency)
+            elif table == "settlements":
+                chunks = exporter.settlement_chunks(self.get_transactions(currency=currency), currency)
+            else:
+                raise ValueError(f"Unknown table {table!r}, expected one of {', '.join(exporter.TABLES)}")
+            exporter.write(chunks, fmt, file)
+    
+    @perf.timed("parse_command")
+    def parse_command(self, command):
+        # Parsing is pure and cached; only execution touches the ledger
+        with perf.span("parse"):
+            parsed = command_parser.parse(command)
+        return self.execute(parsed)
+    
+    def execute(self, parsed):
+        if parsed.kind == command_parser.EXPENSE:
+            split_among = list(parsed.split_among) if parsed.split_among is not None else None
+            try:
+                return self.add_expense(
+                    parsed.paid_by, parsed.amount, parsed.description, split_among, parsed.date, parsed.split,
+                    parsed.currency,
+                )
+            except UnknownPerson as exc:
+                return describe_unknown_person(exc)
+            except ValueError as exc:
+                return f"Couldn't add that expense: {exc}."
+        
+        # Check for recurring expenses, "recurring" and "stop recurring 2"
+        if parsed.kind == command_parser.RECURRING:
+            if parsed.paid_by is not None:
+                split_among = list(parsed.split_among) if parsed.split_among is not None else None
                 try:
-                    date = datetime.strptime(date_str.strip(), "%Y-%m-%d").strftime("%Y-%m-%d")
-                except ValueError:
-                    date = datetime.now().strftime("%Y-%m-%d")
-            
-            return self.add_expense(paid_by, amount, description, split_among, date)
+                    return self.add_recurring(
+                        parsed.paid_by, parsed.amount, parsed.description, split_among, parsed.date,
+                        parsed.frequency, parsed.split, parsed.currency, parsed.end,
+                    )
+                except UnknownPerson as exc:
+                    return describe_unknown_person(exc)
+                except ValueError as exc:
+                    return f"Couldn't add that recurring expense: {exc}."
+            if parsed.number is not None:
+                try:
+                    last = self.stop_recurring(parsed.number, parsed.end)
+                except ValueError as exc:
+                    return f"Couldn't stop recurring expense R{parsed.number}: {exc}."
+                if last is None:
+                    return f"Stopped recurring expense R{parsed.number}; it never came up."
+                return f"Stopped recurring expense R{parsed.number}; the last one is on {last}."
+            with self.lock:
+                return describe_recurring_list(self.store)
+        
+        # Names in filters and questions are matched like the ones in expenses
+        if parsed.kind in (command_parser.BALANCE, command_parser.SUMMARY, command_parser.STATEMENT, command_parser.OWES):
+            try:
+                parsed = replace(parsed, person=self.person_name(parsed.person), other=self.person_name(parsed.other))
+            except UnknownPerson as exc:
+                return str(exc)
+        
+        now = datetime.now().date()
+        # A statement is for this month unless it says otherwise
+        if parsed.kind == command_parser.STATEMENT and parsed.start is None and parsed.end is None \
+                and parsed.month is None:
+            parsed = replace(parsed, month=now.month)
+        start, end = command_parser.period_bounds(parsed, now)
+        period = describe_period(start, end)
         
         # Check for balance command
-        if "balance" in command or "who owes" in command or "owes who" in command:
-            balances = self.calculate_balances()
-            transactions = self.get_transactions()
+        if parsed.kind == command_parser.BALANCE:
+            currency = self.settlement_currency(parsed.currency)
+            try:
+                transactions = self.get_transactions(parsed.strategy, start, end, currency)
+            except ValueError as exc:
+                return f"Couldn't settle up in {currency}: {exc}."
+            if parsed.person is not None:
+                transactions = [t for t in transactions if parsed.person in (t['from'], t['to'])]
             
             if not transactions:
+                if parsed.person is not None:
+                    return f"{parsed.person} is settled up{period}."
+                if period:
+                    return f"All settled up{period}! No one owes anything."
                 return "All settled up! No one owes anything."
             
-            result = "Here's who owes whom:\n"
+            involving = f" involving {parsed.person}" if parsed.person is not None else ""
+            result = f"Here's who owes whom{involving}{period}:\n"
             for t in transactions:
-                result += f"{t['from']} owes {t['to']} ${t['amount']:.2f}\n"
+                result += f"{t['from']} owes {t['to']} {format_amount(t['amount'], currency)}\n"
             
             return result
         
         # Check for summary command
-        if "summary" in command or "list expenses" in command:
-            if not st.session_state.expenses:
-                return "No expenses recorded yet."
-            
-            result = "Expense Summary:\n"
-            for idx, expense in enumerate(st.session_state.expenses):
-                result += f"{idx+1}. {expense['description']} - ${expense['amount']:.2f} paid by {expense['paid_by']}, " \
-                         f"split among {', '.join(expense['split_among'])}\n"
+        if parsed.kind == command_parser.SUMMARY:
+            with self.lock:
+                self.load_history()
+                if not len(self.store) and not len(self.store.recurring):
+                    return "No expenses recorded yet."
+                
+                # Filtered summaries ("summary for mary", "summary since ...")
+                # read the date and person indexes
+                recurring = self.recurring_counts(parsed.person, start, end)
+                if parsed.person is not None or period:
+                    scope = f"{' for ' + parsed.person if parsed.person else ''}{period}"
+                    rows = self.expense_rows(parsed.person, start, end)
+                    if not rows and not recurring:
+                        return f"No expenses recorded{scope}."
+                    result = f"Expense Summary{scope}:\n"
+                else:
+                    rows = np.flatnonzero(~self.store.column("deleted")).tolist()
+                    result = "Expense Summary:\n"
+                # Numbered by row, so the numbers work with "delete" and "edit"
+                for row in rows:
+                    expense = self.store.expense(row)
+                    result += f"{row + 1}. {expense['description']} - {format_amount(expense['amount'], expense['currency'])} " \
+                             f"paid by {expense['paid_by']}, " \
+                             f"split among {', '.join(expense['split_among'])}\n"
+                # Recurring expenses once each, with how often they came up
+                for number, count in recurring:
+                    definition = self.store.recurring[number]
+                    total = format_amount(count * definition.amount / 100, self.store.currencies[definition.currency])
+                    times = "once" if count == 1 else f"{count} times"
+                    result += f"R{number + 1}. {describe_recurring(self.store, number)}: {times}, {total} in all\n"
             
             return result
         
+        # Check for "statement" ("statement for march", "statement for bob")
+        if parsed.kind == command_parser.STATEMENT:
+            currency = self.settlement_currency(parsed.currency)
+            try:
+                statement = self.statement(start, end, currency)
+            except ValueError as exc:
+                return f"Couldn't make a statement in {currency}: {exc}."
+            return describe_statement(statement, parsed.person, period)
+        
+        # Check for "what does bob owe alice"
+        if parsed.kind == command_parser.OWES:
+            currency = self.settlement_currency()
+            try:
+                cents = self.owed_cents(parsed.person, parsed.other, currency)
+            except ValueError as exc:
+                return f"Couldn't work that out in {currency}: {exc}."
+            if cents > 0:
+                return f"{parsed.person} owes {parsed.other} {format_amount(cents / 100, currency)} from the expenses they shared."
+            if cents < 0:
+                return f"{parsed.other} owes {parsed.person} {format_amount(-cents / 100, currency)} from the expenses they shared."
+            return f"{parsed.person} and {parsed.other} are even."
+        
+        # Check for "delete 12" and "edit 12 amount 40"
+        if parsed.kind in (command_parser.DELETE, command_parser.EDIT):
+            try:
+                if parsed.kind == command_parser.DELETE:
+                    self.delete_expense(parsed.number)
+                    return f"Deleted expense {parsed.number}. Type 'undo' to bring it back."
+                with self.lock:
+                    self.edit_expense(
+                        parsed.number, parsed.paid_by, parsed.amount, parsed.description, parsed.date, parsed.currency
+                    )
+                    expense = self.store.expense(parsed.number - 1)
+            except ValueError as exc:
+                return str(exc)
+            return f"Updated expense {parsed.number}: {expense['description']} - " \
+                   f"{format_amount(expense['amount'], expense['currency'])} " \
+                   f"paid by {expense['paid_by']} on {expense['date']}, split among {', '.join(expense['split_among'])}."
+        
+        # Check for undo and redo
+        if parsed.kind in (command_parser.UNDO, command_parser.REDO):
+            undoing = parsed.kind == command_parser.UNDO
+            event = self.undo() if undoing else self.redo()
+            if event is None:
+                return "Nothing to undo." if undoing else "Nothing to redo."
+            return f"{'Undid' if undoing else 'Redid'} {describe_event(event)}."
+        
+        # Check for "rate 1 eur = 1.08 usd" and "rates"
+        if parsed.kind == command_parser.RATE:
+            if parsed.currency is None:
+                with self.lock:
+                    return describe_rates(self.store.rates)
+            try:
+                self.set_rate(parsed.currency, parsed.amount, parsed.quote, parsed.date)
+            except ValueError as exc:
+                return f"Couldn't set that rate: {exc}."
+            since = f" from {parsed.date} on" if parsed.date else ""
+            return f"Set 1 {parsed.currency} = {parsed.amount:g} {parsed.quote}{since}."
+        
+        # Check for "people", "add person rob" and "alias bobby = bob"
+        if parsed.kind == command_parser.PEOPLE:
+            try:
+                if parsed.person is None:
+                    with self.lock:
+                        return describe_people(self.store.people)
+                if parsed.other is None:
+                    self.add_person(parsed.person)
+                    return f"Added {parsed.person} to the group."
+                return f"{parsed.other} now means {self.add_alias(parsed.other, parsed.person)}."
+            except UnknownPerson as exc:
+                return str(exc)
+            except ValueError as exc:
+                return f"Couldn't do that: {exc}."
+        
         # Check for help command
-        if "help" in command:
+        if parsed.kind == command_parser.HELP:
             return """
             I understand these commands:
             - "[name] paid [amount] for [description] split among/between/with [person1, person2, ...]"
-            - "balance" or "who owes" to see who owes whom
+            - uneven splits: "split among alice 2 shares, bob", "split among bob 60%, carol 40%" or "split among carol 12.50, bob" (the rest is shared evenly)
+            - other currencies: "alice paid 40 eur for taxi" or "alice paid €40 for taxi"
+            - "balance" or "who owes" to see who owes whom (add "greedy", "exact" or "bounded" to pick the settlement method)
+            - "balance since 2026-01-01" or "balance for march" to settle up one period only
+            - "balance in eur" to settle up in one currency, converted with the exchange rates
+            - "rate 1 eur = 1.08 usd" (optionally "on 2026-03-01") to set an exchange rate, "rates" to list them
             - "summary" or "list expenses" to see all recorded expenses
+            - "summary for mary" or "summary since 2026-01-01" to see some of them
+            - "statement" for what everyone paid and spent this month, by person and category (also "statement for march" or "statement for bob since 2026-01-01")
+            - "alice pays 1200 for rent monthly split among alice, bob" for an expense that comes back ("weekly", "every 2 weeks", "yearly"...; add "from 2026-01-01" or "until 2026-12-31")
+            - "recurring" to list recurring expenses, "stop recurring 1" to stop one after today (or "after 2026-12-31")
+            - "what does bob owe alice" to see what one person owes another
+            - "delete 3" to delete expense 3 (numbers are shown by summary)
+            - "edit 3 amount 40" to change an expense (also "description", "paid by", "date" and "currency")
+            - "undo" or "redo" to take back (or repeat) the last change
+            - "people" to see everyone, "add person rob" to add someone new and "alias bobby = bob" to give someone another name
             - "help" to see this message
-            - "clear" to reset all expenses
+            - "clear" to delete all expenses
             """
         
         # Check for clear command
-        if "clear" in command or "reset" in command:
-            st.session_state.expenses = []
-            st.session_state.people = set()
+        if parsed.kind == command_parser.CLEAR:
+            self.reset()
+            with self.lock:
+                active = sum(1 for definition in self.store.recurring if definition.end is None)
+            if active:
+                return f"All expenses have been cleared. Recurring expenses still running: {active} " \
+                       f"('recurring' lists them, 'stop recurring N' stops one)."
             return "All expenses have been cleared."
         
         return "I didn't understand that command. Type 'help' to see what I can do."
 
+def today():
+    # ISO date of today: when new expenses are dated, and how far recurring
+    # expenses have come
+    return datetime.now().strftime("%Y-%m-%d")
+
+def describe_event(event):
+    # "adding expense 12", "deleting all 40 expenses"... for undo and redo
+    rows = event.rows
+    if event.kind == CLEAR:
+        return f"deleting all {len(rows)} expenses"
+    if len(rows) > 1:
+        return f"adding {len(rows)} expenses"
+    action = {ADD: "adding", DELETE: "deleting", EDIT: "editing"}[event.kind]
+    return f"{action} expense {rows[0] + 1}"
+
+def describe_rates(rates):
+    # Each currency's latest rate, for "rates"
+    latest = rates.latest()
+    if not latest:
+        return f"No exchange rates yet. Add one with 'rate 1 eur = 1.08 {BASE.lower()}'."
+    result = "Exchange rates:\n"
+    for currency, day, rate in latest:
+        since = "" if day == UNDATED else f" since {np.datetime64(day, 'D')}"
+        result += f"1 {currency} = {rate:.6g} {BASE}{since}\n"
+    return result
+
+def describe_people(people):
+    # Everyone, with their aliases, for "people"
+    if not people.names:
+        return "Nobody's in the group yet."
+    aliases = {}
+    for alias, pid in people.aliases.items():
+        aliases.setdefault(pid, []).append(alias)
+    result = "People:\n"
+    for pid in sorted(range(len(people.names)), key=people.names.__getitem__):
+        also = f" (also {', '.join(aliases[pid])})" if pid in aliases else ""
+        result += f"{people.names[pid]}{also}\n"
+    return result
+
+def describe_unknown_person(exc):
+    # A likely typo in a new expense: what to say to use the suggested
+    # person or add a new one
+    return f"{exc} Say 'alias {exc.name} = {exc.suggestions[0]}' if that's them, " \
+           f"or 'add person {exc.name}' if they're someone new."
+
+def describe_recurring(store, number):
+    # "rent - $1,200.00 monthly from 2026-01-01, paid by alice, split among
+    # alice, bob", with each share when the split is uneven
+    definition = store.recurring[number]
+    currency = store.currencies[definition.currency]
+    members = [store.names[pid] for pid in definition.members]
+    if max(definition.shares) - min(definition.shares) > 1:
+        members = [f"{name} ({format_amount(cents / 100, currency)})" for name, cents in zip(members, definition.shares)]
+    until = "" if definition.end is None else f" until {np.datetime64(definition.end - 1, 'D')}"
+    return f"{definition.description} - {format_amount(definition.amount / 100, currency)} " \
+           f"{definition.frequency()} from {np.datetime64(definition.start, 'D')}{until}, " \
+           f"paid by {store.names[definition.paid_by]}, split among {', '.join(members)}"
+
+def describe_recurring_list(store):
+    # Every recurring expense, for "recurring"
+    if not len(store.recurring):
+        return "No recurring expenses yet. Add one with 'alice pays 1200 for rent monthly split among alice, bob'."
+    result = "Recurring expenses:\n"
+    for number in range(len(store.recurring)):
+        result += f"R{number + 1}. {describe_recurring(store, number)}\n"
+    return result
+
+def describe_statement(statement, person, period):
+    # What each person paid, their share and where the money went, for
+    # "statement"; person narrows the people down to one
+    currency = statement["currency"]
+    scope = f"{' for ' + person if person else ''}{period}"
+    people = statement["people"]
+    if person is not None:
+        people = {person: people[person]} if person in people else {}
+    if not statement["expenses"] or not people:
+        return f"No expenses recorded{scope}."
+    
+    def money(cents):
+        return format_amount(cents / 100, currency)
+    
+    result = f"Statement{scope}, in {currency}:\n"
+    recurring = f" ({statement['recurring']} of them recurring)" if statement["recurring"] else ""
+    count = statement["expenses"]
+    result += f"The group had {count} expense{'' if count == 1 else 's'}{recurring}, " \
+              f"{money(sum(statement['categories'].values()))} in all\n"
+    for name, (paid, share) in people.items():
+        net = paid - share
+        result += f"{name} paid {money(paid)}, their share was {money(share)} " \
+                  f"({'+' if net >= 0 else '-'}{money(abs(net))})\n"
+    result += "By category:\n"
+    for name, cents in statement["categories"].items():
+        result += f"- {name}: {money(cents)}\n"
+    return result
+
+def describe_period(start, end):
+    # " since 2026-01-01", " from 2026-03-01 to 2026-03-31"... (end is exclusive)
+    if end is not None:
+        last = np.datetime64(end, "D") - 1
+        return f" from {start} to {last}" if start is not None else f" up to {last}"
+    return f" since {start}" if start is not None else ""
+
+def performance_panel():
+    # Optional sidebar panel with span timings from every session in this
+    # process; the checkbox turns timing on and off for all of them
+    st.sidebar.checkbox(
+        "Performance", value=perf.enabled, key="perf_panel",
+        on_change=lambda: perf.enable(st.session_state.perf_panel)
+    )
+    if not st.session_state.perf_panel:
+        return
+    
+    snapshot = perf.RECORDER.snapshot()
+    if not snapshot:
+        st.sidebar.caption("No timings yet; they show up from the next rerun.")
+        return
+    milliseconds = {"p50_seconds": "p50 ms", "p99_seconds": "p99 ms", "mean_seconds": "mean ms"}
+    table = pd.DataFrame.from_dict(snapshot, orient="index")
+    table = (table[list(milliseconds)] * 1000).rename(columns=milliseconds).assign(count=table["count"])
+    st.sidebar.dataframe(table.round(3), use_container_width=True)
+    
+    col_json, col_prometheus = st.sidebar.columns([1, 1])
+    with col_json:
+        st.download_button("JSON", perf.RECORDER.to_json, file_name="timings.json", mime="application/json")
+    with col_prometheus:
+        st.download_button("Prometheus", perf.RECORDER.to_prometheus, file_name="timings.prom", mime="text/plain")
+    if st.sidebar.button("Reset timings", key="perf_reset"):
+        perf.RECORDER.reset()
+
 # Streamlit app
+@perf.timed("ui.rerun")
 def main():
-    # Load custom CSS
-    load_css()
+    # Time each section of the rerun (only while timing is on)
+    laps = perf.Laps("ui")
+    
+    # Set page configuration
+    st.set_page_config(page_title="Expense Splitter", page_icon="💰", layout="wide")
+    
+    # Custom CSS, minified once per process
+    st.markdown(ui_html.style(), unsafe_allow_html=True)
+    laps.lap("css")
     
     # App header
-    st.markdown("<h1>💰 Split Expenses with Ease</h1>", unsafe_allow_html=True)
+    st.markdown(ui_html.TITLE, unsafe_allow_html=True)
+    
+    # Every session works on a group's shared ledger. The group id is kept in
+    # the URL (?group=...), so the same ledger opens on any device.
+    group_input = st.sidebar.text_input("Group", value=st.query_params.get("group", DEFAULT_GROUP), key="group")
+    try:
+        group_id = normalize_group_id(group_input)
+    except ValueError as exc:
+        st.sidebar.error(str(exc))
+        group_id = DEFAULT_GROUP
+    if st.query_params.get("group") != group_id:
+        st.query_params["group"] = group_id
     
-    # Initialize session state variables if they don't exist
-    if 'expenses' not in st.session_state:
-        st.session_state.expenses = []
-    if 'people' not in st.session_state:
-        st.session_state.people = set()
-    if 'expense_colors' not in st.session_state:
-        st.session_state.expense_colors = {}
+    # Initialize the splitter on the group's ledger
+    splitter = ExpenseSplitter.for_group(shared_registry(DATABASE_PATH, RATES_PATH).group(group_id))
+    store = splitter.store
     
-    # Initialize the splitter
-    splitter = ExpenseSplitter()
+    # Balances and settlements are shown in one currency; expenses keep their own
+    currencies = sorted(set(store.currencies) | set(store.rates.currencies()))
+    settle_currency = st.sidebar.selectbox(
+        "Settle in", currencies, index=currencies.index(splitter.settlement_currency()), key="settle_currency"
+    )
+    laps.lap("setup")
     
     # Two-column layout with adjusted ratio
     col1, col2 = st.columns([5, 4])
     
     with col1:
         # Input section
-        st.markdown("<div class='card animate-fade-in'>", unsafe_allow_html=True)
-        st.markdown("""
-        <div class="card-header">
-            <div class="card-header-icon">📝</div>
-            <h2 class="card-title">Add Expense or Command</h2>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(ui_html.card_header("📝", "Add Expense or Command"), unsafe_allow_html=True)
         
         # Chat input area with examples
         user_input = st.text_input(
@@ -384,9 +889,7 @@ def main():
         with col_submit:
             submit_button = st.button("Submit Command", key="submit")
         with col_clear:
-            st.markdown("<div class='button-secondary'>", unsafe_allow_html=True)
             clear_input = st.button("Clear Input", key="clear_input")
-            st.markdown("</div>", unsafe_allow_html=True)
 
         if submit_button and user_input:
             response = splitter.parse_command(user_input)
@@ -395,163 +898,232 @@ def main():
         
         if clear_input:
             st.session_state.user_input = ""
+        laps.lap("input")
             
-        # Show example commands
-        st.markdown("""
-        <div class="examples-list">
-            <div class="examples-title">📝 Example commands (click to use):</div>
-        """, unsafe_allow_html=True)
-        
-        example_commands = [
-            "John paid 50 for dinner split among John, Mary, Bob",
-            "Sarah paid 30 for movie tickets split between Sarah and Mike",
-            "Alex paid 75 for groceries split with Taylor",
-            "balance",
-            "summary",
-            "help",
-            "clear"
-        ]
-        
-        for cmd in example_commands:
-            st.markdown(f"""
-            <div class="example-item" onclick="
-                document.querySelector('.stTextInput input').value = '{cmd}';
-                document.querySelector('.stTextInput input').dispatchEvent(new Event('input', {{ bubbles: true }}));
-            ">
-                {cmd}
-            </div>
-            """, unsafe_allow_html=True)
-        
-        st.markdown("</div>", unsafe_allow_html=True)
-        st.markdown("</div>", unsafe_allow_html=True)
+        # Show example commands, all in one payload
+        st.markdown(ui_html.examples(), unsafe_allow_html=True)
+        laps.lap("examples")
         
         # Display response if available
         if 'show_response' in st.session_state and st.session_state.show_response:
-            st.markdown("<div class='response-area animate-fade-in'>", unsafe_allow_html=True)
-            st.markdown(f"""
-            <div class="response-title">
-                <svg width="20" height="20" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
-                    <path d="M21 11.5C21.0034 12.8199 20.6951 14.1219 20.1 15.3C19.3944 16.7118 18.3098 17.8992 16.9674 18.7293C15.6251 19.5594 14.0782 19.9994 12.5 20C11.1801 20.0035 9.87812 19.6951 8.7 19.1L3 21L4.9 15.3C4.30493 14.1219 3.99656 12.8199 4 11.5C4.00061 9.92179 4.44061 8.37488 5.27072 7.03258C6.10083 5.69028 7.28825 4.6056 8.7 3.90003C9.87812 3.30496 11.1801 2.99659 12.5 3.00003H13C15.0843 3.11502 17.053 3.99479 18.5291 5.47089C20.0052 6.94699 20.885 8.91568 21 11V11.5Z" stroke="#4361ee" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"/>
-                </svg>
-                Response
-            </div>
-            {st.session_state.last_response}
-            """, unsafe_allow_html=True)
-            st.markdown("</div>", unsafe_allow_html=True)
+            st.markdown(ui_html.response(st.session_state.last_response), unsafe_allow_html=True)
             
-            st.markdown("<div class='button-secondary' style='display: flex; justify-content: center;'>", unsafe_allow_html=True)
             if st.button("Clear Response", key="clear_response"):
                 st.session_state.show_response = False
-            st.markdown("</div>", unsafe_allow_html=True)
+        laps.lap("response")
         
         # Display expense history
-        if st.session_state.expenses:
-            st.markdown("<div class='card animate-fade-in'>", unsafe_allow_html=True)
-            st.markdown("""
-            <div class="card-header">
-                <div class="card-header-icon">📋</div>
-                <h2 class="card-title">Expense History</h2>
-            </div>
-            """, unsafe_allow_html=True)
+        if len(store):
+            st.markdown(ui_html.card_header("📋", "Expense History"), unsafe_allow_html=True)
+            
+            # Sorting and filtering controls
+            col_sort, col_order, col_person, col_text = st.columns([2, 1, 2, 2])
+            with col_sort:
+                sort_by = st.selectbox("Sort by", SORT_KEYS, format_func=SORT_LABELS.get, key="history_sort")
+            with col_order:
+                descending = st.checkbox("Descending", value=True, key="history_descending")
+            with col_person:
+                person = st.selectbox("Person", ["Everyone"] + sorted(store.names), key="history_person")
+            with col_text:
+                text = st.text_input("Description contains", key="history_text").strip().lower()
+            col_size, col_page = st.columns([1, 1])
+            with col_size:
+                page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key="history_page_size")
+            with col_page:
+                page = st.number_input("Page", min_value=1, value=1, step=1, key="history_page")
             
-            # Create a DataFrame for expense history instead of HTML
-            expense_data = []
-            for expense in st.session_state.expenses:
-                expense_data.append({
-                    "Date": expense["date"],
-                    "Description": expense["description"],
-                    "Amount": f"${expense['amount']:.2f}",
-                    "Paid By": expense["paid_by"],
-                    "Split Among": ", ".join(expense["split_among"])
-                })
+            # Fetch and format only the visible page; past the end, show the last page
+            filters = (sort_by, descending, None if person == "Everyone" else person, text)
+            total, expense_df = splitter.history_page(*filters, page_size, page - 1)
+            pages = max(1, -(-total // page_size))
+            if page > pages:
+                page = pages
+                total, expense_df = splitter.history_page(*filters, page_size, page - 1)
+            st.caption(f"Page {page} of {pages} ({total} expenses)")
             
-            # Display as Streamlit table
-            if expense_data:
-                expense_df = pd.DataFrame(expense_data)
-                st.dataframe(expense_df, use_container_width=True)
+            # Numeric columns stay numeric and are formatted by the column config;
+            # amounts are in each expense's own currency
+            st.dataframe(
+                expense_df,
+                use_container_width=True,
+                column_config={"Amount": st.column_config.NumberColumn(format="%.2f")}
+            )
             
-            st.markdown("</div>", unsafe_allow_html=True)
+            # Downloads are only generated when clicked
+            with st.expander("Export"):
+                col_table, col_format = st.columns([1, 1])
+                with col_table:
+                    table = st.selectbox("Table", exporter.TABLES, key="export_table")
+                with col_format:
+                    formats = [fmt for fmt in exporter.FORMATS if fmt != "parquet" or find_spec("pyarrow")]
+                    fmt = st.selectbox("Format", formats, key="export_format")
+                
+                def export_data():
+                    buffer = io.BytesIO()
+                    splitter.export(table, fmt, buffer, settle_currency)
+                    return buffer.getvalue()
+                
+                st.download_button(
+                    f"Download {table}", export_data, file_name=f"{table}.{fmt}",
+                    mime=exporter.FORMATS[fmt], key="export_download"
+                )
+        laps.lap("history")
     
     with col2:
         # Balances and Transactions Section
-        if st.session_state.expenses:
+        if len(store):
             # Current Balances
-            st.markdown("<div class='card animate-fade-in'>", unsafe_allow_html=True)
-            st.markdown("""
-            <div class="card-header">
-                <div class="card-header-icon">💵</div>
-                <h2 class="card-title">Current Balances</h2>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            balances = splitter.calculate_balances()
+            st.markdown(ui_html.card_header("💵", "Current Balances"), unsafe_allow_html=True)
             
-            # Create a DataFrame for balances instead of HTML string
-            balance_data = []
-            for person, balance in balances.items():
-                status_text = "Settled" if abs(balance) < 0.01 else "Is Owed" if balance > 0 else "Owes"
-                balance_data.append({
-                    "Person": person,
-                    "Balance": f"${balance:.2f}",
-                    "Status": status_text
-                })
-            
-            # Display as Streamlit table
-            if balance_data:
-                balance_df = pd.DataFrame(balance_data)
-                st.table(balance_df)
-            
-            st.markdown("</div>", unsafe_allow_html=True)
+            # The table is built once per ledger version and currency
+            try:
+                balance_df = splitter.balance_table(settle_currency)
+            except ValueError as exc:
+                st.warning(f"Can't show the balances in {settle_currency}: {exc}.")
+                balance_df = None
+            if balance_df is not None and len(balance_df):
+                st.table(balance_df.style.format({"Balance": currency_format(settle_currency)}))
+            laps.lap("balances")
             
             # Suggested Transactions
-            st.markdown("<div class='card animate-fade-in'>", unsafe_allow_html=True)
-            st.markdown("""
-            <div class="card-header">
-                <div class="card-header-icon">💸</div>
-                <h2 class="card-title">Suggested Transactions</h2>
-            </div>
-            """, unsafe_allow_html=True)
+            st.markdown(ui_html.card_header("💸", "Suggested Transactions"), unsafe_allow_html=True)
             
-            transactions = splitter.get_transactions()
+            strategy = st.selectbox("Settlement strategy", STRATEGIES, key="settle_strategy")
+            try:
+                with splitter.lock:
+                    transactions = splitter.get_transactions(strategy, currency=settle_currency)
+                    # Every card in one payload, built once per ledger
+                    # version; read under the group lock like every other
+                    # derived result, so the cards match these transactions
+                    cards = store.cached(
+                        ("transaction_cards", strategy, settle_currency, store.rates.version, today()),
+                        lambda: ui_html.transactions(transactions, settle_currency),
+                    ) if transactions else None
+                settled = not transactions
+            except ValueError as exc:
+                # A missing rate is already reported by the balances card;
+                # anything else (e.g. too many people for "exact") is shown
+                # here
+                if balance_df is not None:
+                    st.warning(f"Can't suggest transactions: {exc}.")
+                cards, settled = None, False
             
-            if transactions:
-                for t in transactions:
-                    st.markdown(f"""
-                    <div class='transaction-card'>
-                        <div class="transaction-details">
-                            <div class="transaction-icon">↗️</div>
-                            <span class="transaction-text"><b>{t['from']}</b> owes <b>{t['to']}</b></span>
-                        </div>
-                        <div class="transaction-amount">${t['amount']:.2f}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-            else:
-                st.markdown("""
-                <div style="text-align: center; padding: 20px;">
-                    <div style="font-size: 2rem; margin-bottom: 10px;">✅</div>
-                    <div style="color: var(--accent); font-weight: 600;">All settled up! No one owes anything.</div>
-                </div>
-                """, unsafe_allow_html=True)
-            st.markdown("</div>", unsafe_allow_html=True)
+            if cards:
+                st.markdown(cards, unsafe_allow_html=True)
+            elif settled:
+                st.markdown(ui_html.SETTLED, unsafe_allow_html=True)
             
             # Clear data button
-            st.markdown("<div class='button-danger' style='display: flex; justify-content: center;'>", unsafe_allow_html=True)
             if st.button("Reset All Expenses", key="reset_all"):
-                st.session_state.expenses = []
-                st.session_state.people = set()
-                st.session_state.expense_colors = {}
-            st.markdown("</div>", unsafe_allow_html=True)
+                splitter.reset()
+            laps.lap("transactions")
         else:
             # Empty state when no expenses
-            st.markdown("<div class='card empty-state animate-fade-in'>", unsafe_allow_html=True)
-            st.markdown("""
-            <div class="empty-state-icon">📊</div>
-            <div class="empty-state-text">No expenses recorded yet. Add your first expense to get started!</div>
-            """, unsafe_allow_html=True)
-            st.markdown("</div>", unsafe_allow_html=True)
+            st.markdown(ui_html.EMPTY_STATE, unsafe_allow_html=True)
+            laps.lap("empty_state")
     
     # Footer
-    st.markdown("<div class='footer'>Expense Splitter App • Made with Streamlit</div>", unsafe_allow_html=True)
+    st.markdown(ui_html.FOOTER, unsafe_allow_html=True)
+    
+    performance_panel()
+
+# Headless command line, e.g. "python main.py import trip.csv"
+def cli(argv):
+    parser = argparse.ArgumentParser(prog="main.py", description="Expense splitter without the Streamlit UI")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="import chat commands (.txt) or expense rows (.csv, .jsonl)")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--db", help="SQLite ledger to add the expenses to (created if missing)")
+    import_parser.add_argument("--rates", help="CSV of exchange rates (currency, rate[, quote][, date])")
+    import_parser.add_argument("--currency", help="currency to show the balances in")
+    export_parser = commands.add_parser("export", help="export a ledger as CSV, JSONL or Parquet")
+    export_parser.add_argument("file", help="output file; the extension picks the format")
+    source = export_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--db", help="SQLite ledger to export")
+    source.add_argument("--source", help="import this file (.txt, .csv, .jsonl) and export it instead")
+    export_parser.add_argument("--table", choices=exporter.TABLES, default="expenses")
+    export_parser.add_argument("--rates", help="CSV of exchange rates (currency, rate[, quote][, date])")
+    export_parser.add_argument("--currency", help="currency of the balances and settlements tables")
+    statements_parser = commands.add_parser(
+        "statements", help="recompute every group's balances and settlements in parallel, as JSONL",
+    )
+    statements_parser.add_argument("file", help="output JSONL file, one statement per group")
+    statements_parser.add_argument(
+        "--db", required=True, help="SQLite ledger of the default group; the groups kept next to it are included",
+    )
+    statements_parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    statements_parser.add_argument("--strategy", choices=STRATEGIES, default="auto")
+    statements_parser.add_argument(
+        "--rebuild", action="store_true", help="replace saved balances that don't match a replay of the expenses",
+    )
+    statements_parser.add_argument("--rates", help="CSV of exchange rates (currency, rate[, quote][, date])")
+    statements_parser.add_argument("--currency", help="currency to settle every group in")
+    args = parser.parse_args(argv)
+    if args.command == "statements":
+        return statements_command(args)
+    
+    splitter = ExpenseSplitter(ExpenseStore(), LedgerDatabase(args.db) if args.db else None)
+    try:
+        if args.rates:
+            splitter.store.rates.load(args.rates)
+        if args.currency:
+            args.currency = currency_code(args.currency)
+    except (OSError, ValueError) as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    if args.command == "export":
+        return export_command(splitter, args)
+    
+    started = time.perf_counter()
+    try:
+        message = splitter.add_expenses_bulk(importer.iter_rows(args.file))
+    except (OSError, ValueError) as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    print(f"{message} ({time.perf_counter() - started:.2f}s)")
+    print(splitter.execute(command_parser.ParsedCommand(command_parser.BALANCE, currency=args.currency)))
+    return 0
+
+def export_command(splitter, args):
+    started = time.perf_counter()
+    try:
+        fmt = exporter.format_for(args.file)
+        if args.source is not None:
+            splitter.add_expenses_bulk(importer.iter_rows(args.source))
+        with open(args.file, "wb") as file:
+            splitter.export(args.table, fmt, file, args.currency)
+    except (OSError, ValueError) as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    print(f"Exported {args.table} to {args.file} ({time.perf_counter() - started:.2f}s)")
+    return 0
+
+def statements_command(args):
+    started = time.perf_counter()
+    rates = RateTable()
+    try:
+        if args.rates:
+            rates.load(args.rates)
+        currency = currency_code(args.currency) if args.currency else None
+        groups = LedgerRegistry(args.db, rates).saved_groups()
+        if not groups:
+            raise ValueError(f"There are no ledgers at {args.db}")
+        workers = args.workers or os.cpu_count()
+        failed = 0
+        with batch.worker_pool(workers) as pool, open(args.file, "w", encoding="utf-8") as file:
+            for statement in batch.statements(groups, pool, workers, rates, currency, args.strategy, args.rebuild):
+                if "error" in statement:
+                    failed += 1
+                    print(f"{statement['group']}: {statement['error']}", file=sys.stderr)
+                file.write(json.dumps(statement) + "\n")
+    except (OSError, ValueError) as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    print(f"Wrote statements for {len(groups) - failed} of {len(groups)} groups to {args.file} "
+          f"({time.perf_counter() - started:.2f}s, {workers} workers)")
+    return 1 if failed else 0
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in ("import", "export", "statements"):
+        sys.exit(cli(sys.argv[1:]))
     main()
\ No newline at end of file
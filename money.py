@@ -0,0 +1,152 @@
+import re
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+import numpy as np
+
+
+# Money is kept as integer cents everywhere below the UI, so balances are
+# exact sums and always add up to zero. These helpers are the only places
+# that convert or divide amounts.
+
+# How one person's part of an uneven split is given: a number of shares of
+# what's left after the fixed parts, a percentage of the total, or a fixed
+# amount. People with no spec get one share.
+SHARES = "shares"
+PERCENT = "percent"
+AMOUNT = "amount"
+
+# Currency of expenses entered without one (the app used to assume dollars),
+# and the symbols messages use instead of a code
+DEFAULT_CURRENCY = "USD"
+SYMBOLS = {"USD": "$", "EUR": "€", "GBP": "£", "JPY": "¥", "INR": "₹"}
+CURRENCY_PATTERN = re.compile(r"[A-Z]{3}")
+
+# Largest amount accepted, in cents: far inside int64, so balances built from
+# such amounts stay exact integers (see bincount_cents())
+MAX_CENTS = 2 ** 53
+
+
+def to_cents(amount):
+    # Round a currency amount (a number or numeric string) to whole cents,
+    # halves away from zero. Amounts are read as decimals, as typed: "0.285"
+    # is 29 cents, and so is the float 0.285 (read as the digits it prints
+    # as, not its binary value).
+    try:
+        value = Decimal(str(amount))
+    except InvalidOperation:
+        raise ValueError(f"amount must be a number, got {amount!r}") from None
+    if not value.is_finite():
+        raise ValueError(f"amount must be a finite number, got {amount!r}")
+    cents = value.scaleb(2)
+    if abs(cents) > MAX_CENTS:
+        raise ValueError(f"amount must be at most {MAX_CENTS / 100:,.2f}, got {amount!r}")
+    return int(cents.quantize(1, rounding=ROUND_HALF_UP))
+
+
+def split_evenly(total, count):
+    # Largest-remainder split of total cents between count people. Every
+    # remainder is the same, so ties go to the earliest people in the list:
+    # the first total % count of them pay one cent more.
+    base, remainder = divmod(total, count)
+    return [base + 1 if position < remainder else base for position in range(count)]
+
+
+def split_evenly_many(totals, sizes):
+    # split_evenly() for many expenses at once; totals and sizes are per
+    # expense and the result is one share per participant, in CSR order
+    positions = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    base, remainder = np.divmod(totals, sizes)
+    return np.repeat(base, sizes) + (positions < np.repeat(remainder, sizes))
+
+
+def bincount_cents(ids, cents, people):
+    # Sum cents per id, exactly. bincount adds in float64, which is exact
+    # while every partial sum stays below 2**53 cents; that is certain when
+    # the largest amount times the number of amounts is, which covers any
+    # everyday ledger. Otherwise the sums are scattered in int64.
+    cents = np.asarray(cents, dtype=np.int64)
+    if not len(cents) or int(np.abs(cents).max()) * len(cents) < 2 ** 53:
+        return np.bincount(ids, weights=cents, minlength=people).astype(np.int64)
+    sums = np.zeros(max(people, int(np.max(ids)) + 1), dtype=np.int64)
+    np.add.at(sums, ids, cents)
+    return sums
+
+
+def balance_deltas(payers, amounts, sizes, members, shares, currencies, people, count):
+    # What some expenses do to the balances: cents per person id and currency
+    # id as a (people, count) array. currencies has one id per expense.
+    payers = payers.astype(np.int64) * count + currencies
+    members = members.astype(np.int64) * count + np.repeat(currencies, sizes)
+    cells = people * count
+    return (bincount_cents(payers, amounts, cells) - bincount_cents(members, shares, cells)).reshape(people, count)
+
+
+def convert_cents(subtotals, factors):
+    # Per-person totals in one currency from (people, currencies) cents and
+    # one conversion factor per currency. Exact values are floored and the
+    # leftover cents go to the largest remainders, so balances that added up
+    # to zero in every currency still add up to zero once converted.
+    exact = subtotals @ factors
+    floors = np.floor(exact)
+    leftover = round(float(exact.sum() - floors.sum()))
+    converted = floors.astype(np.int64)
+    converted[np.argsort(floors - exact, kind="stable")[:leftover]] += 1
+    return converted
+
+
+def currency_code(code):
+    # "eur" -> "EUR"; codes are three letters (ISO 4217)
+    normalized = str(code).strip().upper()
+    if not CURRENCY_PATTERN.fullmatch(normalized):
+        raise ValueError(f"currency codes are three letters, got {code!r}")
+    return normalized
+
+
+def currency_format(currency):
+    # str.format() pattern for amounts in a currency: "$12.50", "12.50 CHF"
+    symbol = SYMBOLS.get(currency)
+    return f"{symbol}{{:.2f}}" if symbol else f"{{:.2f}} {currency}"
+
+
+def format_amount(amount, currency):
+    # An amount in currency units for messages
+    return currency_format(currency).format(amount)
+
+
+def allocate_many(totals, sizes, fixed, percents, weights):
+    # Uneven splits for many expenses at once. totals and sizes are per
+    # expense; fixed (cents), percents (of the total) and weights (shares of
+    # whatever fixed amounts and percentages leave over) are per participant,
+    # in CSR order, with zeros where they don't apply. Returns one share per
+    # participant and a per-expense mask of splits that add up, i.e. don't
+    # claim more than the total and leave nothing over unless someone has a
+    # weight.
+    #
+    # Exact per-person amounts are floored and the leftover cents go to the
+    # largest remainders, ties to the earliest people, so equal weights split
+    # exactly like split_evenly_many() and every expense sums to its total.
+    count = len(sizes)
+    expense = np.repeat(np.arange(count), sizes)
+    claimed = fixed + percents * totals[expense] / 100
+    rest = totals - np.bincount(expense, weights=claimed, minlength=count)
+    weight_sums = np.bincount(expense, weights=weights, minlength=count)
+    valid = (rest > -0.005) & ((weight_sums > 0) | (rest < 0.005))
+
+    per_weight = np.maximum(rest, 0) / np.where(weight_sums > 0, weight_sums, 1)
+    # Rounded so float noise (600.0000000001) doesn't move a cent
+    exact = np.round(claimed + weights * per_weight[expense], 6)
+    floors = np.floor(exact).astype(np.int64)
+    leftover = totals - bincount_cents(expense, floors, count)
+    # Rounded again: 148581.4 - 148581 and 13507.4 - 13507 differ in the
+    # last bits, which would break their tie
+    remainders = np.round(exact - floors, 6)
+
+    # Rank everyone within their expense by remainder, largest first, with
+    # one float sort key (much faster than lexsort; remainders are rounded to
+    # 1e-6, which the key resolves for well over a million expenses per call).
+    # The stable sort keeps list order between equal remainders.
+    order = np.argsort(expense + (1 - remainders) / 2, kind="stable")
+    starts = np.repeat(np.cumsum(sizes) - sizes, sizes)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - starts[order]
+    return floors + (rank < leftover[expense]), valid
@@ -0,0 +1,234 @@
+import re
+import unicodedata
+from bisect import bisect_left, insort
+from itertools import chain
+
+import numpy as np
+
+
+# The people of a ledger: canonical names with integer ids (the ids the
+# store's columns hold), aliases, and a fuzzy index for catching typos.
+# Names are matched on a key that ignores case, accents and extra spaces, so
+# "Bob" and "bob" are one person. A name that isn't known but is close to one
+# that is ("bobby", "b0b") isn't matched silently; resolve() suggests the
+# known names instead. Close means within a few edits (checked with a bigram
+# index, so only names sharing enough bigrams are compared) or one name
+# extending the other with letters.
+
+# Names shorter than this are never suggested as nicknames of longer ones
+MIN_PREFIX = 3
+
+# Suggestions shown for one unknown name
+MAX_SUGGESTIONS = 3
+
+# Spellings sharing the most bigrams with a name that are compared with it
+# edit by edit; in a group of "person1" ... "person9999" nearly everyone
+# passes the bigram filter
+MAX_COMPARED = 32
+
+WHITESPACE = re.compile(r"\s+")
+DIGITS = re.compile(r"\d+")
+
+
+def name_key(name):
+    # "  Zoë  Smith" -> "zoe smith"
+    name = unicodedata.normalize("NFKD", name.casefold())
+    name = "".join(ch for ch in name if not unicodedata.combining(ch))
+    return WHITESPACE.sub(" ", name).strip()
+
+
+def max_edits(key):
+    # Typos tolerated in a name of this length
+    return 1 if len(key) <= 5 else 2
+
+
+def bigrams(key):
+    padded = f" {key} "
+    return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+
+def edit_distance(a, b, limit):
+    # Levenshtein distance, or limit + 1 as soon as it must exceed limit
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def numbered_apart(a, b):
+    # "person1" and "person10" (or "room 2" and "room 3") are different
+    # people, not typos of each other
+    return DIGITS.sub("#", a) == DIGITS.sub("#", b)
+
+
+class UnknownPerson(ValueError):
+    def __init__(self, name, suggestions):
+        self.name = name
+        self.suggestions = suggestions
+        if suggestions:
+            message = f"I don't know {name}. Did you mean {' or '.join(suggestions)}?"
+        else:
+            message = f"I don't know {name}."
+        super().__init__(message)
+
+
+class PeopleRegistry:
+    def __init__(self):
+        # id -> canonical name, and canonical name -> id
+        self.names = []
+        self.ids = {}
+        # alias -> id, as entered
+        self.aliases = {}
+        # Every spelling (the key of a name or an alias) -> id; spellings
+        # are also kept sorted for prefix lookups
+        self.keys = {}
+        self.sorted_keys = []
+        # Bigram -> spellings containing it (indexes into spellings)
+        self.spellings = []
+        self.grams = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def find(self, name):
+        # Id of a name or alias (ignoring case, accents and spacing), or None
+        pid = self.ids.get(name)
+        if pid is None:
+            pid = self.keys.get(name_key(name))
+        return pid
+
+    def intern(self, name):
+        # Id of a known name or alias, adding it as a new person otherwise
+        pid = self.find(name)
+        return self.add(name) if pid is None else pid
+
+    def add(self, name):
+        # A new person; returns their id. Ledgers from before names were
+        # matched loosely may hold both "Bob" and "bob": the first one keeps
+        # the spelling and the other is only found by its exact name.
+        key = name_key(name)
+        if not key:
+            raise ValueError("a name can't be empty")
+        if name in self.ids:
+            raise ValueError(f"{name} is already in the ledger")
+        pid = len(self.names)
+        self.names.append(name)
+        self.ids[name] = pid
+        if key not in self.keys:
+            self._index(key, pid)
+        return pid
+
+    def alias(self, alias, name):
+        # Let alias stand for a known person; returns their id
+        pid = self.find(name)
+        if pid is None:
+            raise UnknownPerson(name, self.suggest(name))
+        key = name_key(alias)
+        if not key:
+            raise ValueError("an alias can't be empty")
+        known = self.keys.get(key)
+        if known == pid:
+            return pid
+        if known is not None:
+            if name_key(self.names[known]) == key:
+                raise ValueError(f"{alias} is already someone in the ledger")
+            raise ValueError(f"{alias} already stands for {self.names[known]}")
+        self.aliases[alias] = pid
+        self._index(key, pid)
+        return pid
+
+    def truncate(self, count):
+        # Forget every person from id count on (and their aliases), e.g. the
+        # ones a rejected import introduced
+        if count >= len(self.names):
+            return
+        for name in self.names[count:]:
+            del self.ids[name]
+        del self.names[count:]
+        self.aliases = {alias: pid for alias, pid in self.aliases.items() if pid < count}
+        spellings = [(key, pid) for key, pid in self.keys.items() if pid < count]
+        self.keys = {}
+        self.sorted_keys = []
+        self.spellings = []
+        self.grams = {}
+        for key, pid in spellings:
+            self._index(key, pid)
+
+    def resolve(self, name):
+        # Id of a known name or alias; None for a name that is nobody's yet.
+        # Raises UnknownPerson, with suggestions, for a name close to a known
+        # one.
+        pid = self.ids.get(name)
+        if pid is None:
+            pid = self.keys.get(name_key(name))
+        if pid is None:
+            suggestions = self.suggest(name)
+            if suggestions:
+                raise UnknownPerson(name, suggestions)
+        return pid
+
+    def suggest(self, name, limit=MAX_SUGGESTIONS):
+        # Canonical names of the people closest to name, best first
+        key = name_key(name)
+        if not key or not self.spellings:
+            return []
+        scored = {}
+        for pid, score in chain(self._typos(key), self._prefixes(key)):
+            if score < scored.get(pid, score + 1):
+                scored[pid] = score
+        ranked = sorted(scored, key=lambda pid: (scored[pid], self.names[pid]))
+        return [self.names[pid] for pid in ranked[:limit]]
+
+    def _index(self, key, pid):
+        self.keys[key] = pid
+        insort(self.sorted_keys, key)
+        spelling = len(self.spellings)
+        self.spellings.append(key)
+        for gram in bigrams(key):
+            self.grams.setdefault(gram, []).append(spelling)
+
+    def _typos(self, key):
+        # (id, edits) of spellings within max_edits(key) edits. One edit
+        # changes at most two bigrams, so only spellings sharing enough of
+        # key's bigrams (counted over the index's postings) are candidates,
+        # and of those the MAX_COMPARED sharing the most are compared.
+        limit = max_edits(key)
+        grams = bigrams(key)
+        postings = [self.grams[gram] for gram in grams if gram in self.grams]
+        if not postings:
+            return
+        shared = np.bincount(
+            np.fromiter(chain.from_iterable(postings), dtype=np.int64), minlength=len(self.spellings)
+        )
+        candidates = np.flatnonzero(shared >= len(grams) - 2 * limit)
+        if len(candidates) > MAX_COMPARED:
+            candidates = candidates[np.argsort(-shared[candidates], kind="stable")[:MAX_COMPARED]]
+        for spelling in candidates.tolist():
+            other = self.spellings[spelling]
+            if numbered_apart(key, other):
+                continue
+            edits = edit_distance(key, other, limit)
+            if edits <= limit:
+                yield self.keys[other], edits
+
+    def _prefixes(self, key):
+        # (id, extra letters) of spellings that extend key with letters
+        # ("bob" -> "bobby") or that key extends ("bobby" -> "bob")
+        if len(key) >= MIN_PREFIX:
+            for i in range(bisect_left(self.sorted_keys, key), len(self.sorted_keys)):
+                other = self.sorted_keys[i]
+                if not other.startswith(key):
+                    break
+                if other != key and other[len(key):].isalpha():
+                    yield self.keys[other], len(other) - len(key)
+        for end in range(MIN_PREFIX, len(key)):
+            pid = self.keys.get(key[:end])
+            if pid is not None and key[end:].isalpha():
+                yield pid, len(key) - end
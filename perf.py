@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+from bisect import bisect_left
+from functools import wraps
+from time import perf_counter
+
+import numpy as np
+
+
+# Timing spans for the hot paths (parsing, ledger reads and writes, DataFrame
+# building, UI sections). Samples are aggregated per span name into a
+# process-wide histogram that the app's Performance panel shows and that can
+# be dumped as JSON or Prometheus text. While timing is off, span() hands out
+# one shared no-op context and timed() functions call straight through.
+
+# Histogram bucket upper bounds in seconds: 1us to about 16s, doubling
+BUCKETS = tuple(1e-6 * 2 ** i for i in range(25))
+
+# Most recent samples kept per span for percentiles
+WINDOW = 1024
+
+# Off unless EXPENSE_SPLITTER_PERF=1 or the Performance panel turns it on
+enabled = os.environ.get("EXPENSE_SPLITTER_PERF") == "1"
+
+
+def enable(flag=True):
+    global enabled
+    enabled = flag
+
+
+class Histogram:
+    # Cumulative bucket counts (for Prometheus) plus a ring of the latest
+    # WINDOW samples (for percentiles)
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)  # the last one is +Inf
+        self.recent = [0.0] * WINDOW
+
+    def record(self, seconds):
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        self.recent[self.count % WINDOW] = seconds
+        self.count += 1
+        self.total += seconds
+
+    def summary(self):
+        recent = np.array(self.recent[:min(self.count, WINDOW)])
+        p50, p90, p99 = np.percentile(recent, [50, 90, 99]).tolist()
+        return {
+            "count": self.count,
+            "total_seconds": self.total,
+            "mean_seconds": self.total / self.count,
+            "p50_seconds": p50,
+            "p90_seconds": p90,
+            "p99_seconds": p99,
+            "max_seconds": float(recent.max()),
+        }
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def record(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    def snapshot(self):
+        # {span: summary}, percentiles over each span's recent samples
+        with self.lock:
+            return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        # Text exposition format, one histogram labelled by span
+        metric = "expense_splitter_span_seconds"
+        lines = [
+            f"# HELP {metric} Time spent in instrumented spans.",
+            f"# TYPE {metric} histogram",
+        ]
+        with self.lock:
+            for name, histogram in sorted(self.histograms.items()):
+                label = f'span="{name}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), histogram.buckets):
+                    cumulative += count
+                    le = bound if isinstance(bound, str) else f"{bound:g}"
+                    lines.append(f'{metric}_bucket{{{label},le="{le}"}} {cumulative}')
+                lines.append(f"{metric}_sum{{{label}}} {histogram.total!r}")
+                lines.append(f"{metric}_count{{{label}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every session and API request in the process
+RECORDER = Recorder()
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        RECORDER.record(self.name, perf_counter() - self.started)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    # with span("history_dataframe"): ...
+    return _Span(name) if enabled else _NO_SPAN
+
+
+def timed(name):
+    # Decorator: record every call of the function under name
+    def decorate(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            started = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                RECORDER.record(name, perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+class Laps:
+    # Times consecutive sections of straight-line code, e.g. the parts of a
+    # Streamlit rerun: every lap(name) records the time since the previous
+    # lap (or since the Laps was made) as "<prefix>.<name>"
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.last = perf_counter() if enabled else None
+
+    def lap(self, name):
+        if self.last is None:
+            return
+        now = perf_counter()
+        RECORDER.record(f"{self.prefix}.{name}", now - self.last)
+        self.last = now
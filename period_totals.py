@@ -0,0 +1,143 @@
+from functools import lru_cache
+
+import numpy as np
+
+from ledger_index import day_number, month_numbers, month_starts, positions_of
+from money import bincount_cents
+
+
+class Totals:
+    # What changed hands in a period, in cents: paid and spent (each person's
+    # shares) per person id and currency id, spending per category and
+    # currency id, and how many expenses that was (recurring occurrences
+    # included, and also counted on their own)
+    def __init__(self, people=0, currencies=0):
+        self.paid = np.zeros((people, currencies), dtype=np.int64)
+        self.spent = np.zeros((people, currencies), dtype=np.int64)
+        self.categories = {}  # {(category, currency id): cents}
+        self.count = 0
+        self.recurring = 0
+
+    def fit(self, people, currencies):
+        # Grow to at least people x currencies
+        shape = (max(people, self.paid.shape[0]), max(currencies, self.paid.shape[1]))
+        if shape != self.paid.shape:
+            for name in ("paid", "spent"):
+                grown = np.zeros(shape, dtype=np.int64)
+                old = getattr(self, name)
+                grown[:old.shape[0], :old.shape[1]] = old
+                setattr(self, name, grown)
+
+    def add(self, payers, amounts, sizes, members, shares, currencies, categories, count=None, recurring=0, sign=1):
+        # Add expenses given as store columns (one description per expense
+        # in categories), or take them away again with sign -1
+        if not len(payers):
+            return
+        people = int(max(payers.max(), members.max(initial=0))) + 1
+        self.fit(people, int(currencies.max()) + 1)
+        people, width = self.paid.shape
+        cells = people * width
+        self.paid += sign * bincount_cents(payers.astype(np.int64) * width + currencies, amounts, cells).reshape(people, width)
+        member_cells = members.astype(np.int64) * width + np.repeat(currencies, sizes)
+        self.spent += sign * bincount_cents(member_cells, shares, cells).reshape(people, width)
+
+        # Categories are summed per (category, currency) pair in numpy and
+        # only the distinct pairs touch the dict
+        names = {}
+        ids = np.fromiter(
+            (names.setdefault(category(description), len(names)) for description in categories),
+            dtype=np.int64, count=len(categories),
+        )
+        keys, slots = np.unique(ids * width + currencies, return_inverse=True)
+        sums = np.zeros(len(keys), dtype=np.int64)
+        np.add.at(sums, slots, amounts)
+        labels = list(names)
+        for key, cents in zip(keys.tolist(), sums.tolist()):
+            pair = (labels[key // width], key % width)
+            total = self.categories.get(pair, 0) + sign * cents
+            if total:
+                self.categories[pair] = total
+            else:
+                self.categories.pop(pair, None)
+        self.count += sign * (len(payers) if count is None else count)
+        self.recurring += sign * recurring
+
+    def merge(self, other):
+        self.fit(*other.paid.shape)
+        people, currencies = other.paid.shape
+        self.paid[:people, :currencies] += other.paid
+        self.spent[:people, :currencies] += other.spent
+        for pair, cents in other.categories.items():
+            self.categories[pair] = self.categories.get(pair, 0) + cents
+        self.count += other.count
+        self.recurring += other.recurring
+        return self
+
+
+@lru_cache(maxsize=4096)
+def category(description):
+    # Expenses are grouped by description, ignoring case and spacing
+    return " ".join(description.lower().split())
+
+
+# Totals of a store's live rows per calendar month, kept up to date by every
+# add, delete, restore and edit (see ExpenseStore.period_totals()) rather
+# than rebuilt. A period's totals are the kept totals of the whole months it
+# covers plus the rows of the days at either end, read from the date index,
+# so a statement costs O(months) however many expenses they hold.
+class PeriodTotals:
+    def __init__(self, store):
+        self.store = store
+        self.months = {}
+        self.apply(np.flatnonzero(~store.column("deleted")))
+
+    def apply(self, rows, sign=1):
+        # Add the given rows to their months' totals, or take them away again
+        # with sign -1 (before they are deleted or changed)
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return
+        months = month_numbers(self.store.date[rows])
+        order = np.argsort(months, kind="stable")
+        rows, months = rows[order], months[order]
+        starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+        for first, last in zip(starts.tolist(), starts[1:].tolist() + [len(rows)]):
+            month = int(months[first])
+            totals = self.months.setdefault(month, Totals())
+            self._add_rows(totals, rows[first:last], sign)
+            if not totals.count:
+                del self.months[month]
+
+    def _add_rows(self, totals, rows, sign=1):
+        store = self.store
+        positions = positions_of(store.offsets, rows)
+        totals.add(
+            store.paid_by[rows], store.amount[rows], store.offsets[rows + 1] - store.offsets[rows],
+            store.members[positions], store.shares[positions], store.currency[rows],
+            [store.descriptions[row] for row in rows.tolist()], sign=sign,
+        )
+
+    def between(self, start=None, end=None):
+        # Totals of the expenses dated start <= date < end (ISO dates; None
+        # leaves that side open)
+        store = self.store
+        totals = Totals(len(store.names), len(store.currencies))
+        start_day, end_day = day_number(start), day_number(end)
+        # Whole months first <= month < last come from the kept totals
+        first = None if start is None else int(month_numbers(start_day - 1)) + 1
+        last = None if end is None else int(month_numbers(end_day))
+        if first is not None and last is not None and first >= last:
+            self._add_rows(totals, store.index().rows(None, start, end))
+            return totals
+        for month, month_totals in self.months.items():
+            if (first is None or month >= first) and (last is None or month < last):
+                totals.merge(month_totals)
+        if first is not None and int(month_starts(first)) != start_day:
+            self._add_rows(totals, store.index().rows(None, start, _iso(int(month_starts(first)))))
+        if last is not None and int(month_starts(last)) != end_day:
+            self._add_rows(totals, store.index().rows(None, _iso(int(month_starts(last))), end))
+        return totals
+
+
+def _iso(day):
+    return str(np.datetime64(day, "D"))
@@ -0,0 +1,204 @@
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from ledger_index import month_numbers, month_starts
+from money import balance_deltas, bincount_cents
+
+
+# Units a schedule can step in, as (length, calendar unit): days step by a
+# fixed number of days, months by calendar months
+UNITS = {"day": (1, "D"), "week": (7, "D"), "month": (1, "M"), "year": (12, "M")}
+
+# "monthly", "weekly"... for schedules that repeat every single unit
+ADVERBS = {"day": "daily", "week": "weekly", "month": "monthly", "year": "yearly"}
+
+# Stands in for "no end" in the day-number columns
+NEVER = np.iinfo(np.int64).max // 2
+
+
+@dataclass(frozen=True)
+class Recurring:
+    # One recurring expense, in store ids and cents like a row of the
+    # ExpenseStore; members owe the matching shares on every occurrence.
+    # Occurrences fall every `every` units from start (a day number); monthly
+    # and yearly ones keep start's day of the month, or the month's last day
+    # when it is shorter. end is the day number they stop before (None: they
+    # go on).
+    paid_by: int
+    amount: int
+    description: str
+    members: tuple
+    shares: tuple
+    currency: int
+    start: int
+    every: int
+    unit: str
+    end: int = None
+
+    def frequency(self):
+        # "monthly", "every 2 weeks"
+        if self.every == 1:
+            return ADVERBS[self.unit]
+        return f"every {self.every} {self.unit}s"
+
+
+# The recurring expenses of a ledger. They are never expanded into expense
+# rows: how often each one falls in a period is worked out from its schedule
+# in closed form, for all of them at once, so a query costs the same whether
+# a schedule has run for a week or for twenty years.
+class RecurringSchedule:
+    def __init__(self):
+        self.definitions = []
+        self._columns = None
+
+    def __len__(self):
+        return len(self.definitions)
+
+    def __iter__(self):
+        return iter(self.definitions)
+
+    def __getitem__(self, number):
+        return self.definitions[number]
+
+    def add(self, definition):
+        # Returns the definition's number
+        self.check(definition)
+        self.definitions.append(definition)
+        self._columns = None
+        return len(self.definitions) - 1
+
+    def check(self, definition):
+        if definition.unit not in UNITS:
+            raise ValueError(f"Unknown unit {definition.unit!r}, expected one of {', '.join(UNITS)}")
+        if definition.every < 1:
+            raise ValueError(f"a schedule repeats at least every 1 {definition.unit}, got {definition.every}")
+        if definition.end is not None and definition.end <= definition.start:
+            raise ValueError("it would end before it starts")
+
+    def stop(self, number, end):
+        # No occurrences from day number end on; returns the updated definition
+        definition = self.definitions[number]
+        end = max(end, definition.start)
+        if definition.end is not None and definition.end <= end:
+            raise ValueError("it has already stopped")
+        self.definitions[number] = definition = replace(definition, end=end)
+        self._columns = None
+        return definition
+
+    def columns(self):
+        # The definitions as numpy columns (shares in CSR layout), rebuilt
+        # when one is added or stopped
+        if self._columns is None:
+            definitions = self.definitions
+            self._columns = _Columns(
+                start=np.array([d.start for d in definitions], dtype=np.int64),
+                end=np.array([NEVER if d.end is None else d.end for d in definitions], dtype=np.int64),
+                every=np.array([d.every * UNITS[d.unit][0] for d in definitions], dtype=np.int64),
+                monthly=np.array([UNITS[d.unit][1] == "M" for d in definitions], dtype=bool),
+                paid_by=np.array([d.paid_by for d in definitions], dtype=np.int64),
+                amount=np.array([d.amount for d in definitions], dtype=np.int64),
+                currency=np.array([d.currency for d in definitions], dtype=np.int64),
+                sizes=np.array([len(d.members) for d in definitions], dtype=np.int64),
+                members=np.array([m for d in definitions for m in d.members], dtype=np.int64),
+                shares=np.array([s for d in definitions for s in d.shares], dtype=np.int64),
+            )
+        return self._columns
+
+    def counts(self, start, end):
+        # Occurrences of every definition dated start <= day < end (day
+        # numbers; start None counts from the beginning)
+        before = self._before(end)
+        return before if start is None else np.maximum(before - self._before(start), 0)
+
+    def _before(self, day):
+        # Occurrences of each definition dated before day
+        c = self.columns()
+        limit = np.minimum(day, c.end)
+        # Day steps: the occurrences are start, start + every, ...
+        daily = -(-(limit - c.start) // c.every)
+        # Month steps: the last occurrence in or before limit's month, and
+        # whether it falls before limit
+        first_month = month_numbers(c.start)
+        day_of_month = c.start - month_starts(first_month)
+        steps = (month_numbers(limit) - first_month) // c.every
+        month = first_month + steps * c.every
+        length = month_starts(month + 1) - month_starts(month)
+        last = month_starts(month) + np.minimum(day_of_month, length - 1)
+        monthly = steps + (last < limit)
+        return np.maximum(np.where(c.monthly, monthly, daily), 0)
+
+    def dates(self, number, start, end):
+        # Day numbers of one definition's occurrences, start <= day < end
+        definition = self.definitions[number]
+        end = end if definition.end is None else min(end, definition.end)
+        length, unit = UNITS[definition.unit]
+        step = definition.every * length
+        if unit == "D":
+            days = np.arange(definition.start, max(end, definition.start), step)
+        else:
+            first_month = int(month_numbers(definition.start))
+            day_of_month = definition.start - int(month_starts(first_month))
+            months = np.arange(first_month, int(month_numbers(end)) + 1, step)
+            lengths = month_starts(months + 1) - month_starts(months)
+            days = month_starts(months) + np.minimum(day_of_month, lengths - 1)
+            days = days[days < end]
+        return days if start is None else days[days >= start]
+
+    def balances(self, start, end, people, currencies):
+        # What the occurrences dated start <= day < end do to the balances:
+        # cents per person id and currency id, like money.balance_deltas()
+        if not self.definitions:
+            return np.zeros((people, currencies), dtype=np.int64)
+        c = self.columns()
+        counts = self.counts(start, end)
+        return balance_deltas(
+            c.paid_by, c.amount * counts, c.sizes, c.members, c.shares * np.repeat(counts, c.sizes),
+            c.currency, people, currencies,
+        )
+
+    def owed(self, debtor, creditor, end, currencies):
+        # Cents debtor owes creditor per currency id from the occurrences
+        # before end (see LedgerIndex.owed())
+        if not self.definitions:
+            return np.zeros(currencies, dtype=np.int64)
+        counts = self.counts(None, end)
+        return self._shares_of(debtor, creditor, counts, currencies) - self._shares_of(creditor, debtor, counts, currencies)
+
+    def _shares_of(self, pid, payer, counts, currencies):
+        c = self.columns()
+        owner = np.repeat(np.arange(len(self.definitions)), c.sizes)
+        mine = (c.members == pid) & (c.paid_by[owner] == payer)
+        return bincount_cents(c.currency[owner[mine]], c.shares[mine] * counts[owner[mine]], currencies)
+
+    def totals(self, totals, start, end, numbers=None):
+        # Add the occurrences dated start <= day < end (of the given
+        # definitions, or all) to a period_totals.Totals
+        if not self.definitions:
+            return totals
+        c = self.columns()
+        counts = self.counts(start, end)
+        if numbers is not None:
+            keep = np.zeros(len(counts), dtype=bool)
+            keep[list(numbers)] = True
+            counts = np.where(keep, counts, 0)
+        totals.add(
+            c.paid_by, c.amount * counts, c.sizes, c.members, c.shares * np.repeat(counts, c.sizes), c.currency,
+            [d.description for d in self.definitions], count=int(counts.sum()), recurring=int(counts.sum()),
+        )
+        return totals
+
+
+@dataclass(frozen=True)
+class _Columns:
+    start: np.ndarray
+    end: np.ndarray
+    every: np.ndarray  # days for day steps, months for month steps
+    monthly: np.ndarray
+    paid_by: np.ndarray
+    amount: np.ndarray
+    currency: np.ndarray
+    sizes: np.ndarray
+    members: np.ndarray
+    shares: np.ndarray
+
@@ -0,0 +1,171 @@
+import heapq
+import time
+
+import numpy as np
+
+
+# Strategies accepted by settle_cents()
+STRATEGIES = ("auto", "greedy", "exact", "bounded")
+
+# Largest group the exact solver is allowed to take on; it is O(2^n * n)
+EXACT_LIMIT = 20
+
+# Default time budget (seconds) for the best-effort "bounded" strategy
+TIME_BUDGET = 0.25
+
+
+def settle_cents(balances, strategy="auto", time_budget=TIME_BUDGET):
+    # Turn {person: cents} into a list of (from, to, cents) transfers.
+    # Positive balances are owed money, negative balances owe money.
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown settlement strategy {strategy!r}, expected one of {', '.join(STRATEGIES)}")
+
+    people = [person for person, balance in balances.items() if balance]
+    values = [balances[person] for person in people]
+    _check_zero_sum(values)
+
+    if strategy == "greedy":
+        groups = [list(range(len(values)))]
+    elif strategy == "exact":
+        if len(values) > EXACT_LIMIT:
+            raise ValueError(f"The exact strategy supports at most {EXACT_LIMIT} unsettled people, got {len(values)}")
+        groups = _exact_groups(values)
+    elif strategy == "bounded" or len(values) > EXACT_LIMIT:
+        groups = _bounded_groups(values, time.perf_counter() + time_budget)
+    else:
+        groups = _exact_groups(values)
+
+    transfers = []
+    for group in groups:
+        for debtor, creditor, amount in _greedy(group, values):
+            transfers.append((people[debtor], people[creditor], amount))
+    return transfers
+
+
+def _check_zero_sum(values):
+    # Balances in cents always add up to zero (converted ones too, see
+    # money.convert_cents()); anything else is a bug upstream, and settling
+    # it would have someone pay or receive money nobody owes
+    residual = sum(values)
+    if residual:
+        raise ValueError(f"Balances must add up to zero to be settled, they are {residual} cents off")
+
+
+def _greedy(group, values):
+    # Heap-based greedy: repeatedly match the largest debtor with the largest
+    # creditor. O(n log n) and at most n - 1 transfers for n people.
+    creditors = [(-values[i], i) for i in group if values[i] > 0]
+    debtors = [(values[i], i) for i in group if values[i] < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor, creditor, amount))
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, creditor))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debtor))
+    return transfers
+
+
+def _pair_opposites(indices, values):
+    # A +x and a -x can always settle with one transfer; peel those off first
+    waiting = {}
+    pairs = []
+    rest = []
+    for i in indices:
+        partner = waiting.get(-values[i])
+        if partner:
+            pairs.append([partner.pop(), i])
+        else:
+            waiting.setdefault(values[i], []).append(i)
+    for leftover in waiting.values():
+        rest.extend(leftover)
+    return pairs, rest
+
+
+def _exact_groups(values, indices=None):
+    # Minimum number of transfers is n - (max number of disjoint zero-sum
+    # groups). Find that partition with a DP over subsets, one popcount layer
+    # at a time so every step is a numpy operation.
+    if indices is None:
+        indices = list(range(len(values)))
+    pairs, rest = _pair_opposites(indices, values)
+    n = len(rest)
+    if n == 0:
+        return pairs
+
+    sums = np.zeros(1, dtype=np.int64)
+    popcount = np.zeros(1, dtype=np.int8)
+    for i in rest:
+        sums = np.concatenate((sums, sums + values[i]))
+        popcount = np.concatenate((popcount, popcount + 1))
+    zero = (sums == 0).astype(np.int8)
+
+    # best[mask] = most zero-sum subsets on any chain from {} up to mask
+    best = np.zeros(1 << n, dtype=np.int8)
+    masks = np.arange(1 << n, dtype=np.int64)
+    by_popcount = np.argsort(popcount, kind="stable")
+    bounds = np.searchsorted(popcount[by_popcount], np.arange(n + 2))
+    for k in range(1, n + 1):
+        layer = masks[by_popcount[bounds[k]:bounds[k + 1]]]
+        layer_best = np.zeros(len(layer), dtype=np.int8)
+        for bit in range(n):
+            has_bit = (layer >> bit) & 1 == 1
+            layer_best[has_bit] = np.maximum(layer_best[has_bit], best[layer[has_bit] ^ (1 << bit)])
+        best[layer] = layer_best + zero[layer]
+
+    # Walk back down the best chain; consecutive zero-sum masks on it bound
+    # the groups
+    groups = []
+    mask = (1 << n) - 1
+    group_start = mask
+    while mask:
+        target = best[mask] - zero[mask]
+        for bit in range(n):
+            if mask >> bit & 1 and best[mask ^ (1 << bit)] == target:
+                mask ^= 1 << bit
+                break
+        if zero[mask]:
+            removed = group_start ^ mask
+            groups.append([rest[bit] for bit in range(n) if removed >> bit & 1])
+            group_start = mask
+    return pairs + groups
+
+
+def _bounded_groups(values, deadline):
+    # Best effort for large groups: peel off opposite pairs, then zero-sum
+    # triples until the deadline, then solve what is left exactly if it is
+    # small enough or greedily otherwise
+    groups, rest = _pair_opposites(range(len(values)), values)
+
+    index = {}
+    for i in rest:
+        index.setdefault(values[i], set()).add(i)
+    used = set()
+    for a_pos, a in enumerate(rest):
+        if time.perf_counter() > deadline:
+            break
+        if a in used:
+            continue
+        for b in rest[a_pos + 1:]:
+            if b in used:
+                continue
+            for c in index.get(-(values[a] + values[b]), ()):
+                if c != a and c != b and c not in used:
+                    groups.append([a, b, c])
+                    used.update((a, b, c))
+                    break
+            if a in used:
+                break
+    rest = [i for i in rest if i not in used]
+
+    if len(rest) <= EXACT_LIMIT and time.perf_counter() < deadline:
+        groups.extend(_exact_groups(values, rest))
+    elif rest:
+        groups.append(rest)
+    return groups
@@ -0,0 +1,131 @@
+import asyncio
+import json
+
+import pytest
+
+from api_server import ExpenseApi
+from ledger_registry import LedgerRegistry
+
+# The HTTP API: requests against per-group ledgers, client errors answered
+# with 400s, batches, and pipelined requests on one kept-alive connection.
+
+
+@pytest.fixture
+def api():
+    return ExpenseApi(LedgerRegistry(""))
+
+
+def test_requests_work_on_the_group_ledger(api):
+    status, payload = api.dispatch("POST", "/commands", {"command": "alice paid 30 for dinner split among bob, carol"})
+    assert status == 200 and payload["kind"] == "expense"
+    assert api.dispatch("POST", "/expenses", [{"paid_by": "bob", "amount": 10, "split_among": "alice"}]) == (
+        200, {"added": 1},
+    )
+    assert api.dispatch("POST", "/expenses", {"paid_by": "carol", "amount": "4.5", "split_among": "carol"}) == (
+        200, {"added": 1},
+    )
+    assert api.dispatch("GET", "/balances", None) == (
+        200, {"currency": "USD", "balances": {"alice": 10.0, "bob": 0.0, "carol": -10.0}},
+    )
+    assert api.dispatch("GET", "/settlements?strategy=exact", None) == (
+        200, {"currency": "USD", "transactions": [{"from": "carol", "to": "alice", "amount": 10.0}]},
+    )
+    # Another group is another ledger
+    assert api.dispatch("GET", "/balances?group=trip", None) == (200, {"currency": "USD", "balances": {}})
+    assert api.splitter("trip").store is not api.splitter("default").store
+
+
+@pytest.mark.parametrize("method, target, body, status, error", [
+    ("POST", "/commands", {"text": "hi"}, 400, "expected"),
+    ("POST", "/expenses", {"paid_by": "bob"}, 400, "missing paid_by or amount"),
+    ("POST", "/expenses", {"paid_by": "bob", "amount": [1]}, 400, "wrong type"),
+    ("POST", "/expenses", [{"paid_by": "bob", "amount": -1}], 400, "Nothing was imported"),
+    ("POST", "/expenses", "bob paid 5", 400, "not an expense object"),
+    ("POST", "/batch", [], 400, "expected"),
+    ("GET", "/settlements?strategy=nope", None, 400, "Unknown strategy"),
+    ("GET", "/metrics?format=xml", None, 400, "Unknown metrics format"),
+    ("GET", "/balances?group=../x", None, 400, "Group ids"),
+    ("GET", "/nope", None, 404, "no such endpoint"),
+    ("POST", "/balances", None, 405, "only accepts GET"),
+])
+def test_bad_requests_are_answered_with_an_error(api, method, target, body, status, error):
+    answer, payload = api.dispatch(method, target, body)
+    assert answer == status
+    assert error in payload["error"]
+    # Nothing was added on the way
+    assert len(api.splitter("default").store) == 0
+
+
+def test_batches_run_in_order_past_failures(api):
+    status, payload = api.dispatch("POST", "/batch", {"requests": [
+        {"method": "POST", "path": "/commands", "body": {"command": "alice paid 12 for lunch split among bob"}},
+        {"method": "POST", "path": "/batch", "body": {"requests": []}},
+        5,
+        {"method": "POST", "path": "/expenses", "body": {"paid_by": "bob"}},
+        {"path": "/balances?group=trip"},
+        {"method": "get", "path": "/balances"},
+    ]})
+    assert status == 200
+    assert [response["status"] for response in payload["responses"]] == [200, 400, 400, 400, 200, 200]
+    assert payload["responses"][1]["body"] == {"error": "batches cannot be nested"}
+    assert payload["responses"][5]["body"]["balances"] == {"alice": 6.0, "bob": -6.0}
+
+
+def exchange(api, raw):
+    # Everything the server answers to raw bytes sent on one connection
+    async def run():
+        server = await asyncio.start_server(api.handle_connection, "127.0.0.1", 0)
+        async with server:
+            reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+            writer.write(raw)
+            await writer.drain()
+            data = await asyncio.wait_for(reader.read(), 10)
+            writer.close()
+            return data
+    return asyncio.run(run())
+
+
+def request(method, target, body=None, close=False):
+    data = b"" if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode())
+    connection = "Connection: close\r\n" if close else ""
+    return f"{method} {target} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(data)}\r\n{connection}\r\n".encode() + data
+
+
+def responses(data):
+    # (status, body) of each response in the stream
+    answers = []
+    while data:
+        head, _, data = data.partition(b"\r\n\r\n")
+        lines = head.decode().split("\r\n")
+        headers = dict(line.lower().split(": ", 1) for line in lines[1:])
+        length = int(headers["content-length"])
+        body, data = data[:length], data[length:]
+        answers.append((int(lines[0].split(" ")[1]), json.loads(body)))
+    return answers
+
+
+def test_pipelined_requests_on_one_connection(api):
+    data = exchange(api, b"".join([
+        request("POST", "/commands", {"command": "alice paid 10 for tea split among bob"}),
+        request("POST", "/expenses", b"{not json"),
+        request("GET", "/balances"),
+        request("GET", "/balances?group=trip", close=True),
+        # Never read, the connection is closed
+        request("GET", "/balances"),
+    ]))
+    answers = responses(data)
+    assert [status for status, _ in answers] == [200, 400, 200, 200]
+    assert "not valid JSON" in answers[1][1]["error"]
+    assert answers[2][1]["balances"] == {"alice": 5.0, "bob": -5.0}
+    assert answers[3][1]["balances"] == {}
+
+
+@pytest.mark.parametrize("raw, error", [
+    (b"GARBAGE\r\n\r\n", "malformed request line"),
+    (b"GET /balances HTTP/1.1\r\nContent-Length: -3\r\n\r\n", "bad Content-Length"),
+    (b"POST /expenses HTTP/1.1\r\nContent-Length: 999999999\r\n\r\n", "limited to"),
+])
+def test_broken_requests_close_the_connection(api, raw, error):
+    (status, payload), = responses(exchange(api, raw + request("GET", "/balances")))
+    assert status in (400, 413)
+    assert error in payload["error"]
@@ -0,0 +1,57 @@
+import random
+
+import numpy as np
+import pytest
+
+import batch
+from expense_store import ExpenseStore
+from ledger_registry import LedgerRegistry
+from main import ExpenseSplitter
+
+PEOPLE = [f"person{i}" for i in range(30)]
+
+
+def random_store(seed, rows=3000):
+    rng = random.Random(seed)
+    store = ExpenseStore()
+    store.add_many(
+        (
+            rng.choice(PEOPLE), rng.randint(1, 50000) / 100, "x", rng.sample(PEOPLE, rng.randint(1, 8)),
+            "2026-01-01", None, rng.choice(["USD", "EUR"]),
+        )
+        for _ in range(rows)
+    )
+    for row in rng.sample(range(rows), rows // 10):
+        store.delete(row)
+    return store
+
+
+@pytest.fixture(scope="module")
+def pool():
+    with batch.worker_pool(4) as pool:
+        yield pool
+
+
+@pytest.mark.parametrize("workers", [1, 2, 4])
+def test_sharded_replay_matches_the_serial_one(pool, workers, monkeypatch):
+    # Shard even small ledgers, so the shared memory path is what runs
+    monkeypatch.setattr(batch, "MIN_PARALLEL_ROWS", 0)
+    store = random_store(workers)
+    replayed = batch.replay_balances(store, pool, workers)
+    assert np.array_equal(replayed, store.replay_balances())
+    assert np.array_equal(replayed, store.subtotals())
+
+
+def test_statements_skip_unreadable_groups(pool, tmp_path):
+    path = str(tmp_path / "ledger.sqlite")
+    registry = LedgerRegistry(path)
+    for group in ("default", "trip"):
+        ExpenseSplitter.for_group(registry.group(group)).add_expense("alice", 10, "x", ["bob"], "2026-01-01")
+        registry.group(group).database.close()
+    (tmp_path / "ledger.junk.sqlite").write_text("not a database" * 100)
+
+    results = list(batch.statements(LedgerRegistry(path).saved_groups(), pool, 4))
+    assert [result["group"] for result in results] == ["default", "junk", "trip"]
+    assert "error" in results[1]
+    for result in results[0], results[2]:
+        assert result["balances"] == {"alice": 10.0, "bob": -10.0} and result["drift_cents"] == 0
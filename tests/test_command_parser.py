@@ -0,0 +1,79 @@
+from datetime import date
+
+import pytest
+
+from command_parser import (
+    BALANCE, DELETE, EDIT, EXPENSE, OWES, PEOPLE, RATE, RECURRING, STATEMENT, UNKNOWN, ParsedCommand, parse,
+    period_bounds,
+)
+from money import PERCENT, SHARES
+
+# Chat commands and what they parse to: the keyword fast path, the expense
+# patterns, filters, and names that happen to be keywords.
+
+COMMANDS = [
+    ("John paid 50 for dinner split among Mary, Bob", dict(
+        kind=EXPENSE, paid_by="john", amount=50.0, description="dinner", split_among=("mary", "bob", "john"),
+    )),
+    ("alice paid €40 for taxi on 2026-03-01", dict(
+        kind=EXPENSE, paid_by="alice", amount=40.0, description="taxi", date="2026-03-01", currency="EUR",
+    )),
+    ("alice paid 40 eur for taxi split among bob 60%, carol 40%", dict(
+        kind=EXPENSE, paid_by="alice", amount=40.0, description="taxi", split_among=("bob", "carol"),
+        split=((PERCENT, 60.0), (PERCENT, 40.0)), currency="EUR",
+    )),
+    ("alice paid 30 for cab split among alice 2 shares, bob", dict(
+        kind=EXPENSE, paid_by="alice", amount=30.0, description="cab", split_among=("alice", "bob"),
+        split=((SHARES, 2.0), None),
+    )),
+    # Keywords as names: someone who paid is an expense, not a command
+    ("add paid 10 for lunch split among bob", dict(
+        kind=EXPENSE, paid_by="add", amount=10.0, description="lunch", split_among=("bob", "add"),
+    )),
+    ("edit paid 5 for tea", dict(kind=EXPENSE, paid_by="edit", amount=5.0, description="tea")),
+    ("edit 3 paid by bob amount 40 eur", dict(kind=EDIT, number=3, paid_by="bob", amount=40.0, currency="EUR")),
+    ("edit 3", dict(kind=UNKNOWN)),
+    ("delete expense #12", dict(kind=DELETE, number=12)),
+    ("delete 0", dict(kind=UNKNOWN)),
+    ("balance since 2026-01-01 exact", dict(kind=BALANCE, start="2026-01-01", strategy="exact")),
+    ("balance for march in eur", dict(kind=BALANCE, month=3, currency="EUR")),
+    ("balance until 2026-02-28", dict(kind=BALANCE, end="2026-03-01")),
+    ("balance since 2026-02-30", dict(kind=UNKNOWN)),
+    ("who owes", dict(kind=BALANCE)),
+    ("statement for bob for 2026-02", dict(kind=STATEMENT, person="bob", start="2026-02-01", end="2026-03-01")),
+    ("What does Bob owe Alice?", dict(kind=OWES, person="bob", other="alice")),
+    ("rate 1 eur = 1.08 usd on 2026-03-01", dict(
+        kind=RATE, amount=1.08, currency="EUR", quote="USD", date="2026-03-01",
+    )),
+    ("rates", dict(kind=RATE)),
+    ("alias bobby = bob", dict(kind=PEOPLE, person="bob", other="bobby")),
+    ("add person rob", dict(kind=PEOPLE, person="rob")),
+    ("alice pays 1200 for rent monthly split among alice, bob from 2026-01-01 until 2026-12-31", dict(
+        kind=RECURRING, paid_by="alice", amount=1200.0, description="rent", split_among=("alice", "bob"),
+        date="2026-01-01", end="2027-01-01", frequency=(1, "month"),
+    )),
+    ("bob pays 15 for gym every 2 weeks", dict(
+        kind=RECURRING, paid_by="bob", amount=15.0, description="gym", frequency=(2, "week"),
+    )),
+    ("stop recurring r2 after 2026-12-31", dict(kind=RECURRING, number=2, end="2027-01-01")),
+    ("hello there", dict(kind=UNKNOWN)),
+    ("   ", dict(kind=UNKNOWN)),
+]
+
+
+@pytest.mark.parametrize("command, fields", COMMANDS)
+def test_parse(command, fields):
+    assert parse(command) == ParsedCommand(**fields)
+
+
+@pytest.mark.parametrize("command, fields", COMMANDS)
+def test_cached_and_uncached_parses_agree(command, fields):
+    # Normalized once, so spacing and case share a cache entry
+    assert parse(f"  {command.upper()} ", cached=False) == parse(command) == parse(command)
+
+
+def test_month_without_a_year_is_the_latest_one():
+    today = date(2026, 3, 15)
+    assert period_bounds(parse("balance for march"), today) == ("2026-03-01", "2026-04-01")
+    assert period_bounds(parse("balance for december"), today) == ("2025-12-01", "2026-01-01")
+    assert period_bounds(parse("balance for dec 2026"), today) == ("2026-12-01", "2027-01-01")
@@ -0,0 +1,113 @@
+import random
+
+import numpy as np
+
+import event_log
+from event_log import ADD, DELETE, EDIT
+from expense_store import ExpenseStore
+from ledger_db import LedgerDatabase
+from main import ExpenseSplitter
+
+# Undo and redo through the event log, balances at any point of the log, and
+# edits and deletes written through to a ledger database.
+
+PEOPLE = ["alice", "bob", "carol", "dave"]
+
+
+def random_store(rng, count):
+    store = ExpenseStore()
+    for i in range(count):
+        payer = rng.choice(PEOPLE)
+        store.add(payer, rng.randint(1, 5000) / 100, f"expense {i}", rng.sample(PEOPLE, rng.randint(1, 4)), "2026-01-01")
+    return store
+
+
+def test_undo_then_redo_restores_balances_and_moves_the_version_on():
+    store = ExpenseStore()
+    store.add("alice", 30, "dinner", ["bob", "carol"], "2026-01-01")
+    before = store.subtotals().copy()
+    store.add("bob", 12, "taxi", ["alice"], "2026-01-02")
+    store.edit(0, amount=45)
+    store.delete(1)
+    after, version = store.subtotals().copy(), store.version
+
+    kinds = [store.undo().kind for _ in range(3)]
+    assert kinds == [DELETE, EDIT, ADD]
+    assert np.array_equal(store.subtotals(), before)
+    assert store.version > version
+    assert store.undo() is not None and store.undo() is None
+
+    for _ in range(4):
+        store.redo()
+    assert store.redo() is None
+    assert np.array_equal(store.subtotals(), after)
+    assert store.version > version + 4
+    assert store.expense(0)["amount"] == 45
+    assert store.column("deleted").tolist() == [False, True]
+
+
+def test_new_action_clears_the_redo_stack():
+    store = ExpenseStore()
+    store.add("alice", 30, "dinner", ["bob"], "2026-01-01")
+    store.add("bob", 10, "taxi", ["alice"], "2026-01-02")
+    store.undo()
+    assert store.redo_stack
+    store.add("carol", 5, "coffee", ["alice"], "2026-01-03")
+    assert not store.redo_stack
+    assert store.redo() is None
+    # The undone expense stays undone
+    assert store.column("deleted").tolist() == [False, True, False]
+
+
+def test_balances_at_every_event_match_a_replay(monkeypatch):
+    # Snapshots every few deltas, so most points are rebuilt from one plus
+    # the deltas logged since
+    monkeypatch.setattr(event_log, "MIN_SNAPSHOT_DELTAS", 8)
+    rng = random.Random(15)
+    store = random_store(rng, 20)
+    seen = {len(store.log): store.replay_balances()}
+    for _ in range(60):
+        action = rng.random()
+        live = np.flatnonzero(~store.column("deleted")).tolist()
+        if action < 0.3 and live:
+            store.delete(rng.choice(live))
+        elif action < 0.6 and live:
+            store.edit(rng.choice(live), amount=rng.randint(1, 5000) / 100, paid_by=rng.choice(PEOPLE))
+        elif action < 0.8:
+            store.undo()
+        else:
+            store.redo()
+        assert np.array_equal(store.subtotals(), store.replay_balances())
+        seen[len(store.log)] = store.replay_balances()
+    for events, balances in seen.items():
+        assert np.array_equal(store.balances_at(events), balances)
+
+
+def open_ledger(path):
+    return ExpenseSplitter(ExpenseStore(), LedgerDatabase(str(path)))
+
+
+def test_edits_deletes_and_undos_survive_a_reopen(tmp_path):
+    path = tmp_path / "ledger.sqlite"
+    splitter = open_ledger(path)
+    splitter.add_expense("alice", 30, "dinner", ["bob", "carol"], "2026-01-01")
+    splitter.add_expense("bob", 12, "taxi", ["alice"], "2026-01-02")
+    splitter.add_expense("carol", 9, "coffee", ["alice", "bob"], "2026-01-03")
+    splitter.edit_expense(1, paid_by="carol", amount=40, description="dinner out")
+    splitter.delete_expense(2)
+    splitter.delete_expense(3)
+    splitter.undo()
+    balances = splitter.balances_cents()
+    splitter.database.close()
+
+    reopened = open_ledger(path)
+    assert reopened.balances_cents() == balances
+    reopened.load_history()
+    store = reopened.store
+    assert store.column("deleted").tolist() == [False, True, False]
+    assert store.expense(0)["paid_by"] == "carol"
+    assert store.expense(0)["amount"] == 40
+    assert store.expense(0)["description"] == "dinner out"
+    assert np.array_equal(store.subtotals(), store.replay_balances())
+    # A fresh log: nothing from the earlier session to undo
+    assert reopened.undo() is None
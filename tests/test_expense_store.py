@@ -0,0 +1,76 @@
+import random
+
+import numpy as np
+import pytest
+
+from expense_store import ExpenseStore
+
+# The columnar store: rows and participants read back as entered while the
+# columns grow, deleted rows drop out, and bad expenses are refused.
+
+PEOPLE = ["alice", "bob", "carol", "dave", "erin"]
+
+
+def random_expenses(rng, count):
+    return [
+        {
+            "date": str(np.datetime64("2025-01-01") + rng.randrange(500)),
+            "paid_by": rng.choice(PEOPLE),
+            "amount": rng.randint(1, 10 ** 6) / 100,
+            "currency": rng.choice(["USD", "EUR"]),
+            "description": f"expense {i}",
+            "split_among": rng.sample(PEOPLE, rng.randint(1, 5)),
+        }
+        for i in range(count)
+    ]
+
+
+def add_all(store, expenses):
+    for expense in expenses:
+        store.add(
+            expense["paid_by"], expense["amount"], expense["description"], expense["split_among"], expense["date"],
+            currency=expense["currency"],
+        )
+
+
+def test_rows_read_back_as_entered_while_the_columns_grow():
+    rng = random.Random(2)
+    expenses = random_expenses(rng, 500)
+    store = ExpenseStore(capacity=2)
+    add_all(store, expenses)
+    assert len(store) == store.count == 500
+    assert list(store) == expenses
+    assert store.sizes().tolist() == [len(expense["split_among"]) for expense in expenses]
+    shares = [store.shares[store.offsets[i]:store.offsets[i + 1]].sum() for i in range(500)]
+    assert shares == store.column("amount").tolist()
+    assert np.array_equal(store.subtotals(), store.replay_balances())
+
+
+def test_deleted_rows_drop_out():
+    rng = random.Random(3)
+    expenses = random_expenses(rng, 50)
+    store = ExpenseStore()
+    add_all(store, expenses)
+    for row in (0, 7, 49):
+        store.delete(row)
+    assert len(store) == 47
+    assert list(store) == [expense for i, expense in enumerate(expenses) if i not in (0, 7, 49)]
+    assert np.array_equal(store.subtotals(), store.replay_balances())
+    with pytest.raises(ValueError, match="has been deleted"):
+        store.delete(7)
+    with pytest.raises(ValueError, match="no expense 51"):
+        store.delete(50)
+
+
+@pytest.mark.parametrize("amount, split_among, date, message", [
+    (0, ["bob"], "2026-01-01", "at least 0.01"),
+    (-5, ["bob"], "2026-01-01", "at least 0.01"),
+    ("ten", ["bob"], "2026-01-01", "must be a number"),
+    (10, [], "2026-01-01", "nobody to split"),
+    (10, ["bob"], "2026-13-01", "out of range"),
+])
+def test_bad_expenses_are_refused(amount, split_among, date, message):
+    store = ExpenseStore()
+    with pytest.raises(ValueError, match=message):
+        store.add("alice", amount, "lunch", split_among, date)
+    assert len(store) == 0 and store.names == []
@@ -0,0 +1,108 @@
+import io
+import json
+import random
+
+import numpy as np
+import pytest
+
+import exporter
+from expense_store import ExpenseStore
+from importer import iter_rows
+from main import ExpenseSplitter
+from money import PERCENT, SHARES
+
+# Exports: expenses streamed in chunks read back as the same ledger, in every
+# format, and the balance and settlement tables match the splitter's.
+
+PEOPLE = ["alice", "bob", "carol", "dave"]
+
+
+def random_ledger(rng, count):
+    splitter = ExpenseSplitter(ExpenseStore())
+    for i in range(count):
+        split_among = rng.sample(PEOPLE, rng.randint(1, 4))
+        split = None
+        if rng.random() < 0.3:
+            split = [(SHARES, float(rng.randint(1, 3))) for _ in split_among]
+        elif rng.random() < 0.2:
+            split = [(PERCENT, 100.0)] + [None] * (len(split_among) - 1)
+        splitter.add_expense(
+            rng.choice(PEOPLE), rng.randint(1, 10 ** 5) / 100, f"expense, {i}", split_among,
+            str(np.datetime64("2026-01-01") + rng.randrange(90)), split, rng.choice([None, "EUR"]),
+        )
+    for number in rng.sample(range(1, count + 1), count // 10):
+        splitter.delete_expense(number)
+    return splitter
+
+
+def shares(store):
+    # Every live expense with each participant's cents
+    return [
+        (expense, store.shares[store.offsets[row]:store.offsets[row + 1]].tolist())
+        for row, expense in ((row, store.expense(row)) for row in range(store.count) if not store.deleted[row])
+    ]
+
+
+def balances(store):
+    # Cents per person and currency; people may be numbered differently
+    subtotals = store.subtotals()
+    return {(name, code): int(subtotals[pid, cid]) for pid, name in enumerate(store.names)
+            for cid, code in enumerate(store.currencies)}
+
+
+def test_chunks_hold_every_live_expense():
+    splitter = random_ledger(random.Random(1), 200)
+    store = splitter.store
+    chunks = list(exporter.expense_chunks(store, chunk_size=16))
+    assert len(chunks) == 13
+    rows = [dict(zip(chunk, row)) for chunk in chunks for row in zip(*chunk.values())]
+    assert [row["description"] for row in rows] == [expense["description"] for expense in store]
+    assert list(exporter.expense_chunks(ExpenseStore())) == [
+        {"paid_by": [], "amount": [], "description": [], "split_among": [], "date": [], "currency": []},
+    ]
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_exports_import_as_the_same_ledger(tmp_path, fmt):
+    splitter = random_ledger(random.Random(2), 300)
+    path = tmp_path / f"ledger.{fmt}"
+    with open(path, "wb") as file:
+        splitter.export("expenses", exporter.format_for(str(path)), file)
+    imported = ExpenseSplitter(ExpenseStore())
+    imported.add_expenses_bulk(iter_rows(str(path)))
+    assert shares(imported.store) == shares(splitter.store)
+    assert balances(imported.store) == balances(splitter.store)
+
+
+def test_parquet_export_matches_the_chunks():
+    pq = pytest.importorskip("pyarrow.parquet")
+    splitter = random_ledger(random.Random(3), 100)
+    buffer = io.BytesIO()
+    splitter.export("expenses", "parquet", buffer)
+    table = pq.read_table(io.BytesIO(buffer.getvalue()))
+    (chunk,) = exporter.expense_chunks(splitter.store)
+    assert table.to_pydict() == chunk
+
+
+def test_balance_and_settlement_tables():
+    splitter = random_ledger(random.Random(4), 50)
+    splitter.set_rate("EUR", 1.25)
+    for table, expected in (
+        ("balances", [{"person": name, "balance": cents / 100, "currency": "USD"}
+                      for name, cents in splitter.balances_cents("USD").items()]),
+        ("settlements", [dict(transaction, currency="USD") for transaction in splitter.get_transactions(currency="USD")]),
+    ):
+        buffer = io.BytesIO()
+        splitter.export(table, "jsonl", buffer, "USD")
+        assert [json.loads(line) for line in buffer.getvalue().decode().splitlines()] == expected
+    with pytest.raises(ValueError, match="Unknown table"):
+        splitter.export("people", "csv", io.BytesIO())
+    with pytest.raises(ValueError, match="Unknown export format"):
+        splitter.export("balances", "xlsx", io.BytesIO())
+
+
+def test_format_from_the_file_name():
+    assert exporter.format_for("trip.NDJSON") == "jsonl"
+    assert exporter.format_for("out/trip.parquet") == "parquet"
+    with pytest.raises(ValueError, match="export format"):
+        exporter.format_for("trip.xlsx")
@@ -0,0 +1,133 @@
+import csv
+import json
+import random
+
+import numpy as np
+import pytest
+
+import expense_store
+from expense_store import ExpenseStore
+from importer import iter_rows, record_rows
+from main import ExpenseSplitter
+from money import PERCENT, SHARES
+
+# Bulk imports: add_many() against adding the same rows one at a time, the
+# three file formats, and rows that are refused.
+
+PEOPLE = ["alice", "bob", "carol", "dave"]
+
+
+def random_rows(rng, count):
+    rows = []
+    for i in range(count):
+        split_among = rng.sample(PEOPLE, rng.randint(1, 4))
+        split = None
+        if rng.random() < 0.3:
+            split = [(SHARES, float(rng.randint(1, 3))) for _ in split_among]
+        elif rng.random() < 0.2 and len(split_among) == 2:
+            split = [(PERCENT, 25.0), None]
+        rows.append((
+            rng.choice(PEOPLE), rng.randint(1, 10 ** 5) / 100, f"expense {i}", split_among,
+            str(np.datetime64("2026-01-01") + rng.randrange(90)), split, rng.choice([None, "EUR"]),
+        ))
+    return rows
+
+
+def balances(store):
+    subtotals = store.subtotals()
+    return {(name, code): int(subtotals[pid, cid]) for pid, name in enumerate(store.names)
+            for cid, code in enumerate(store.currencies) if subtotals[pid, cid]}
+
+
+def test_bulk_import_matches_adding_one_by_one():
+    rng = random.Random(5)
+    rows = random_rows(rng, 300)
+    one_by_one = ExpenseStore()
+    one_by_one.add("erin", 10, "first", ["alice"], "2026-01-01")
+    for row in rows:
+        one_by_one.add(*row)
+    bulk = ExpenseStore()
+    bulk.add("erin", 10, "first", ["alice"], "2026-01-01")
+    # Small chunks, so rows are packed in several of them
+    assert bulk.add_many(rows, chunk_size=7) == 300
+    assert list(bulk) == list(one_by_one)
+    assert balances(bulk) == balances(one_by_one)
+    assert np.array_equal(bulk.subtotals(), bulk.replay_balances())
+
+    # The whole import is one step to undo
+    bulk.undo()
+    assert len(bulk) == 1
+
+
+def test_bad_rows_are_all_reported_and_nothing_is_imported():
+    store = ExpenseStore()
+    store.add("alice", 10, "lunch", ["bob"], "2026-01-01")
+    rows = [
+        ("carol", 5, "ok", ["alice"], "2026-01-02"),
+        ("carol", -5, "refund", ["alice"], "2026-01-02"),
+        ValueError("line 3 is not an expense: 'hello'"),
+        ("dave", 5, "tea", [], "2026-01-02"),
+        ("dave", 5, "tea", ["alice"], "2026-02-30"),
+    ]
+    with pytest.raises(ValueError) as raised:
+        store.add_many(rows)
+    lines = str(raised.value).splitlines()
+    assert lines[0] == "Nothing was imported:"
+    assert [line.split(":")[0] for line in lines[1:]] == ["row 2", "line 3 is not an expense", "row 4", "row 5"]
+    assert len(store) == 1
+    assert store.names == ["alice", "bob"]
+
+
+def test_reporting_stops_after_a_few_errors(monkeypatch):
+    monkeypatch.setattr(expense_store, "MAX_REPORTED_ERRORS", 3)
+    rows = ({"paid_by": "alice", "amount": 0} for _ in range(1000))
+    with pytest.raises(ValueError) as raised:
+        ExpenseStore().add_many(record_rows(rows))
+    assert len(str(raised.value).splitlines()) == 4
+
+
+def test_file_formats_import_the_same_ledger(tmp_path):
+    records = [
+        {"paid_by": "Alice", "amount": "12.50", "description": "lunch", "split_among": "alice; bob 2 shares",
+         "date": "2026-01-03", "currency": "eur"},
+        {"paid_by": "bob", "amount": "30", "description": "taxi", "split_among": "carol 60%; alice 40%",
+         "date": "2026-01-04", "currency": ""},
+        {"paid_by": "carol", "amount": "9.99", "description": "coffee", "split_among": "",
+         "date": "2026-01-05", "currency": ""},
+    ]
+    csv_path = tmp_path / "trip.csv"
+    with open(csv_path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=list(records[0]))
+        writer.writeheader()
+        writer.writerows(records)
+    jsonl_path = tmp_path / "trip.jsonl"
+    jsonl_path.write_text("\n".join(json.dumps(record) for record in records) + "\n\n", encoding="utf-8")
+    txt_path = tmp_path / "trip.txt"
+    txt_path.write_text(
+        "# a trip\n"
+        "alice paid 12.50 eur for lunch split among alice, bob 2 shares on 2026-01-03\n"
+        "bob paid 30 for taxi split among carol 60%, alice 40% on 2026-01-04\n"
+        "carol paid 9.99 for coffee on 2026-01-05\n",
+        encoding="utf-8",
+    )
+
+    ledgers = []
+    for path in (csv_path, jsonl_path, txt_path):
+        splitter = ExpenseSplitter(ExpenseStore())
+        assert splitter.add_expenses_bulk(iter_rows(str(path))) == "Imported 3 expenses."
+        ledgers.append(list(splitter.store))
+    assert ledgers[0] == ledgers[1] == ledgers[2]
+    assert [expense["split_among"] for expense in ledgers[0]] == [
+        ["alice", "bob"], ["carol", "alice"], ["alice", "bob", "carol"],
+    ]
+    assert ledgers[0][0]["currency"] == "EUR"
+
+
+def test_unreadable_lines_are_reported(tmp_path):
+    path = tmp_path / "trip.jsonl"
+    path.write_text('{"paid_by": "alice", "amount": 5}\n{not json\n[1, 2]\n', encoding="utf-8")
+    with pytest.raises(ValueError) as raised:
+        ExpenseStore().add_many(iter_rows(str(path)))
+    message = str(raised.value)
+    assert "line 2 is not valid JSON" in message
+    assert "missing paid_by or amount in [1, 2]" in message
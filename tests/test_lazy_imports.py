@@ -0,0 +1,62 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import ui_html
+from lazy import LazyModule
+
+# Startup: the command line and the API server load neither streamlit nor
+# pandas, pandas comes in with the first table, and the page's static HTML is
+# built once per process.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("streamlit", "pandas")
+
+
+def loaded_after(code):
+    # Which heavy modules a fresh interpreter has loaded after running code
+    script = f"import sys\n{code}\nimport json\nprint(json.dumps([m for m in {HEAVY!r} if m in sys.modules]))"
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", ["main", "api_server", "batch"])
+def test_entry_points_load_no_heavy_modules(module):
+    assert loaded_after(f"import {module}") == []
+
+
+def test_pandas_is_loaded_with_the_first_table():
+    setup = (
+        "from main import ExpenseSplitter\nfrom expense_store import ExpenseStore\n"
+        "splitter = ExpenseSplitter(ExpenseStore())\n"
+        "splitter.add_expense('alice', 10, 'tea', ['bob'], '2026-01-01')\nsplitter.calculate_balances()\n"
+    )
+    assert loaded_after(setup) == []
+    assert loaded_after(setup + "splitter.balance_table()") == ["pandas"]
+
+
+def test_lazy_module_imports_on_first_use():
+    module = LazyModule("colorsys")
+    assert repr(module) == "<lazy module 'colorsys' (not loaded yet)>"
+    assert module.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert repr(module) == "<lazy module 'colorsys' (loaded)>"
+    with pytest.raises(ModuleNotFoundError):
+        LazyModule("no_such_module_here").anything
+
+
+def test_page_assets_are_built_once():
+    assert ui_html.style() is ui_html.style()
+    assert ui_html.examples() is ui_html.examples()
+    assert ui_html.card_header("💵", "Current Balances") is ui_html.card_header("💵", "Current Balances")
+    style = ui_html.style()
+    assert "/*" not in style and "\n" not in style
+    assert all(command in ui_html.examples() for command in ui_html.EXAMPLE_COMMANDS)
+
+
+def test_transaction_cards_escape_names():
+    cards = ui_html.transactions([{"from": "<b>eve</b>", "to": "bob", "amount": 12.5}], "USD")
+    assert "&lt;b&gt;eve&lt;/b&gt;" in cards and "<b>eve</b>" not in cards
+    assert cards.count("transaction-card") == 1
@@ -0,0 +1,172 @@
+import sqlite3
+
+import numpy as np
+import pytest
+
+from expense_store import ExpenseStore
+from ledger_db import SCHEMA_VERSION, LedgerDatabase
+from main import ExpenseSplitter
+
+# Ledger databases in pytest's temporary directories: new files, upgrades
+# from older schema versions and what a reopened ledger reads back.
+
+# Version 1 kept money as floats and had no version number
+V1_SCHEMA = """
+CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE expenses (
+    id INTEGER PRIMARY KEY, paid_by INTEGER NOT NULL, amount REAL NOT NULL, description TEXT NOT NULL,
+    date INTEGER NOT NULL
+);
+CREATE TABLE participants (
+    expense_id INTEGER NOT NULL, position INTEGER NOT NULL, person_id INTEGER NOT NULL,
+    PRIMARY KEY (expense_id, position)
+) WITHOUT ROWID;
+CREATE TABLE balances (person_id INTEGER PRIMARY KEY, balance REAL NOT NULL);
+"""
+
+# Version 2: integer cents, one currency, nothing ever deleted
+V2_SCHEMA = """
+CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE expenses (
+    id INTEGER PRIMARY KEY, paid_by INTEGER NOT NULL, amount INTEGER NOT NULL, description TEXT NOT NULL,
+    date INTEGER NOT NULL
+);
+CREATE INDEX expenses_date ON expenses (date);
+CREATE INDEX expenses_paid_by ON expenses (paid_by);
+CREATE TABLE participants (
+    expense_id INTEGER NOT NULL, position INTEGER NOT NULL, person_id INTEGER NOT NULL, share INTEGER NOT NULL,
+    PRIMARY KEY (expense_id, position)
+) WITHOUT ROWID;
+CREATE INDEX participants_person ON participants (person_id);
+CREATE TABLE balances (person_id INTEGER PRIMARY KEY, balance INTEGER NOT NULL);
+PRAGMA user_version = 2;
+"""
+
+
+def open_ledger(path):
+    return ExpenseSplitter(ExpenseStore(), LedgerDatabase(str(path)))
+
+
+def user_version(path):
+    connection = sqlite3.connect(str(path))
+    try:
+        return connection.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_fresh_file_gets_the_current_schema(tmp_path):
+    path = tmp_path / "ledger.sqlite"
+    splitter = open_ledger(path)
+    assert user_version(path) == SCHEMA_VERSION
+    assert len(splitter.store) == 0 and splitter.store.names == []
+    splitter.add_expense("alice", 12, "lunch", ["alice", "bob"], "2026-01-01")
+    splitter.database.close()
+    assert open_ledger(path).balances_cents() == {"alice": 600, "bob": -600}
+
+
+def test_version_2_is_migrated(tmp_path):
+    path = tmp_path / "ledger.sqlite"
+    connection = sqlite3.connect(str(path))
+    connection.executescript(V2_SCHEMA)
+    connection.executemany("INSERT INTO people (id, name) VALUES (?, ?)", [(0, "alice"), (1, "bob")])
+    day = int(np.datetime64("2026-02-01", "D").astype(np.int64))
+    connection.execute("INSERT INTO expenses VALUES (0, 0, 1001, 'taxi', ?)", (day,))
+    connection.executemany("INSERT INTO participants VALUES (0, ?, ?, ?)", [(0, 0, 501), (1, 1, 500)])
+    connection.executemany("INSERT INTO balances VALUES (?, ?)", [(0, 500), (1, -500)])
+    connection.commit()
+    connection.close()
+
+    splitter = open_ledger(path)
+    assert user_version(path) == SCHEMA_VERSION
+    assert splitter.balances_cents() == {"alice": 500, "bob": -500}
+    splitter.load_history()
+    assert splitter.store.expense(0)["currency"] == "USD"
+    assert splitter.store.expense(0)["date"] == "2026-02-01"
+    # The migrated file takes everything newer versions added
+    splitter.add_expense("bob", 10, "museum", ["alice"], "2026-02-02", currency="EUR")
+    splitter.add_alias("al", "alice")
+    splitter.database.close()
+    reopened = open_ledger(path)
+    assert reopened.store.people.find("al") == 0
+    assert reopened.store.subtotals().tolist() == [[500, -1000], [-500, 1000]]
+
+
+def test_version_1_float_schema_is_refused(tmp_path):
+    path = tmp_path / "ledger.sqlite"
+    connection = sqlite3.connect(str(path))
+    connection.executescript(V1_SCHEMA)
+    connection.close()
+    with pytest.raises(ValueError, match="schema version 0"):
+        LedgerDatabase(str(path))
+
+
+def test_newer_schema_is_refused(tmp_path):
+    path = tmp_path / "ledger.sqlite"
+    LedgerDatabase(str(path)).close()
+    connection = sqlite3.connect(str(path))
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+    connection.close()
+    with pytest.raises(ValueError, match=f"schema version {SCHEMA_VERSION + 1}"):
+        LedgerDatabase(str(path))
+
+
+def test_reopen_keeps_everything(tmp_path):
+    path = tmp_path / "ledger.sqlite"
+    splitter = open_ledger(path)
+    splitter.add_expense("alice", 30, "lunch", ["alice", "bob", "carol"], "2026-03-01")
+    splitter.add_expense("bob", 40, "taxi", ["alice", "bob"], "2026-03-02", currency="EUR")
+    splitter.add_expense("carol", 9, "coffee", ["carol", "bob"], "2026-03-03")
+    splitter.delete_expense(3)
+    splitter.edit_expense(1, amount=33)
+    splitter.add_alias("bobby", "bob")
+    splitter.add_person("dave")
+    splitter.set_rate("EUR", 1.1, "USD", "2026-03-01")
+    splitter.add_recurring("alice", 100, "rent", ["alice", "bob"], "2026-01-15", (1, "month"))
+    splitter.stop_recurring(1, "2026-06-01")
+    before = splitter.store
+    expected_balances = splitter.balances_cents()
+    splitter.database.close()
+
+    reopened = open_ledger(path)
+    store = reopened.store
+    assert store.names == before.names == ["alice", "bob", "carol", "dave"]
+    assert store.people.find("bobby") == 1
+    assert store.rates.latest() == before.rates.latest()
+    assert list(store.recurring) == list(before.recurring)
+    assert reopened.balances_cents() == expected_balances
+    # The saved balances only cover the expenses; the rows agree with them
+    assert np.array_equal(store.subtotals(), before.subtotals())
+    reopened.load_history()
+    assert len(store) == 2 and store.deleted[2]
+    assert store.expense(0)["amount"] == 33
+    assert np.array_equal(store.replay_balances(), store.subtotals())
+
+
+def test_page_filters_and_sorts(tmp_path):
+    database = LedgerDatabase(str(tmp_path / "ledger.sqlite"))
+    splitter = ExpenseSplitter(ExpenseStore(), database)
+    splitter.add_expense("alice", 30, "team lunch", ["alice", "bob"], "2026-03-03")
+    splitter.add_expense("bob", 12, "taxi", ["bob", "carol"], "2026-03-01")
+    splitter.add_expense("carol", 50, "lunch for two", ["carol", "alice"], "2026-03-02")
+    splitter.add_expense("dave", 7, "lunch", ["dave"], "2026-03-04")
+    splitter.delete_expense(4)
+
+    total, page = database.page()
+    assert total == 3 and page["#"].tolist() == [1, 2, 3]
+    assert page["Split Among"] == ["alice, bob", "bob, carol", "carol, alice"]
+    # A person matches as payer or as one of the people split among
+    total, page = database.page(person="alice")
+    assert total == 2 and page["#"].tolist() == [1, 3]
+    total, page = database.page(text="lunch")
+    assert total == 2 and page["Description"] == ["team lunch", "lunch for two"]
+    total, page = database.page(person="carol", text="lunch")
+    assert page["#"].tolist() == [3]
+    _, page = database.page(sort_by="amount", descending=True)
+    assert page["Amount"].tolist() == [50.0, 30.0, 12.0]
+    _, page = database.page(sort_by="date")
+    assert page["Date"].tolist() == ["2026-03-01", "2026-03-02", "2026-03-03"]
+    total, page = database.page(sort_by="paid_by", limit=2, offset=1)
+    assert total == 3 and page["Paid By"] == ["bob", "carol"]
+    total, page = database.page(person="nobody")
+    assert total == 0 and page["#"].tolist() == []
@@ -0,0 +1,50 @@
+import command_parser
+from bench import median_results
+from expense_store import ExpenseStore
+from ledger_generator import WHOLE_GROUP_LIMIT, LedgerGenerator
+
+# The benchmarks' synthetic ledgers: the same for a seed, importable as they
+# are, and phrased as chat commands that parse back to the same expenses.
+
+
+def test_ledgers_are_the_same_for_a_seed():
+    assert list(LedgerGenerator(30, seed=4).rows(500)) == list(LedgerGenerator(30, seed=4).rows(500))
+    assert list(LedgerGenerator(30, seed=4).rows(500)) != list(LedgerGenerator(30, seed=5).rows(500))
+    # Chunks only bound memory
+    assert list(LedgerGenerator(30, seed=4).rows(500, chunk=64))[:64] == list(LedgerGenerator(30, seed=4).rows(64))
+
+
+def test_rows_import_as_they_are():
+    for people in (3, 50):
+        rows = list(LedgerGenerator(people, seed=1).rows(2000, uneven=0.3))
+        for paid_by, amount, _, split_among, _, split in rows:
+            assert amount >= 0.01
+            assert len(set(split_among)) == len(split_among) <= min(people, WHOLE_GROUP_LIMIT)
+            assert split is None or len(split) == len(split_among)
+        assert any(split is not None for *_, split in rows)
+        store = ExpenseStore()
+        assert store.add_many(rows) == 2000
+
+
+def test_commands_parse_back_to_the_rows():
+    generator = LedgerGenerator(12, seed=2)
+    rows = list(LedgerGenerator(12, seed=2).rows(300, uneven=0.3))
+    for command, (paid_by, amount, description, split_among, date, split) in zip(generator.commands(300, uneven=0.3), rows):
+        parsed = command_parser.parse(command, cached=False)
+        assert parsed.kind == command_parser.EXPENSE
+        assert (parsed.paid_by, parsed.amount, parsed.description, parsed.date) == (paid_by, amount, description, date)
+        assert parsed.split_among[:len(split_among)] == tuple(split_among)
+        assert parsed.split_among[len(split_among):] == (() if paid_by in split_among else (paid_by,))
+        if split is not None:
+            assert parsed.split[:len(split)] == tuple(split)
+
+
+def test_results_are_medians_over_the_runs():
+    runs = [
+        {"parse": {"calls": 10, "throughput": 100.0, "p50_us": 3.0, "peak_memory_bytes": 2048}},
+        {"parse": {"calls": 10, "throughput": 900.0, "p50_us": 1.0}},
+        {"parse": {"calls": 10, "throughput": 120.0, "p50_us": 2.0}},
+    ]
+    assert median_results(runs) == {
+        "parse": {"calls": 10, "throughput": 120.0, "p50_us": 2.0, "peak_memory_bytes": 2048, "repeats": 3},
+    }
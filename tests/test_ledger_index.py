@@ -0,0 +1,130 @@
+import random
+
+import numpy as np
+import pytest
+
+import ledger_index
+from expense_store import ExpenseStore
+from ledger_index import day_number
+
+# The date and person indexes against a row-by-row replay of the store, with
+# wide snapshot buckets and a tail of rows added since the last rebuild.
+
+PEOPLE = [f"person{i}" for i in range(6)]
+CURRENCIES = ["USD", "EUR", "GBP"]
+FIRST_DAY = day_number("2024-01-01")
+
+
+def random_date(rng):
+    return str(np.datetime64(FIRST_DAY + rng.randrange(900), "D"))
+
+
+def add_random(store, rng, count):
+    for i in range(count):
+        store.add(
+            rng.choice(PEOPLE), rng.randint(1, 100000) / 100, f"expense {i}",
+            rng.sample(PEOPLE, rng.randint(1, len(PEOPLE))), random_date(rng), currency=rng.choice(CURRENCIES),
+        )
+
+
+def rows_of(store):
+    # (row, day, payer, cents, currency, [(member, share)]) of the live rows
+    for row in np.flatnonzero(~store.column("deleted")).tolist():
+        start, end = store.offsets[row], store.offsets[row + 1]
+        yield (
+            row, int(store.date[row]), int(store.paid_by[row]), int(store.amount[row]), int(store.currency[row]),
+            list(zip(store.members[start:end].tolist(), store.shares[start:end].tolist())),
+        )
+
+
+def in_range(day, start, end):
+    return (start is None or day >= day_number(start)) and (end is None or day < day_number(end))
+
+
+def naive_balances(store, start, end):
+    balances = np.zeros((len(store.names), len(store.currencies)), dtype=np.int64)
+    for _, day, payer, cents, currency, members in rows_of(store):
+        if in_range(day, start, end):
+            balances[payer, currency] += cents
+            for member, share in members:
+                balances[member, currency] -= share
+    return balances
+
+
+def naive_rows(store, pid, start, end):
+    return [
+        row for row, day, payer, _, _, members in rows_of(store)
+        if in_range(day, start, end) and (pid is None or payer == pid or any(m == pid for m, _ in members))
+    ]
+
+
+def naive_owed(store, debtor, creditor):
+    owed = np.zeros(len(store.currencies), dtype=np.int64)
+    for _, _, payer, _, currency, members in rows_of(store):
+        for member, share in members:
+            if payer == creditor and member == debtor:
+                owed[currency] += share
+            if payer == debtor and member == creditor:
+                owed[currency] -= share
+    return owed
+
+
+def random_range(rng):
+    start = random_date(rng) if rng.random() < 0.7 else None
+    end = random_date(rng) if rng.random() < 0.7 else None
+    if start and end and start > end:
+        start, end = end, start
+    return start, end
+
+
+def check(store, rng, queries=40):
+    index = store.index()
+    for _ in range(queries):
+        start, end = random_range(rng)
+        assert np.array_equal(index.balances_between(start, end), naive_balances(store, start, end))
+        pid = rng.choice([None, *range(len(store.names))])
+        assert index.rows(pid, start, end).tolist() == naive_rows(store, pid, start, end)
+        debtor, creditor = rng.sample(range(len(store.names)), 2)
+        assert np.array_equal(index.owed(debtor, creditor), naive_owed(store, debtor, creditor))
+
+
+@pytest.mark.parametrize("snapshot_cells", [2 ** 22, 200])
+def test_index_matches_a_replay(monkeypatch, snapshot_cells):
+    # 200 cells hold a few months of 6 people in 3 currencies, so buckets
+    # span several months each
+    monkeypatch.setattr(ledger_index, "MAX_SNAPSHOT_CELLS", snapshot_cells)
+    monkeypatch.setattr(ledger_index, "MIN_TAIL", 16)
+    rng = random.Random(13)
+    store = ExpenseStore()
+    add_random(store, rng, 150)
+    check(store, rng)
+
+    # A tail of rows the index scans directly, then enough for a rebuild
+    add_random(store, rng, 10)
+    assert store.index().indexed == 150
+    check(store, rng)
+    add_random(store, rng, 40)
+    assert store.index().indexed == 200
+    check(store, rng)
+
+    # Deletes and edits drop the index
+    for row in rng.sample(range(len(store)), 30):
+        store.delete(row)
+    store.edit(next(row for row in range(len(store)) if not store.deleted[row]), date="2023-06-01")
+    check(store, rng)
+
+
+def test_new_person_and_currency_in_the_tail():
+    rng = random.Random(5)
+    store = ExpenseStore()
+    add_random(store, rng, 50)
+    store.index()
+    store.add("newcomer", 10, "late", ["person0", "newcomer"], "2025-01-01", currency="JPY")
+    check(store, rng, queries=20)
+
+
+def test_empty_ledger():
+    store = ExpenseStore()
+    index = store.index()
+    assert index.balances_between("2026-01-01", "2026-02-01").shape == (0, 1)
+    assert index.rows().tolist() == []
@@ -0,0 +1,150 @@
+import random
+
+import expense_store
+from expense_store import SORT_KEYS, ExpenseStore
+from ledger_db import LedgerDatabase
+from main import ExpenseSplitter
+
+# The splitter as the chat and the API drive it: running balances, cached
+# reads and the expense history pages.
+
+PEOPLE = ["alice", "bob", "carol", "dave", "erin"]
+
+
+def splitter():
+    return ExpenseSplitter(ExpenseStore())
+
+
+def test_running_balances_match_the_expenses():
+    rng = random.Random(1)
+    ledger = splitter()
+    expected = {}
+    for i in range(200):
+        payer = rng.choice(PEOPLE)
+        cents = rng.randint(1, 100000)
+        # Everyone known so far when nobody is named
+        split_among = None if expected and rng.random() < 0.2 else rng.sample(PEOPLE, rng.randint(1, 5))
+        members = list(ledger.store.names) if split_among is None else split_among
+        ledger.add_expense(payer, cents / 100, f"expense {i}", split_among, "2026-01-01")
+        expected[payer] = expected.get(payer, 0) + cents
+        base, remainder = divmod(cents, len(members))
+        for position, member in enumerate(members):
+            expected[member] = expected.get(member, 0) - base - (position < remainder)
+        assert ledger.balances_cents() == {name: expected.get(name, 0) for name in ledger.store.names}
+    assert sum(ledger.balances_cents().values()) == 0
+
+
+def test_balances_are_read_without_a_replay(monkeypatch):
+    ledger = splitter()
+    ledger.add_expense("alice", 30, "dinner", ["alice", "bob", "carol"], "2026-01-01")
+    ledger.add_expense("bob", 10, "taxi", ["alice"], "2026-01-02")
+
+    def replay():
+        raise AssertionError("balances were replayed")
+
+    monkeypatch.setattr(ledger.store, "replay_balances", replay)
+    # The payer doesn't owe anything unless they are in the split
+    assert ledger.calculate_balances() == {"alice": 10.0, "bob": 0.0, "carol": -10.0}
+
+
+def naive_page(store, sort_by, descending, person, text):
+    # Expense numbers matching the filters, in display order
+    expenses = [(row, store.expense(row)) for row in range(store.count) if not store.deleted[row]]
+    if person is not None:
+        expenses = [(row, e) for row, e in expenses if person == e["paid_by"] or person in e["split_among"]]
+    if text:
+        expenses = [(row, e) for row, e in expenses if text in e["description"]]
+    keys = {"added": lambda item: item[0], "date": lambda item: (item[1]["date"], item[0]),
+            "amount": lambda item: (item[1]["amount"], item[0]), "paid_by": lambda item: (item[1]["paid_by"], item[0])}
+    return [row + 1 for row, _ in sorted(expenses, key=keys[sort_by], reverse=descending)]
+
+
+def test_history_pages_match_a_sorted_filter(tmp_path):
+    rng = random.Random(7)
+    database = LedgerDatabase(str(tmp_path / "ledger.sqlite"))
+    ledger = ExpenseSplitter(ExpenseStore(), database)
+    for i in range(120):
+        ledger.add_expense(
+            rng.choice(PEOPLE), rng.randint(1, 40) * 2.5, rng.choice(["lunch", "team lunch", "taxi", "hotel"]),
+            rng.sample(PEOPLE, rng.randint(1, 3)), f"2026-0{rng.randint(1, 3)}-1{rng.randint(0, 9)}",
+        )
+    for number in rng.sample(range(1, 121), 15):
+        ledger.delete_expense(number)
+    database.close()
+
+    # The same pages from SQLite (history not loaded) and from memory
+    on_disk = ExpenseSplitter(ExpenseStore(), LedgerDatabase(str(tmp_path / "ledger.sqlite")))
+    in_memory = ExpenseSplitter(ExpenseStore(), LedgerDatabase(str(tmp_path / "ledger.sqlite")))
+    in_memory.load_history()
+    assert on_disk.store.unloaded and not in_memory.store.unloaded
+    for _ in range(30):
+        filters = (
+            rng.choice(SORT_KEYS), rng.random() < 0.5, rng.choice([None, *PEOPLE]), rng.choice([None, "", "lunch"]),
+        )
+        expected = naive_page(in_memory.store, *filters)
+        page_size = rng.choice([5, 10, 20])
+        for page in range(len(expected) // page_size + 1):
+            numbers = expected[page * page_size:(page + 1) * page_size]
+            for ledger in (on_disk, in_memory):
+                total, frame = ledger.history_page(*filters, page_size=page_size, page=page)
+                assert total == len(expected)
+                assert frame.index.tolist() == numbers
+                assert frame["Paid By"].tolist() == [in_memory.store.names[in_memory.store.paid_by[n - 1]] for n in numbers]
+
+
+def reads(ledger):
+    # Everything the page shows, read through the per-version cache
+    return (
+        ledger.balances_cents(), ledger.balances_cents("EUR"), ledger.get_transactions(),
+        ledger.period_balances_cents("2026-01-01", "2026-02-01"), ledger.balance_table().to_dict(),
+        ledger.history_page()[1].to_dict(), ledger.statement("2026-01-01", "2026-03-01"),
+    )
+
+
+def test_cached_reads_never_go_stale():
+    ledger = splitter()
+    ledger.set_rate("EUR", 1.25)
+    changes = [
+        lambda: ledger.add_expense("alice", 30, "dinner", ["bob", "carol"], "2026-01-05"),
+        lambda: ledger.add_expense("bob", 12, "taxi", ["alice"], "2026-01-20", currency="EUR"),
+        lambda: ledger.edit_expense(1, amount=45),
+        lambda: ledger.set_rate("EUR", 1.5),
+        lambda: ledger.add_recurring("carol", 20, "gym", ["alice", "carol"], "2026-01-01"),
+        lambda: ledger.delete_expense(2),
+        lambda: ledger.undo(),
+        lambda: ledger.redo(),
+        lambda: ledger.add_expenses_bulk([("dave", 8, "tea", ["alice"], "2026-02-02")]),
+        lambda: ledger.reset(),
+    ]
+    for change in changes:
+        reads(ledger)
+        change()
+        cached = reads(ledger)
+        ledger.store._derived.clear()
+        assert cached == reads(ledger)
+
+
+def test_reads_are_computed_once_per_version(monkeypatch):
+    ledger = splitter()
+    ledger.add_expense("alice", 30, "dinner", ["bob", "carol"], "2026-01-05")
+    calls = []
+    convert = ledger.convert
+    monkeypatch.setattr(ledger, "convert", lambda *args: calls.append(args) or convert(*args))
+    for _ in range(3):
+        ledger.calculate_balances()
+        ledger.balance_table()
+    assert len(calls) == 1
+    ledger.add_expense("bob", 12, "taxi", ["alice"], "2026-01-20")
+    ledger.calculate_balances()
+    assert len(calls) == 2
+
+
+def test_cache_keeps_a_bounded_number_of_results(monkeypatch):
+    monkeypatch.setattr(expense_store, "MAX_DERIVED", 3)
+    store = ExpenseStore()
+    computed = []
+    for key in ("a", "b", "c", "d", "a"):
+        store.cached(key, lambda: computed.append(key) or key)
+    # "a" was the oldest when "d" came in, so it is computed again
+    assert computed == ["a", "b", "c", "d", "a"]
+    assert len(store._derived) == 3
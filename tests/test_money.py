@@ -0,0 +1,290 @@
+import math
+import random
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from expense_store import ExpenseStore
+from money import (
+    AMOUNT, MAX_CENTS, PERCENT, SHARES, allocate_many, bincount_cents, convert_cents, split_evenly, split_evenly_many,
+    to_cents,
+)
+
+# Property checks over seeded random ledgers: whatever is added, edited,
+# deleted or undone, the cent balances of every currency sum to exactly zero
+# and match a replay of the live rows.
+
+PEOPLE = [f"person{i}" for i in range(12)]
+CURRENCIES = ["USD", "EUR", "JPY"]
+SEEDS = range(20)
+
+
+def random_amount(rng):
+    # Mostly everyday amounts, some with awkward cents, a few very large
+    return rng.choice([
+        round(rng.uniform(0.01, 100), 2),
+        round(rng.uniform(0.01, 0.10), 2),
+        rng.randint(1, 10 ** 9) / 100,
+        rng.randint(1, 999) / 3,
+    ])
+
+
+def random_split(rng, amount, count):
+    # None (even), or one spec per person mixing shares, percentages and a
+    # fixed amount, with at least one share so something takes the rest
+    if rng.random() < 0.4:
+        return None
+    split = []
+    percent_left = 60.0
+    for position in range(count):
+        kind = rng.choice([SHARES, SHARES, PERCENT, AMOUNT, None])
+        if position == 0 or kind == SHARES:
+            split.append((SHARES, rng.randint(1, 5)))
+        elif kind == PERCENT and percent_left >= 1:
+            percent = round(rng.uniform(1, percent_left / 2), 2)
+            percent_left -= percent
+            split.append((PERCENT, percent))
+        elif kind == AMOUNT:
+            split.append((AMOUNT, round(amount / (4 * count), 2)))
+        else:
+            split.append(None)
+    return split
+
+
+def random_row(rng):
+    members = rng.sample(PEOPLE, rng.randint(1, 6))
+    amount = random_amount(rng)
+    date = str(np.datetime64("2026-01-01") + rng.randrange(365))
+    return (
+        rng.choice(PEOPLE), amount, rng.choice(["lunch", "taxi", "rent"]), members, date,
+        random_split(rng, amount, len(members)), rng.choice(CURRENCIES),
+    )
+
+
+def assert_balanced(store):
+    subtotals = store.subtotals()
+    assert not subtotals.sum(axis=0).any(), "balances of a currency don't sum to zero"
+    assert np.array_equal(subtotals, store.replay_balances())
+
+
+def live_rows(store):
+    return np.flatnonzero(~store.column("deleted")).tolist()
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_balances_sum_to_zero(seed):
+    rng = random.Random(seed)
+    store = ExpenseStore()
+    for _ in range(300):
+        action = rng.random()
+        rows = live_rows(store)
+        if action < 0.45 or not rows:
+            store.add(*random_row(rng))
+        elif action < 0.55:
+            store.add_many([random_row(rng) for _ in range(rng.randint(1, 20))])
+        elif action < 0.7:
+            row = rng.choice(rows)
+            store.edit(
+                row, paid_by=rng.choice([None, rng.choice(PEOPLE)]), amount=rng.choice([None, random_amount(rng)]),
+                currency=rng.choice([None, rng.choice(CURRENCIES)]),
+            )
+        elif action < 0.82:
+            store.delete(rng.choice(rows))
+        elif action < 0.92:
+            store.undo()
+        elif action < 0.97:
+            store.redo()
+        else:
+            store.clear()
+        assert_balanced(store)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_shares_add_up_to_the_amount(seed):
+    rng = random.Random(seed)
+    store = ExpenseStore()
+    for _ in range(200):
+        row = random_row(rng)
+        i = store.add(*row)
+        shares = store.shares[store.offsets[i]:store.offsets[i + 1]]
+        assert shares.sum() == store.amount[i] == to_cents(row[1])
+        assert (shares >= 0).all()
+
+
+def test_split_evenly_differs_by_a_cent_at_most():
+    rng = random.Random(0)
+    for _ in range(1000):
+        total, count = rng.randint(1, 10 ** 12), rng.randint(1, 50)
+        shares = split_evenly(total, count)
+        assert sum(shares) == total
+        assert max(shares) - min(shares) <= 1
+
+
+def test_amounts_are_bounded():
+    assert to_cents(MAX_CENTS / 100) == MAX_CENTS
+    for amount in ("1e300", 10 ** 20, float("inf"), "nan"):
+        with pytest.raises(ValueError):
+            to_cents(amount)
+    store = ExpenseStore()
+    with pytest.raises(ValueError):
+        store.add("alice", 10 ** 20, "x", ["bob"], "2026-01-01")
+    assert store.names == []
+
+
+def test_bincount_cents_is_exact_past_float_precision():
+    # Two amounts near the cap sum past 2**53, where float64 drops cents
+    ids = np.array([0, 0, 0, 1])
+    cents = np.array([MAX_CENTS - 1, MAX_CENTS - 1, 3, 5])
+    assert bincount_cents(ids, cents, 2).tolist() == [2 * (MAX_CENTS - 1) + 3, 5]
+    rng = np.random.default_rng(0)
+    ids = rng.integers(0, 7, size=1000)
+    cents = rng.integers(-10 ** 6, 10 ** 6, size=1000)
+    assert bincount_cents(ids, cents, 7).tolist() == [int(cents[ids == i].sum()) for i in range(7)]
+
+
+@pytest.mark.parametrize("amount, cents", [
+    ("0.285", 29), (0.285, 29), ("1.005", 101), (1.005, 101), ("2.675", 268), (-0.285, -29), (" 3.10 ", 310),
+    (12, 1200), ("1e2", 10000), (np.float64(0.285), 29), (np.int64(7), 700),
+])
+def test_to_cents_rounds_half_up_from_the_decimal(amount, cents):
+    assert to_cents(amount) == cents
+
+
+@pytest.mark.parametrize("amount", ["abc", "", None, [1]])
+def test_to_cents_rejects_non_numbers(amount):
+    with pytest.raises(ValueError):
+        to_cents(amount)
+
+
+def naive_allocate(total, fixed, percents, weights):
+    # One expense's shares in exact fractions: the largest-remainder split
+    # allocate_many() vectorizes, or None when the split doesn't add up
+    claimed = [Fraction(f) + Fraction(str(p)) * total / 100 for f, p in zip(fixed, percents)]
+    rest = total - sum(claimed)
+    weight_sum = sum(Fraction(str(w)) for w in weights)
+    if rest < 0 or (rest > 0 and not weight_sum):
+        return None
+    per_weight = rest / weight_sum if weight_sum else 0
+    exact = [c + Fraction(str(w)) * per_weight for c, w in zip(claimed, weights)]
+    shares = [math.floor(e) for e in exact]
+    by_remainder = sorted(range(len(exact)), key=lambda i: (-(exact[i] - shares[i]), i))
+    for i in by_remainder[:total - sum(shares)]:
+        shares[i] += 1
+    return shares
+
+
+def random_parts(rng, size):
+    fixed, percents, weights = [], [], []
+    for _ in range(size):
+        kind = rng.random()
+        fixed.append(rng.randint(1, 500) if kind < 0.2 else 0)
+        percents.append(rng.choice([5, 12.5, 33.3, 40]) if 0.2 <= kind < 0.4 else 0)
+        weights.append(rng.choice([1, 1, 2, 0.5, 2.5, 3]) if kind >= 0.4 else 0)
+    return fixed, percents, weights
+
+
+def allocate_columns(expenses):
+    totals = np.array([total for total, _ in expenses], dtype=np.int64)
+    sizes = np.array([len(parts[0]) for _, parts in expenses])
+    columns = [np.array([v for _, parts in expenses for v in parts[k]]) for k in range(3)]
+    return totals, sizes, columns[0].astype(np.int64), columns[1].astype(float), columns[2].astype(float)
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_allocate_many_matches_exact_fractions(seed):
+    rng = random.Random(seed)
+    expenses = [(rng.randint(1, 10 ** 6), random_parts(rng, rng.randint(1, 8))) for _ in range(300)]
+    totals, sizes, fixed, percents, weights = allocate_columns(expenses)
+    shares, valid = allocate_many(totals, sizes, fixed, percents, weights)
+    starts = np.cumsum(sizes) - sizes
+    for i, (total, parts) in enumerate(expenses):
+        expected = naive_allocate(total, *parts)
+        assert valid[i] == (expected is not None)
+        if expected is not None:
+            assert shares[starts[i]:starts[i] + sizes[i]].tolist() == expected
+
+
+def test_allocate_many_equal_weights_split_evenly():
+    rng = random.Random(1)
+    totals = np.array([rng.randint(1, 10 ** 6) for _ in range(1000)], dtype=np.int64)
+    sizes = np.array([rng.randint(1, 9) for _ in range(1000)])
+    zeros = np.zeros(sizes.sum())
+    shares, valid = allocate_many(totals, sizes, zeros.astype(np.int64), zeros, np.full(sizes.sum(), 3.0))
+    assert valid.all()
+    assert np.array_equal(shares, split_evenly_many(totals, sizes))
+
+
+def test_allocate_many_ranks_remainders_past_a_million_expenses():
+    # The remainder rank is one float key (expense + remainder); far into a
+    # big call it must still order remainders 1e-6 apart and keep ties in
+    # list order, exactly like a call holding only the last expenses
+    count, tail = 1_200_000, 2000
+    rng = np.random.default_rng(17)
+    sizes = rng.integers(2, 5, count)
+    totals = rng.integers(1, 10 ** 6, count)
+    participants = sizes.sum()
+    fixed = np.zeros(participants, dtype=np.int64)
+    percents = np.zeros(participants)
+    weights = rng.choice([1.0, 2.0, 0.5, 999_999.0, 1_000_000.0], participants)
+    shares, valid = allocate_many(totals, sizes, fixed, percents, weights)
+    assert valid.all()
+    expense = np.repeat(np.arange(count), sizes)
+    assert np.array_equal(np.bincount(expense, weights=shares, minlength=count), totals)
+
+    first = int(sizes[:-tail].sum())
+    alone, _ = allocate_many(totals[-tail:], sizes[-tail:], fixed[first:], percents[first:], weights[first:])
+    assert np.array_equal(shares[first:], alone)
+    for i in range(count - 50, count):
+        start = int(sizes[:i].sum())
+        parts = ([0] * sizes[i], [0] * sizes[i], weights[start:start + sizes[i]].tolist())
+        assert shares[start:start + sizes[i]].tolist() == naive_allocate(int(totals[i]), *parts)
+
+
+def naive_convert(subtotals, factors):
+    # convert_cents() one person at a time in exact fractions
+    exact = [sum(Fraction(int(c)) * Fraction(f) for c, f in zip(row, factors)) for row in subtotals]
+    converted = [math.floor(e) for e in exact]
+    by_remainder = sorted(range(len(exact)), key=lambda i: (-(exact[i] - converted[i]), i))
+    for i in by_remainder[:round(sum(exact) - sum(converted))]:
+        converted[i] += 1
+    return converted
+
+
+def zero_sum_subtotals(rng, people, currencies):
+    # Random (people, currencies) cents whose every column adds up to zero;
+    # some people have the same balances, so their remainders tie
+    subtotals = rng.integers(-10 ** 6, 10 ** 6, (people, currencies))
+    subtotals[1::5] = subtotals[::5][:len(subtotals[1::5])]
+    subtotals[-1] = -subtotals[:-1].sum(axis=0)
+    return subtotals
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_convert_cents_matches_exact_fractions(seed):
+    # Rates that are sums of powers of two make the float arithmetic exact,
+    # ties included (every .5 remainder), so the result must match exactly
+    rng = np.random.default_rng(seed)
+    factors = rng.choice([1.0, 0.5, 1.25, 0.875, 160.5, 0.0078125], 3)
+    subtotals = zero_sum_subtotals(rng, 40, 3)
+    converted = convert_cents(subtotals, factors)
+    assert converted.tolist() == naive_convert(subtotals, factors)
+    assert converted.sum() == 0
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_convert_cents_is_a_largest_remainder_rounding(seed):
+    rng = np.random.default_rng(seed)
+    factors = rng.uniform(0.005, 200, 4)
+    subtotals = zero_sum_subtotals(rng, 200, 4)
+    converted = convert_cents(subtotals, factors)
+    exact = subtotals @ factors
+    # Balances that added up to zero still do, and everyone is within a
+    # cent of their exact value, rounded up only if their remainder is at
+    # least anyone's rounded down
+    assert converted.sum() == 0
+    assert np.all(np.abs(converted - exact) < 1)
+    remainders = exact - np.floor(exact)
+    up = converted > np.floor(exact)
+    if up.any() and (~up).any():
+        assert remainders[up].min() >= remainders[~up].max() - 1e-6
@@ -0,0 +1,156 @@
+import random
+
+import pytest
+
+from expense_store import ExpenseStore
+from importer import record_rows
+from main import ExpenseSplitter
+from people import PeopleRegistry, UnknownPerson, edit_distance, name_key
+
+# Matching names typed by people: the keys names are compared on, aliases,
+# the suggestions for a typo and the store paths that take names as typed.
+
+
+@pytest.mark.parametrize(
+    "name, key",
+    [("  Zoë  Smith", "zoe smith"), ("BOB", "bob"), ("José\tÁlvarez ", "jose alvarez"), ("ß", "ss")],
+)
+def test_name_key(name, key):
+    assert name_key(name) == key
+
+
+def registry(*names):
+    people = PeopleRegistry()
+    for name in names:
+        people.add(name)
+    return people
+
+
+def test_find_ignores_case_accents_and_spacing():
+    people = registry("Zoë Smith", "bob")
+    assert people.find("zoe  smith") == 0
+    assert people.find("Bob") == 1
+    assert people.find("carol") is None
+    assert people.intern("BOB") == 1
+    assert people.intern("carol") == 2
+
+
+def test_add_rejects_empty_and_repeated_names():
+    people = registry("bob")
+    with pytest.raises(ValueError):
+        people.add("   ")
+    with pytest.raises(ValueError):
+        people.add("bob")
+
+
+def test_aliases():
+    people = registry("bob", "alice")
+    assert people.alias("Bobby", "bob") == 0
+    assert people.find("bobby") == 0
+    assert people.resolve("BOBBY") == 0
+    # Repeating an alias is fine; pointing it elsewhere or at a name isn't
+    assert people.alias("bobby", "bob") == 0
+    with pytest.raises(ValueError, match="already stands for bob"):
+        people.alias("bobby", "alice")
+    with pytest.raises(ValueError, match="already someone"):
+        people.alias("alice", "bob")
+    with pytest.raises(UnknownPerson, match="Did you mean alice"):
+        people.alias("al", "alicia")
+
+
+def test_truncate_forgets_later_people_and_their_aliases():
+    people = registry("bob", "alice")
+    people.alias("bobby", "bob")
+    people.alias("ali", "alice")
+    people.truncate(1)
+    assert people.names == ["bob"]
+    assert people.find("bobby") == 0
+    assert people.find("ali") is None
+    assert people.find("alice") is None
+
+
+def test_resolve():
+    people = registry("bob", "alice")
+    assert people.resolve("Alice") == 1
+    # Nobody close: a new name
+    assert people.resolve("zed") is None
+    with pytest.raises(UnknownPerson) as raised:
+        people.resolve("bobby")
+    assert raised.value.name == "bobby"
+    assert raised.value.suggestions == ["bob"]
+    assert str(raised.value) == "I don't know bobby. Did you mean bob?"
+
+
+def test_suggest_ranking():
+    people = registry("robert", "roberta", "robbert", "alice")
+    # Fewest edits (or extra letters) first, ties by name
+    assert people.suggest("robbrt") == ["robbert", "robert", "roberta"]
+    # Short names tolerate a single typo
+    assert people.suggest("robrt") == ["robert"]
+    assert people.suggest("roberto") == ["robert", "roberta", "robbert"]
+    assert people.suggest("robbrt", limit=1) == ["robbert"]
+    assert people.suggest("alise") == ["alice"]
+    assert people.suggest("zzz") == []
+
+
+def test_numbered_names_are_not_typos():
+    people = registry("person1", "person2", "room 2")
+    assert people.suggest("person3") == []
+    assert people.suggest("room 3") == []
+    assert people.suggest("persn1") == ["person1", "person2"]
+
+
+def test_short_names_are_not_nicknames():
+    people = registry("al")
+    assert people.suggest("alan") == []
+    people = registry("ali")
+    assert people.suggest("alice") == ["ali"]
+
+
+def test_suggest_matches_brute_force():
+    # The bigram index only narrows the names compared; for a small group it
+    # must find every name within max_edits() edits
+    rng = random.Random(19)
+    letters = "abcdeo"
+    for _ in range(50):
+        names = sorted({"".join(rng.choices(letters, k=rng.randint(4, 8))) for _ in range(10)})
+        people = registry(*names)
+        name = "".join(rng.choices(letters, k=rng.randint(4, 8)))
+        if people.find(name) is not None:
+            continue
+        limit = 1 if len(name) <= 5 else 2
+        close = {other for other in names if edit_distance(name, other, limit) <= limit}
+        assert close <= set(people.suggest(name, limit=len(names)))
+
+
+def test_edit_rejects_misspelt_payer():
+    store = ExpenseStore()
+    store.add("bob", 10, "lunch", ["alice"], "2026-01-01")
+    with pytest.raises(UnknownPerson, match="Did you mean bob"):
+        store.edit(0, paid_by="bobb")
+    assert store.names == ["bob", "alice"]
+    store.edit(0, paid_by="carol")
+    assert store.expense(0)["paid_by"] == "carol"
+
+
+def test_bulk_import_rejects_misspelt_names():
+    store = ExpenseStore()
+    store.add("bob", 10, "lunch", ["alice"], "2026-01-01")
+    rows = [
+        {"paid_by": "alice", "amount": 5, "description": "tea", "split_among": ["bob"]},
+        {"paid_by": "bobb", "amount": 5, "description": "cake", "split_among": ["alice"]},
+    ]
+    with pytest.raises(ValueError, match="row 2: I don't know bobb. Did you mean bob"):
+        store.add_many(record_rows(rows))
+    assert len(store) == 1
+    assert store.names == ["bob", "alice"]
+
+
+def test_chat_replies_to_a_misspelt_name():
+    splitter = ExpenseSplitter(ExpenseStore())
+    splitter.parse_command("bob paid 10 for lunch split among alice")
+    hint = "I don't know bobb. Did you mean bob? Say 'alias bobb = bob' if that's them, " \
+           "or 'add person bobb' if they're someone new."
+    assert splitter.parse_command("bobb paid 10 for tea split among alice") == hint
+    assert splitter.parse_command("bobb pays 10 for gym monthly split among alice") == hint
+    assert len(splitter.store) == 1 and not len(splitter.store.recurring)
@@ -0,0 +1,48 @@
+import pytest
+
+import perf
+from expense_store import ExpenseStore
+from main import ExpenseSplitter
+
+# Timing spans: what a ledger read records, and the exported formats.
+
+
+@pytest.fixture
+def timing():
+    was_enabled = perf.enabled
+    perf.enable(True)
+    perf.RECORDER.reset()
+    yield perf.RECORDER
+    perf.enable(was_enabled)
+    perf.RECORDER.reset()
+
+
+def test_balance_reads_are_timed_once(timing):
+    splitter = ExpenseSplitter(ExpenseStore())
+    splitter.add_expense("alice", 12, "lunch", ["alice", "bob"], "2026-01-01")
+    timing.reset()
+    assert splitter.calculate_balances() == {"alice": 6.0, "bob": -6.0}
+    # The wrapper isn't a span of its own, so its work isn't counted twice
+    assert {name: summary["count"] for name, summary in timing.snapshot().items()} == {"balances_cents": 1}
+
+
+def test_nothing_is_recorded_while_timing_is_off(timing):
+    perf.enable(False)
+    with perf.span("parse"):
+        pass
+    ExpenseSplitter(ExpenseStore()).calculate_balances()
+    assert perf.RECORDER.snapshot() == {}
+
+
+def test_exports(timing):
+    for seconds in (0.5e-6, 3e-6, 3e-6, 1.0):
+        timing.record("parse", seconds)
+    summary = timing.snapshot()["parse"]
+    assert summary["count"] == 4
+    assert summary["max_seconds"] == 1.0
+    assert summary["p50_seconds"] == 3e-6
+    text = timing.to_prometheus()
+    assert 'expense_splitter_span_seconds_bucket{span="parse",le="1e-06"} 1' in text
+    assert 'expense_splitter_span_seconds_bucket{span="parse",le="4e-06"} 3' in text
+    assert 'expense_splitter_span_seconds_bucket{span="parse",le="+Inf"} 4' in text
+    assert 'expense_splitter_span_seconds_count{span="parse"} 4' in text
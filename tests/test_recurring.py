@@ -0,0 +1,171 @@
+import calendar
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from expense_store import ExpenseStore
+from ledger_index import day_number
+from period_totals import category
+from recurring import UNITS, Recurring, RecurringSchedule
+
+# Recurring schedules counted in closed form against stepping through every
+# occurrence, and the per-month period totals against summing the rows.
+
+EPOCH = date(1970, 1, 1)
+PEOPLE = ["alice", "bob", "carol", "dave"]
+DESCRIPTIONS = ["Rent", "rent ", "Groceries", "groceries", "Taxi", "Coffee  beans"]
+
+
+def to_day(value):
+    return (value - EPOCH).days
+
+
+def random_day(rng):
+    # 2023-2027, with plenty of month ends
+    if rng.random() < 0.3:
+        year, month = rng.randint(2023, 2027), rng.randint(1, 12)
+        return to_day(date(year, month, calendar.monthrange(year, month)[1] - rng.randint(0, 2)))
+    return to_day(date(2023, 1, 1)) + rng.randrange(5 * 365)
+
+
+def occurrences(definition):
+    # Every occurrence (day numbers), stepping one by one
+    length, unit = UNITS[definition.unit]
+    first = EPOCH + timedelta(days=definition.start)
+    end = definition.end if definition.end is not None else to_day(date(2031, 1, 1))
+    for k in range(100000):
+        if unit == "D":
+            day = definition.start + k * definition.every * length
+        else:
+            months = first.month - 1 + k * definition.every * length
+            year, month = first.year + months // 12, months % 12 + 1
+            day = to_day(date(year, month, min(first.day, calendar.monthrange(year, month)[1])))
+        if day >= end:
+            return
+        yield day
+
+
+def random_definition(rng):
+    start = random_day(rng)
+    end = start + rng.randint(1, 1500) if rng.random() < 0.5 else None
+    return Recurring(
+        paid_by=rng.randrange(4), amount=rng.randint(100, 10 ** 6), description=rng.choice(DESCRIPTIONS),
+        members=(0, 1), shares=(0, 0), currency=0, start=start, every=rng.randint(1, 3),
+        unit=rng.choice(list(UNITS)), end=end,
+    )
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_counts_match_stepping_through_occurrences(seed):
+    rng = random.Random(seed)
+    schedule = RecurringSchedule()
+    for _ in range(40):
+        schedule.add(random_definition(rng))
+    stepped = [list(occurrences(d)) for d in schedule]
+    for _ in range(50):
+        start, end = sorted((random_day(rng), random_day(rng)))
+        if rng.random() < 0.2:
+            start = None
+        counts = schedule.counts(start, end).tolist()
+        assert counts == [sum(1 for day in days if (start is None or day >= start) and day < end) for days in stepped]
+        number = rng.randrange(len(schedule))
+        expected = [day for day in stepped[number] if (start is None or day >= start) and day < end]
+        assert schedule.dates(number, start, end).tolist() == expected
+
+
+def test_month_ends_are_kept():
+    schedule = RecurringSchedule()
+    jan31 = day_number("2024-01-31")
+    schedule.add(Recurring(0, 100, "rent", (0,), (100,), 0, jan31, 1, "month"))
+    days = schedule.dates(0, None, day_number("2024-06-01"))
+    assert [str(np.datetime64(day, "D")) for day in days.tolist()] == [
+        "2024-01-31", "2024-02-29", "2024-03-31", "2024-04-30", "2024-05-31",
+    ]
+    leap = day_number("2024-02-29")
+    schedule.add(Recurring(0, 100, "dues", (0,), (100,), 0, leap, 1, "year"))
+    assert schedule.counts(None, day_number("2028-02-29")).tolist()[1] == 4
+    assert schedule.counts(None, day_number("2028-03-01")).tolist()[1] == 5
+
+
+def test_stop():
+    schedule = RecurringSchedule()
+    start = day_number("2026-01-01")
+    schedule.add(Recurring(0, 100, "gym", (0,), (100,), 0, start, 1, "week"))
+    schedule.stop(0, start + 21)
+    assert schedule.counts(None, start + 100).tolist() == [3]
+    with pytest.raises(ValueError, match="already stopped"):
+        schedule.stop(0, start + 30)
+
+
+def random_store(rng, count):
+    store = ExpenseStore()
+    for _ in range(count):
+        store.add(
+            rng.choice(PEOPLE), rng.randint(1, 50000) / 100, rng.choice(DESCRIPTIONS),
+            rng.sample(PEOPLE, rng.randint(1, 4)), str(np.datetime64(random_day(rng), "D")),
+            currency=rng.choice(["USD", "EUR"]),
+        )
+    return store
+
+
+def naive_totals(store, start, end):
+    paid = np.zeros((len(store.names), len(store.currencies)), dtype=np.int64)
+    spent = np.zeros_like(paid)
+    categories = {}
+    count = 0
+    for row in np.flatnonzero(~store.column("deleted")).tolist():
+        day, currency = int(store.date[row]), int(store.currency[row])
+        if (start is not None and day < day_number(start)) or (end is not None and day >= day_number(end)):
+            continue
+        count += 1
+        paid[store.paid_by[row], currency] += store.amount[row]
+        for position in range(store.offsets[row], store.offsets[row + 1]):
+            spent[store.members[position], currency] += store.shares[position]
+        pair = (category(store.descriptions[row]), currency)
+        categories[pair] = categories.get(pair, 0) + int(store.amount[row])
+    return paid, spent, {pair: cents for pair, cents in categories.items() if cents}, count
+
+
+def check_totals(store, rng):
+    kept = store.period_totals()
+    for _ in range(30):
+        start, end = sorted(str(np.datetime64(random_day(rng), "D")) for _ in range(2))
+        if rng.random() < 0.2:
+            start = None
+        if rng.random() < 0.2:
+            end = None
+        totals = kept.between(start, end)
+        paid, spent, categories, count = naive_totals(store, start, end)
+        assert np.array_equal(totals.paid, paid)
+        assert np.array_equal(totals.spent, spent)
+        assert totals.categories == categories
+        assert totals.count == count
+
+
+def test_period_totals_match_the_rows():
+    rng = random.Random(22)
+    store = random_store(rng, 300)
+    check_totals(store, rng)
+    # Kept up to date through adds, deletes, edits, undo and redo
+    store.period_totals()
+    for _ in range(40):
+        live = np.flatnonzero(~store.column("deleted")).tolist()
+        action = rng.random()
+        if action < 0.25:
+            store.delete(rng.choice(live))
+        elif action < 0.5:
+            store.edit(
+                rng.choice(live), amount=rng.randint(1, 50000) / 100, date=str(np.datetime64(random_day(rng), "D")),
+                description=rng.choice(DESCRIPTIONS),
+            )
+        elif action < 0.7:
+            store.undo()
+        elif action < 0.85:
+            store.redo()
+        else:
+            store.add("erin", 12.5, "Taxi", ["alice", "erin"], "2025-06-15", currency="GBP")
+    check_totals(store, rng)
+    store.clear()
+    check_totals(store, rng)
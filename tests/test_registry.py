@@ -0,0 +1,75 @@
+import threading
+
+from expense_store import ExpenseStore
+from ledger_db import LedgerDatabase
+from ledger_registry import LedgerRegistry
+from main import ExpenseSplitter
+
+# Hundreds of threads adding expenses to a few shared group ledgers at once,
+# as concurrent sessions do. Each group's lock must keep every expense and
+# every cent, in memory and in the group's database.
+
+THREADS = 300
+EXPENSES_PER_THREAD = 10
+GROUPS = ["default", "trip", "flat"]
+PEOPLE = ["alice", "bob", "carol"]
+
+
+def hammer(registry):
+    start = threading.Barrier(THREADS)
+    errors = []
+
+    def work(number):
+        splitter = ExpenseSplitter.for_group(registry.group(GROUPS[number % len(GROUPS)]))
+        start.wait()
+        try:
+            for i in range(EXPENSES_PER_THREAD):
+                # Alice pays, bob and carol share: 3.01 splits 1.51 / 1.50
+                splitter.add_expense("alice", 3.01, f"thread {number} expense {i}", ["bob", "carol"], "2026-03-01")
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=work, args=(number,)) for number in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def expected(group):
+    # Expenses and balances (cents) every thread of a group adds up to
+    count = len(range(GROUPS.index(group), THREADS, len(GROUPS))) * EXPENSES_PER_THREAD
+    return count, {"alice": 301 * count, "bob": -151 * count, "carol": -150 * count}
+
+
+def test_threads_share_group_ledgers(tmp_path):
+    registry = LedgerRegistry(str(tmp_path / "ledger.sqlite"))
+    hammer(registry)
+    assert len(registry) == len(GROUPS)
+    for group in GROUPS:
+        count, balances = expected(group)
+        splitter = ExpenseSplitter.for_group(registry.group(group))
+        assert len(splitter.store) == count
+        assert splitter.balances_cents() == balances
+        assert not splitter.store.subtotals().sum(axis=0).any()
+
+
+def test_group_databases_keep_every_expense(tmp_path):
+    path = str(tmp_path / "ledger.sqlite")
+    registry = LedgerRegistry(path)
+    hammer(registry)
+    for group in GROUPS:
+        registry.group(group).database.close()
+
+    # A fresh process reads each group's file back
+    reopened = LedgerRegistry(path)
+    assert sorted(reopened.saved_groups()) == sorted(GROUPS)
+    for group, group_path in reopened.saved_groups().items():
+        count, balances = expected(group)
+        splitter = ExpenseSplitter(ExpenseStore(), LedgerDatabase(group_path))
+        assert splitter.balances_cents() == balances
+        splitter.load_history()
+        assert len(splitter.store) == count
+        assert splitter.store.replay_balances().tolist() == splitter.store.subtotals().tolist()
+        splitter.database.close()
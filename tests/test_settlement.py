@@ -0,0 +1,99 @@
+import random
+from functools import lru_cache
+
+import pytest
+
+from settlement import EXACT_LIMIT, STRATEGIES, _exact_groups, settle_cents
+
+# Settling balances: every strategy leaves everyone at zero, and the exact one
+# uses as few transfers as a brute force over every partition of the group.
+
+
+def random_balances(rng, people, spread):
+    # {person: cents} adding up to zero; small spreads give many zero-sum
+    # subgroups
+    values = [rng.randint(-spread, spread) for _ in range(people - 1)]
+    values.append(-sum(values))
+    return {f"p{i}": value for i, value in enumerate(values)}
+
+
+def settled(balances, transfers):
+    left = dict(balances)
+    for debtor, creditor, cents in transfers:
+        assert cents > 0
+        assert balances[debtor] < 0 < balances[creditor]
+        left[debtor] += cents
+        left[creditor] -= cents
+    return all(value == 0 for value in left.values())
+
+
+def fewest_transfers(values):
+    # n - (most disjoint zero-sum groups), trying every partition
+    n = len(values)
+
+    @lru_cache(maxsize=None)
+    def most_groups(mask):
+        if not mask:
+            return 0
+        low = mask & -mask
+        best = -1
+        sub = mask
+        while sub:
+            if sub & low and sum(values[i] for i in range(n) if sub >> i & 1) == 0:
+                rest = most_groups(mask ^ sub)
+                if rest >= 0:
+                    best = max(best, rest + 1)
+            sub = (sub - 1) & mask
+        return best
+
+    return n - most_groups((1 << n) - 1)
+
+
+def test_exact_groups_are_zero_sum_partitions():
+    rng = random.Random(3)
+    for _ in range(200):
+        values = [v for v in random_balances(rng, rng.randint(2, 10), 6).values() if v]
+        groups = _exact_groups(values)
+        assert sorted(i for group in groups for i in group) == list(range(len(values)))
+        assert all(sum(values[i] for i in group) == 0 for group in groups)
+
+
+def test_exact_uses_fewest_transfers():
+    rng = random.Random(7)
+    for _ in range(200):
+        balances = random_balances(rng, rng.randint(2, 9), rng.choice((3, 10, 1000)))
+        transfers = settle_cents(balances, "exact")
+        assert settled(balances, transfers)
+        assert len(transfers) == fewest_transfers([v for v in balances.values() if v])
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_every_strategy_settles_to_zero(strategy):
+    rng = random.Random(11)
+    for _ in range(100):
+        people = rng.randint(1, EXACT_LIMIT if strategy == "exact" else 60)
+        balances = random_balances(rng, people, rng.choice((5, 100, 10**6)))
+        transfers = settle_cents(balances, strategy)
+        assert settled(balances, transfers)
+        # Never worse than one transfer per unsettled person but one
+        assert len(transfers) <= max(sum(1 for v in balances.values() if v) - 1, 0)
+
+
+def test_bounded_settles_without_time():
+    rng = random.Random(13)
+    balances = random_balances(rng, 200, 50)
+    assert settled(balances, settle_cents(balances, "bounded", time_budget=0))
+
+
+def test_settling_rejects_balances_that_do_not_add_up():
+    with pytest.raises(ValueError, match="1 cents off"):
+        settle_cents({"bob": 501, "alice": -500})
+
+
+def test_strategy_errors():
+    with pytest.raises(ValueError, match="Unknown settlement strategy"):
+        settle_cents({"bob": 1, "alice": -1}, "fastest")
+    balances = {f"p{i}": 1 for i in range(EXACT_LIMIT)}
+    balances["last"] = -EXACT_LIMIT
+    with pytest.raises(ValueError, match="at most"):
+        settle_cents(balances, "exact")
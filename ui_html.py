@@ -0,0 +1,262 @@
+import html
+import re
+from functools import lru_cache
+
+from money import format_amount
+
+
+# Static CSS and HTML for the Streamlit page. main.py runs from the top on
+# every rerun but the modules it imports stay loaded, so everything here is
+# built once per process: the stylesheet is minified on first use and
+# fragments are cached per argument. Fragments that repeat, like the example
+# commands and the transaction cards, go out as one st.markdown payload
+# rather than one each.
+
+STYLE = """
+/* Main container styling */
+.main {
+    background-color: #f8f9fa;
+    padding: 10px;
+}
+
+/* Header styling */
+h1 {
+    color: #4b6584;
+    text-align: center;
+    margin-bottom: 1.5rem;
+    padding-bottom: 0.5rem;
+    border-bottom: 2px solid #20bf6b;
+}
+
+h2, h3 {
+    color: #4b6584;
+    margin-top: 1rem;
+}
+
+/* Card styling for different sections */
+.card {
+    background-color: white;
+    border-radius: 10px;
+    padding: 20px;
+    box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+    margin-bottom: 20px;
+}
+
+/* Button styling */
+.stButton>button {
+    background-color: #20bf6b;
+    color: white;
+    border: none;
+    border-radius: 5px;
+    padding: 0.5rem 1rem;
+    font-weight: bold;
+}
+
+.stButton>button:hover {
+    background-color: #0ea55a;
+}
+
+/* Input field styling */
+.stTextInput>div>div>input {
+    border-radius: 5px;
+    border: 1px solid #dfe4ea;
+}
+
+/* Transaction cards */
+.transaction-card {
+    background-color: #f1f2f6;
+    border-left: 4px solid #20bf6b;
+    padding: 10px 15px;
+    margin-bottom: 10px;
+    border-radius: 5px;
+    display: flex;
+    justify-content: space-between;
+    align-items: center;
+}
+
+.transaction-amount {
+    font-weight: bold;
+    color: #20bf6b;
+}
+
+.transaction-details {
+    display: flex;
+    align-items: center;
+}
+
+.transaction-icon {
+    margin-right: 10px;
+}
+
+/* Response area */
+.response-area {
+    background-color: #e3f9ee;
+    border-left: 4px solid #20bf6b;
+    padding: 15px;
+    border-radius: 5px;
+    margin-top: 15px;
+}
+
+/* Expander styling */
+.streamlit-expanderHeader {
+    background-color: #f1f2f6;
+    border-radius: 5px;
+}
+
+/* Footer */
+.footer {
+    text-align: center;
+    margin-top: 3rem;
+    padding-top: 1rem;
+    border-top: 1px solid #dfe4ea;
+    color: #a5b1c2;
+    font-size: 0.8rem;
+}
+
+/* Examples list */
+.examples-list {
+    margin-top: 1rem;
+}
+
+.examples-title {
+    font-weight: bold;
+    margin-bottom: 0.5rem;
+}
+
+.example-item {
+    background-color: #f1f2f6;
+    padding: 8px 12px;
+    margin-bottom: 8px;
+    border-radius: 5px;
+    cursor: pointer;
+}
+
+.example-item:hover {
+    background-color: #e3f9ee;
+}
+
+/* Empty state */
+.empty-state {
+    text-align: center;
+    padding: 40px 20px;
+}
+
+.empty-state-icon {
+    font-size: 3rem;
+    margin-bottom: 1rem;
+    color: #a5b1c2;
+}
+
+.empty-state-text {
+    color: #576574;
+}
+
+/* Card headers */
+.card-header {
+    display: flex;
+    align-items: center;
+    margin-bottom: 1rem;
+}
+
+.card-header-icon {
+    margin-right: 0.5rem;
+    color: #4b6584;
+    font-size: 1.2rem;
+}
+
+.card-title {
+    margin: 0;
+    font-size: 1.2rem;
+}
+"""
+
+EXAMPLE_COMMANDS = (
+    "John paid 50 for dinner split among John, Mary, Bob",
+    "Sarah paid 30 for movie tickets split between Sarah and Mike",
+    "Alex paid 75 for groceries split with Taylor",
+    "balance",
+    "summary",
+    "help",
+    "clear",
+)
+
+# Copies an example into the command input (%s is the command)
+EXAMPLE_CLICK = (
+    "document.querySelector('.stTextInput input').value = '%s';"
+    "document.querySelector('.stTextInput input').dispatchEvent(new Event('input', { bubbles: true }));"
+)
+
+RESPONSE_ICON = """<svg width="20" height="20" viewBox="0 0 24 24" fill="none" xmlns="http://www.w3.org/2000/svg">
+    <path d="M21 11.5C21.0034 12.8199 20.6951 14.1219 20.1 15.3C19.3944 16.7118 18.3098 17.8992 16.9674 18.7293C15.6251 19.5594 14.0782 19.9994 12.5 20C11.1801 20.0035 9.87812 19.6951 8.7 19.1L3 21L4.9 15.3C4.30493 14.1219 3.99656 12.8199 4 11.5C4.00061 9.92179 4.44061 8.37488 5.27072 7.03258C6.10083 5.69028 7.28825 4.6056 8.7 3.90003C9.87812 3.30496 11.1801 2.99659 12.5 3.00003H13C15.0843 3.11502 17.053 3.99479 18.5291 5.47089C20.0052 6.94699 20.885 8.91568 21 11V11.5Z" stroke="#4361ee" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"/>
+</svg>"""
+
+TITLE = "<h1>💰 Split Expenses with Ease</h1>"
+
+FOOTER = "<div class='footer'>Expense Splitter App • Made with Streamlit</div>"
+
+EMPTY_STATE = (
+    "<div class='card empty-state animate-fade-in'>"
+    "<div class='empty-state-icon'>📊</div>"
+    "<div class='empty-state-text'>No expenses recorded yet. Add your first expense to get started!</div>"
+    "</div>"
+)
+
+SETTLED = (
+    "<div style='text-align: center; padding: 20px;'>"
+    "<div style='font-size: 2rem; margin-bottom: 10px;'>✅</div>"
+    "<div style='color: var(--accent); font-weight: 600;'>All settled up! No one owes anything.</div>"
+    "</div>"
+)
+
+
+@lru_cache(maxsize=None)
+def style():
+    # The stylesheet as one <style> tag, without comments or spare whitespace
+    css = re.sub(r"/\*.*?\*/", "", STYLE, flags=re.DOTALL)
+    css = re.sub(r"\s*([{};:,>])\s*", r"\1", css)
+    css = re.sub(r"\s+", " ", css).strip()
+    return f"<style>{css}</style>"
+
+
+@lru_cache(maxsize=None)
+def card_header(icon, title):
+    # A section's heading, in a card
+    return (
+        f"<div class='card animate-fade-in'><div class='card-header'>"
+        f"<div class='card-header-icon'>{icon}</div><h2 class='card-title'>{title}</h2>"
+        f"</div></div>"
+    )
+
+
+@lru_cache(maxsize=None)
+def examples():
+    # Every example command in one list; clicking one puts it in the input
+    items = "".join(
+        f"<div class='example-item' onclick=\"{EXAMPLE_CLICK % command}\">{command}</div>"
+        for command in EXAMPLE_COMMANDS
+    )
+    return (
+        f"<div class='examples-list'>"
+        f"<div class='examples-title'>📝 Example commands (click to use):</div>{items}"
+        f"</div>"
+    )
+
+
+def response(text):
+    # The chatbot's latest reply; no blank lines, so the text stays inside
+    # the HTML block
+    return (
+        f"<div class='response-area animate-fade-in'>"
+        f"<div class='response-title'>{RESPONSE_ICON} Response</div>\n{text}\n</div>"
+    )
+
+
+def transactions(transfers, currency):
+    # Every suggested transfer ({"from", "to", "amount"}) as one payload
+    return "".join(
+        f"<div class='transaction-card'><div class='transaction-details'>"
+        f"<div class='transaction-icon'>↗️</div>"
+        f"<span class='transaction-text'><b>{html.escape(t['from'])}</b> owes <b>{html.escape(t['to'])}</b></span>"
+        f"</div><div class='transaction-amount'>{format_amount(t['amount'], currency)}</div></div>"
+        for t in transfers
+    )